@@ -2,12 +2,18 @@ from __future__ import annotations
 
 import logging
 import os
+import re
+import string
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
 from dataclasses import dataclass
 from datetime import datetime, timezone
 
-from src.config import THREAD_MAX_MESSAGES, THREAD_MAX_CHARS
+from src.config import (
+    THREAD_MAX_MESSAGES, THREAD_MAX_CHARS, CONTEXT_FILES_MAX_CHARS,
+)
 from src.router import route, HEAVY_TYPES
-from src.analyzer import MetricsAnalyzer, render_conflicts
 from src.governance import find_contracts_requiring_review, render_review_report
 from src.lifecycle import set_status, ensure_in_review
 from src.tool_definitions import get_tools_for_route
@@ -16,6 +22,29 @@ from src.tools import ToolExecutor
 
 logger = logging.getLogger(__name__)
 
+# Inline role assignment ("Data Lead — @user")
+_ROLE_LINE_RE = re.compile(r"^(data\s*lead|circle\s*lead)\s*[—\-:]\s*(.+)$", re.IGNORECASE)
+_USERNAME_RE = re.compile(r"@([a-z0-9_.\-]{3,})", re.IGNORECASE)
+_WS_RE = re.compile(r"\s+")
+_MD_ARTIFACT_RE = re.compile(r"[\]\[\(\)<>]")
+# Cheap prefilter: every role line contains "lead" (_ROLE_LINE_RE)
+_LEAD_RE = re.compile("lead", re.IGNORECASE)
+
+
+def _merge_roles(sources, pairs=()) -> dict[str, list[str]]:
+    """Union normalized role->users maps (Memory.read_roles) and (role, user) pairs.
+
+    Users stay lower-cased and de-duplicated; first-seen order is kept
+    (dict used as an ordered set).
+    """
+    acc: dict[str, dict[str, None]] = {}
+    for src in sources:
+        for rk, users in src.items():
+            acc.setdefault(rk, {}).update(dict.fromkeys(users))
+    for role, user in pairs:
+        acc.setdefault(role, {})[user.lower()] = None
+    return {rk: list(users) for rk, users in acc.items()}
+
 
 ONBOARD_TEMPLATE = """Привет, {display_name}! Я AI-архитектор метрик в канале Data Contracts.
 Помогаю команде согласовывать определения данных и метрик.
@@ -41,6 +70,31 @@ PARTICIPANT_TEMPLATE = """# {display_name} (@{username})
 """
 
 
+def _template_parts(template: str, fields: tuple[str, ...]) -> tuple[str, ...]:
+    """Split a str.format template once into the literal text around `fields`.
+
+    Filling is then a "".join of parts and values, without re-parsing the
+    template on every call.
+    """
+    parts: list[str] = []
+    names: list[str] = []
+    literal: list[str] = []
+    for text, field, _, _ in string.Formatter().parse(template):
+        literal.append(text)
+        if field is not None:
+            parts.append("".join(literal))
+            names.append(field)
+            literal = []
+    parts.append("".join(literal))
+    if tuple(names) != fields:
+        raise ValueError(f"template fields {names} != {list(fields)}")
+    return tuple(parts)
+
+
+_ONBOARD_PARTS = _template_parts(ONBOARD_TEMPLATE, ("display_name",))
+_PARTICIPANT_PARTS = _template_parts(PARTICIPANT_TEMPLATE, ("display_name", "username", "date"))
+
+
 @dataclass
 class ProcessResult:
     reply: str
@@ -48,10 +102,27 @@ class ProcessResult:
 
 
 # Route types that should be tracked to active threads
-THREAD_TRACKING_TYPES = {"contract_discussion", "new_contract_init", "problem_report"}
+THREAD_TRACKING_TYPES = frozenset({"contract_discussion", "new_contract_init", "problem_report"})
 
 # Route types where profile enrichment runs post-processing
-_ENRICHMENT_ROUTES = {"contract_discussion", "new_contract_init", "problem_report"}
+_ENRICHMENT_ROUTES = frozenset({"contract_discussion", "new_contract_init", "problem_report"})
+
+# Route types that get the full system prompt (+ summaries/glossary) in the tool path
+_FULL_PROMPT_TYPES = frozenset({"contract_discussion", "new_contract_init", "problem_report", "expert_opinion"})
+
+# Route types whose tool-path context includes the participant profile
+_PROFILE_ROUTES = frozenset({"contract_discussion", "new_contract_init", "problem_report", "profile_intro"})
+
+# Relationship type -> arrow in relationships_show ("→" otherwise)
+_REL_ARROWS = {"inverse": "↔"}
+
+
+def _relationship_line(src: str, dst: str, rel: dict) -> str:
+    """One relationships_show bullet: "- `a` → `b` — **type** — description"."""
+    ty = str(rel.get("type") or "")
+    desc = (rel.get("description") or "").strip()
+    line = f"- `{src}` {_REL_ARROWS.get(ty, '→')} `{dst}` — **{ty}**"
+    return f"{line} — {desc}" if desc else line
 
 
 class Agent:
@@ -59,28 +130,131 @@ class Agent:
         self.llm = llm_client
         self.memory = memory
         self.mm = mattermost_client
+        # Shared executor for direct tool calls without per-message state (no thread_root_id)
+        self._executor = ToolExecutor(memory, mattermost_client, llm_client)
+        # Request-scoped caches live per thread: Listener may handle messages concurrently
+        self._local = threading.local()
+        # Background reads that overlap with per-request work (see _prefetch_context)
+        self._io_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="agent-io")
+        # Fire-and-forget DMs (onboarding) so callers don't wait on Mattermost
+        self._dm_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="agent-dm")
+        # (summaries dict from Memory.read_json_cached, formatted prompt block)
+        self._summaries_prompt: tuple[dict, str] | None = None
+
+    @property
+    def _user_cache(self) -> dict[str, dict]:
+        """Request-scoped user info (user_id -> info); reset per process_message."""
+        cache = getattr(self._local, "user_cache", None)
+        if cache is None:
+            cache = self._local.user_cache = {}
+        return cache
+
+    @_user_cache.setter
+    def _user_cache(self, value: dict[str, dict]) -> None:
+        self._local.user_cache = value
+
+    @property
+    def _json_cache(self) -> dict[str, dict | list | None]:
+        """Request-scoped parsed JSON (path -> data); reset per process_message."""
+        cache = getattr(self._local, "json_cache", None)
+        if cache is None:
+            cache = self._local.json_cache = {}
+        return cache
+
+    @_json_cache.setter
+    def _json_cache(self, value: dict[str, dict | list | None]) -> None:
+        self._local.json_cache = value
+
+    def _read_json(self, path: str):
+        """memory.read_json, parsed at most once per request."""
+        if path not in self._json_cache:
+            self._json_cache[path] = self.memory.read_json(path)
+        return self._json_cache[path]
+
+    def _write_json(self, path: str, data) -> None:
+        """memory.write_json that keeps the request cache in sync."""
+        self.memory.write_json(path, data)
+        self._json_cache[path] = data
+
+    @contextmanager
+    def _updating(self, *paths: str):
+        """Guard a read-modify-write of JSON files against concurrent requests.
+
+        Holds memory's write lock (via transaction(lock=True)) and drops paths
+        from the request cache so the update starts from what is on disk now.
+        """
+        tx = getattr(self.memory, "transaction", None)
+        with tx(lock=True) if tx else nullcontext():
+            for path in paths:
+                self._json_cache.pop(path, None)
+            yield
+
+    def _get_index(self) -> dict:
+        """contracts/index.json for this request, shared by all branches."""
+        index = self._read_json("contracts/index.json")
+        if not isinstance(index, dict):
+            index = {"contracts": []}
+            self._json_cache["contracts/index.json"] = index
+        return index
+
+    def _list_contracts(self) -> list[dict]:
+        """Like memory.list_contracts(), served from the request's index."""
+        contracts = self._get_index().get("contracts")
+        return contracts if isinstance(contracts, list) else []
+
+    def _get_users(self, user_ids: set[str]) -> dict[str, dict]:
+        """Fetch user info for several ids: one batch call, per-user fallback.
+
+        Results are memoized in the request-scoped _user_cache.
+        """
+        cache = self._user_cache
+        missing = user_ids - cache.keys()
+        if missing:
+            try:
+                batch = getattr(self.mm, "get_users_by_ids", None)
+                if batch:
+                    res = batch(list(missing))
+                    if isinstance(res, dict):
+                        cache.update(res)
+            except Exception as e:
+                logger.warning("Batch user lookup failed, falling back to per-user: %s", e)
+            for uid in missing - cache.keys():
+                try:
+                    cache[uid] = self.mm.get_user_info(uid)
+                except Exception:
+                    pass
+        return {uid: cache[uid] for uid in user_ids if uid in cache}
 
     def _build_thread_context(self, thread_posts: list[dict], exclude_post_id: str | None = None) -> str | None:
         """Build thread context string from a list of thread posts."""
+        posts = [
+            tp for tp in thread_posts
+            if not (exclude_post_id and tp.get("id") == exclude_post_id)
+        ][-THREAD_MAX_MESSAGES:]
+        # Skip older posts that the tail truncation below would cut anyway:
+        # message lengths alone are a lower bound on the formatted length.
+        budget = 0
+        for i in range(len(posts) - 1, -1, -1):
+            budget += len(posts[i].get("message") or "")
+            if budget > THREAD_MAX_CHARS:
+                posts = posts[i:]
+                break
+        bot_id = self.mm.bot_user_id
+        user_ids = {tp.get("user_id", "") for tp in posts} - {bot_id, ""}
+        infos = self._get_users(user_ids)
+
         context_parts = []
-        for tp in thread_posts:
-            if exclude_post_id and tp.get("id") == exclude_post_id:
-                continue
+        for tp in posts:
             tp_user_id = tp.get("user_id", "")
-            if tp_user_id == self.mm.bot_user_id:
+            if tp_user_id == bot_id:
                 tp_name = "AI-архитектор"
             else:
                 try:
-                    tp_info = self.mm.get_user_info(tp_user_id)
-                    tp_name = f"@{tp_info['username']}"
+                    tp_name = f"@{infos[tp_user_id]['username']}"
                 except Exception:
                     tp_name = "unknown"
             context_parts.append(f"{tp_name}: {tp['message']}")
 
-        # Keep last N messages
-        if len(context_parts) > THREAD_MAX_MESSAGES:
-            context_parts = context_parts[-THREAD_MAX_MESSAGES:]
-
         result = "\n".join(context_parts)
 
         # Truncate by chars, keep tail
@@ -89,6 +263,30 @@ class Agent:
 
         return result if result else None
 
+    def _resolve_username(self, raw: str) -> str | None:
+        """Resolve a display name like "Никита Корабовцев" to a username, or None.
+
+        Uses the client's single-search resolve_username_variants when available;
+        otherwise tries the full string, then just the first word.
+        """
+        variants = getattr(self.mm, "resolve_username_variants", None)
+        if variants:
+            try:
+                return variants(raw)
+            except Exception:
+                return None
+        if not hasattr(self.mm, "resolve_username"):
+            return None
+        candidates = [raw] + ([raw.split()[0]] if " " in raw else [])
+        for cand in candidates:
+            try:
+                resolved = self.mm.resolve_username(cand)
+            except Exception:
+                resolved = None
+            if resolved:
+                return resolved
+        return None
+
     def _handle_role_assignments_inline(self, message: str) -> str | None:
         """Handle role assignment messages without router/LLM.
 
@@ -99,9 +297,10 @@ class Agent:
         Persists canonical usernames to tasks/roles.json (runtime state).
         Returns a reply string if handled, else None.
         """
-        import re
+        if not message or not _LEAD_RE.search(message):
+            return None
 
-        lines = [ln.strip() for ln in (message or "").splitlines() if ln.strip()]
+        lines = [ln.strip() for ln in message.splitlines() if ln.strip()]
         if not lines:
             return None
 
@@ -113,17 +312,17 @@ class Agent:
         pairs: list[tuple[str, str]] = []
 
         for ln in lines:
-            m = re.match(r"^(data\s*lead|circle\s*lead)\s*[—\-:]\s*(.+)$", ln, flags=re.IGNORECASE)
+            m = _ROLE_LINE_RE.match(ln)
             if not m:
                 continue
-            label = re.sub(r"\s+", " ", m.group(1).strip().lower())
+            label = _WS_RE.sub(" ", m.group(1).strip().lower())
             role = role_key_by_label.get(label)
             rhs = m.group(2).strip()
             if not role or not rhs:
                 continue
 
             # 1) Prefer explicit @username in latin
-            m_user = re.search(r"@([a-z0-9_.\-]{3,})", rhs, flags=re.IGNORECASE)
+            m_user = _USERNAME_RE.search(rhs)
             if m_user:
                 pairs.append((role, m_user.group(1).lower()))
                 continue
@@ -133,30 +332,9 @@ class Agent:
             if "@" in raw:
                 raw = raw.split("@", 1)[1].strip()
             # Trim possible markdown/link artifacts
-            raw = re.sub(r"[\]\[\(\)<>]", " ", raw).strip()
+            raw = _MD_ARTIFACT_RE.sub(" ", raw).strip()
 
-            resolved = None
-            try:
-                if hasattr(self.mm, "resolve_username"):
-                    resolved = self.mm.resolve_username(raw)
-            except Exception:
-                resolved = None
-
-            # If first attempt failed and raw contains a space, try the full multi-word string
-            if not resolved and " " in raw:
-                try:
-                    if hasattr(self.mm, "resolve_username"):
-                        resolved = self.mm.resolve_username(raw)
-                except Exception:
-                    resolved = None
-
-            # If still unresolved, try just the first word (e.g. "Никита" from "Никита Корабовцев")
-            if not resolved and " " in raw:
-                try:
-                    if hasattr(self.mm, "resolve_username"):
-                        resolved = self.mm.resolve_username(raw.split()[0])
-                except Exception:
-                    resolved = None
+            resolved = self._resolve_username(raw)
 
             if resolved:
                 pairs.append((role, str(resolved).lower()))
@@ -173,41 +351,15 @@ class Agent:
             return None
 
         # Merge defaults (context/roles.json) + runtime (tasks/roles.json)
-        base = self.memory.read_json("context/roles.json") or {}
-        state = self.memory.read_json("tasks/roles.json") or {}
-
-        def _roles_dict(d):
-            if isinstance(d, dict) and isinstance(d.get("roles"), dict):
-                return d.get("roles")
-            return {}
-
-        merged = {"roles": {}}
-        roles = merged["roles"]
-
-        for src in (_roles_dict(base), _roles_dict(state)):
-            for rk, users in (src or {}).items():
-                if not isinstance(rk, str) or not isinstance(users, list):
-                    continue
-                cur = roles.get(rk) or []
-                cur_l = [str(x).lower() for x in cur if isinstance(x, str)]
-                for u in users:
-                    if isinstance(u, str) and u.lower() not in cur_l:
-                        cur_l.append(u.lower())
-                roles[rk] = cur_l
-
-        updated: list[tuple[str, str]] = []
-        for role, user in pairs:
-            cur_l = roles.get(role) or []
-            cur_l = [str(x).lower() for x in cur_l if isinstance(x, str)]
-            if user.lower() not in cur_l:
-                cur_l.append(user.lower())
-            roles[role] = cur_l
-            updated.append((role, user))
+        with self._updating("tasks/roles.json"):
+            base = self.memory.read_roles("context/roles.json")
+            state = self.memory.read_roles("tasks/roles.json")
+            merged = {"roles": _merge_roles((base, state), pairs)}
 
-        self.memory.write_json("tasks/roles.json", merged)
+            self._write_json("tasks/roles.json", merged)
 
         lines_out = ["✅ Роли обновлены (tasks/roles.json):", ""]
-        for role, user in updated:
+        for role, user in pairs:
             lines_out.append(f"- {role}: @{user}")
         lines_out.append("\nТеперь можно повторить: `зафиксируй контракт <id>`." )
         return "\n".join(lines_out)
@@ -222,6 +374,9 @@ class Agent:
         root_id: str | None = None,
     ) -> ProcessResult:
         """Process an incoming message and return ProcessResult."""
+        self._user_cache = {}
+        self._json_cache = {}
+
         # 0. Role assignment messages (fast-path, no LLM)
         try:
             fast = self._handle_role_assignments_inline(message)
@@ -235,9 +390,15 @@ class Agent:
         route_data = route(self.llm, self.memory, username, message, channel_type, thread_context)
         # keep channel type for side-effect policy
         route_data["channel_type"] = channel_type
+        rtype = route_data.get("type")
+
+        # Prompt/profile reads overlap with the thread lookup below; fast paths never use them
+        prefetch = None
+        if rtype not in self._HANDLERS and (rtype in _FULL_PROMPT_TYPES or rtype in _PROFILE_ROUTES):
+            prefetch = self._io_pool.submit(self._prefetch_context, username)
 
         # 2. Active thread lookup for top-level messages in channel
-        entity = (route_data.get("entity") or "").strip().lower()
+        entity = (route_data.get("entity") or "").strip().lower()  # normalized once, shared below
         resolved_thread_root: str | None = None
 
         if not root_id and entity and channel_type == "channel":
@@ -253,20 +414,22 @@ class Agent:
 
         # Lifecycle MVP: when a contract enters discussion/init, auto move draft->in_review
         try:
-            if route_data.get("type") in {"new_contract_init", "contract_discussion", "problem_report"}:
-                cid = (route_data.get("entity") or "").strip().lower()
-                if cid:
-                    index = self.memory.read_json("contracts/index.json") or {"contracts": []}
-                    res = ensure_in_review(index, cid)
-                    if res.ok and res.changed:
-                        self.memory.write_json("contracts/index.json", index)
+            if rtype in THREAD_TRACKING_TYPES and entity:
+                # Stat-validated lookup; the index is locked and re-read only when a move is due
+                rec = self.memory.get_contract_by_id(entity)
+                if rec is None or rec.get("status") in (None, "", "draft"):
+                    with self._updating("contracts/index.json"):
+                        index = self._get_index()
+                        res = ensure_in_review(index, entity)
+                        if res.ok and res.changed:
+                            self._write_json("contracts/index.json", index)
         except Exception:
             pass
 
         # Helper to wrap reply and register thread before returning
         def _result(reply: str) -> ProcessResult:
             # Register active thread for discussion-related types
-            if entity and route_data.get("type") in THREAD_TRACKING_TYPES:
+            if entity and rtype in THREAD_TRACKING_TYPES:
                 try:
                     # If user wrote in a thread (root_id set), track that thread.
                     # If we resolved an existing thread, track that.
@@ -278,207 +441,219 @@ class Agent:
                     logger.warning("Failed to register active thread for %s: %s", entity, e)
             return ProcessResult(reply=reply, thread_root_id=resolved_thread_root)
 
-        # Fast-path: contract history/version rendering without LLM
-        if route_data.get("type") == "contract_history":
-            cid = route_data.get("entity")
-            items = self.memory.get_contract_history(cid) if cid else []
-            if not items:
-                return _result(f"История версий для контракта `{cid}` не найдена. (Нет history.jsonl)")
-            # newest last in our history.jsonl; show tail
-            tail = items[-10:]
-            lines = [f"История версий `{cid}` (последние {len(tail)}):", ""]
-            for it in tail:
-                sha = (it.get("sha256") or "")[:12]
-                lines.append(f"- `{it.get('ts')}` — {it.get('kind')} — sha {sha} — {it.get('bytes')} bytes")
-            lines.append("\nЧтобы посмотреть конкретную версию: `покажи версию <contract_id> <ts>`")
-            return _result("\n".join(lines))
-
-        if route_data.get("type") == "contract_version":
-            ent = route_data.get("entity") or ""
-            if ":" not in ent:
-                return _result("Неверный формат. Используй: `покажи версию <contract_id> <ts>`")
-            cid, ts = ent.split(":", 1)
-            md = self.memory.get_contract_version(cid, ts)
-            if not md:
-                return _result(f"Версия не найдена: `{cid}` `{ts}`")
-            return _result(f"Версия `{cid}` `{ts}`:\n\n```markdown\n{md}\n```")
-
-        if route_data.get("type") == "show_contract":
-            cid = (route_data.get("entity") or "").strip().lower()
-            md = self.memory.read_file(f"contracts/{cid}.md")
-            if not md:
-                return _result(f"Контракт `{cid}` не найден на диске (contracts/{cid}.md).")
-            return _result(f"📋 Контракт `{cid}`:\n\n```markdown\n{md}\n```")
-
-        if route_data.get("type") == "show_draft":
-            cid = (route_data.get("entity") or "").strip().lower()
-            md = self.memory.read_file(f"drafts/{cid}.md")
-            if not md:
-                return _result(f"Черновик `{cid}` не найден на диске (drafts/{cid}.md).")
-            return _result(f"📝 Черновик `{cid}`:\n\n```markdown\n{md}\n```")
-
-        if route_data.get("type") == "contract_diff":
-            cid = (route_data.get("entity") or "").strip().lower()
-            executor = ToolExecutor(self.memory, self.mm, self.llm)
-            result = executor.execute("diff_contract", {"contract_id": cid})
-            if "error" in result:
-                return _result(result["error"])
-            diff_text = result.get("diff", "")
-            prev_ts = result.get("prev_ts", "?")
-            cur_ts = result.get("current_ts", "?")
-            return _result(f"📊 Diff `{cid}` ({prev_ts} → {cur_ts}):\n\n```diff\n{diff_text}\n```")
-
-        if route_data.get("type") == "conflicts_audit":
-            analyzer = MetricsAnalyzer(self.memory)
-            conflicts = analyzer.detect_conflicts()
-            return _result(render_conflicts(conflicts))
-
-        if route_data.get("type") == "relationships_show":
-            cid = (route_data.get("entity") or "").strip().lower()
-            idx = self.memory.read_json("contracts/relationships.json") or {"relationships": []}
-            items = idx.get("relationships") if isinstance(idx, dict) else []
-            if not isinstance(items, list):
-                items = []
-
-            # Build id->name map
-            name_map = {}
-            for c in (self.memory.list_contracts() or []):
-                if isinstance(c, dict) and c.get("id"):
-                    name_map[str(c.get("id")).lower()] = c.get("name") or c.get("id")
-
-            rels = [r for r in items if isinstance(r, dict) and (str(r.get("from") or "").lower()==cid or str(r.get("to") or "").lower()==cid)]
-            if not rels:
-                return _result(f"Связей для `{cid}` не найдено.")
-
-            title = name_map.get(cid, cid)
-            lines = [f"🔗 Связи для `{cid}` ({title}):", ""]
-            for r in rels[:30]:
-                f = str(r.get("from") or "").lower()
-                t = str(r.get("to") or "").lower()
-                ty = str(r.get("type") or "")
-                desc = (r.get("description") or "").strip()
-
-                arrow = "→"
-                if ty == "inverse":
-                    arrow = "↔"
-                lines.append(f"- `{f}` {arrow} `{t}` — **{ty}**" + (f" — {desc}" if desc else ""))
-
-            if len(rels) > 30:
-                lines.append(f"…и ещё {len(rels)-30}")
-
-            return _result("\n".join(lines))
-
-        if route_data.get("type") == "governance_review_audit":
-            items = find_contracts_requiring_review(self.memory.list_contracts())
-            return _result(render_review_report(items))
-
-        if route_data.get("type") == "governance_policy_show":
-            tier_key = (route_data.get("entity") or "").strip().lower()
-            gov = self.memory.read_json("context/governance.json") or {}
-            tiers = gov.get("tiers") if isinstance(gov, dict) else None
-            if not isinstance(tiers, dict) or tier_key not in tiers:
-                return _result(f"Политика `{tier_key}` не найдена.")
-            cfg = tiers.get(tier_key) or {}
-            req = cfg.get("approval_required") or []
-            thr = cfg.get("consensus_threshold")
-            desc = cfg.get("description") or ""
-
-            roles = self.memory.read_json("context/roles.json") or {}
-            roles_dict = roles.get("roles") if isinstance(roles, dict) else None
-
-            lines = [f"📜 Политика согласования {tier_key}", ""]
-            if desc:
-                lines.append(desc)
-                lines.append("")
-            lines.append(f"Требуемые роли: {', '.join(req) if req else '(нет)'}")
-            lines.append(f"Порог консенсуса: {thr}")
-            lines.append("")
-            if isinstance(roles_dict, dict):
-                lines.append("Текущее назначение пользователей на роли:")
-                for role in req:
-                    users = roles_dict.get(role) or []
-                    if isinstance(users, list):
-                        u = ", ".join([f"@{x}" for x in users if isinstance(x, str)])
-                        lines.append(f"- {role}: {u or '(не назначено)'}")
-            return _result("\n".join(lines))
-
-        if route_data.get("type") == "governance_requirements_for":
-            cid = (route_data.get("entity") or "").strip().lower()
-            tier_key = "tier_2"
-            for c in (self.memory.list_contracts() or []):
-                if isinstance(c, dict) and str(c.get("id") or "").lower() == cid and c.get("tier"):
-                    tier_key = str(c.get("tier"))
-                    break
-
-            gov = self.memory.read_json("context/governance.json") or {}
-            tiers = gov.get("tiers") if isinstance(gov, dict) else None
-            cfg = tiers.get(tier_key) if isinstance(tiers, dict) else None
-            if not isinstance(cfg, dict):
-                return _result(f"Не нашёл политику для `{cid}` (tier={tier_key}).")
-
-            req = cfg.get("approval_required") or []
-            thr = cfg.get("consensus_threshold")
-            desc = cfg.get("description") or ""
-            lines = [f"✅ Требования согласования для `{cid}` (tier={tier_key})", ""]
-            if desc:
-                lines.append(desc)
-                lines.append("")
-            lines.append(f"Роли: {', '.join(req) if req else '(нет)'}")
-            lines.append(f"Порог: {thr}")
-            lines.append("\nПодсказка: добавь согласующих в секцию `## Согласовано` как `@username — дата`.")
-            return _result("\n".join(lines))
-
-        if route_data.get("type") == "lifecycle_get_status":
-            cid = (route_data.get("entity") or "").strip().lower()
-            status = None
-            for c in (self.memory.list_contracts() or []):
-                if isinstance(c, dict) and str(c.get("id") or "").lower() == cid:
-                    status = c.get("status")
-                    break
-            if not status:
-                return _result(f"Статус для `{cid}` не найден.")
-            return _result(f"Статус `{cid}`: **{status}**")
-
-        if route_data.get("type") == "lifecycle_set_status":
-            ent = (route_data.get("entity") or "")
-            if ":" not in ent:
-                return _result("Неверный формат. Используй: `поставь статус <id> <draft|in_review|agreed|approved|active|deprecated|archived>`")
-            cid, st = ent.split(":", 1)
-            index = self.memory.read_json("contracts/index.json") or {"contracts": []}
+        # Fast paths without LLM: one handler per route type (entity: stripped, lower-cased)
+        handler = self._HANDLERS.get(rtype)
+        if handler:
+            return _result(handler(self, route_data, entity))
+
+        # ── Tool-use path ────────────────────────────────────────────────
+        current_thread_root = root_id or resolved_thread_root or post_id
+        reply = self._process_with_tools(
+            username, message, channel_type, thread_context, route_data, current_thread_root,
+            prefetched_profile=prefetch,
+        )
+        return _result(reply)
+
+    # ── Fast-path handlers (route type -> reply, no LLM) ─────────────
+
+    def _handle_contract_history(self, route_data: dict, entity: str) -> str:
+        """Render the tail of a contract's version history."""
+        cid = route_data.get("entity")
+        # newest last in our history.jsonl; show tail
+        tail = self.memory.get_contract_history(cid, limit=10) if cid else []
+        if not tail:
+            return f"История версий для контракта `{cid}` не найдена. (Нет history.jsonl)"
+        body = "\n".join(
+            f"- `{it.get('ts')}` — {it.get('kind')} — sha {(it.get('sha256') or '')[:12]} — {it.get('bytes')} bytes"
+            for it in tail
+        )
+        return (
+            f"История версий `{cid}` (последние {len(tail)}):\n\n{body}\n"
+            "\nЧтобы посмотреть конкретную версию: `покажи версию <contract_id> <ts>`"
+        )
+
+    def _handle_contract_version(self, route_data: dict, entity: str) -> str:
+        """Render one stored contract version (entity = "<cid>:<ts>")."""
+        ent = route_data.get("entity") or ""
+        if ":" not in ent:
+            return "Неверный формат. Используй: `покажи версию <contract_id> <ts>`"
+        cid, ts = ent.split(":", 1)
+        md = self.memory.get_contract_version(cid, ts)
+        if not md:
+            return f"Версия не найдена: `{cid}` `{ts}`"
+        return f"Версия `{cid}` `{ts}`:\n\n```markdown\n{md}\n```"
+
+    def _handle_show_contract(self, route_data: dict, entity: str) -> str:
+        """Show a saved contract as-is."""
+        cid = entity
+        md = self.memory.read_file(f"contracts/{cid}.md")
+        if not md:
+            return f"Контракт `{cid}` не найден на диске (contracts/{cid}.md)."
+        return f"📋 Контракт `{cid}`:\n\n```markdown\n{md}\n```"
+
+    def _handle_show_draft(self, route_data: dict, entity: str) -> str:
+        """Show a draft as-is."""
+        cid = entity
+        md = self.memory.read_file(f"drafts/{cid}.md")
+        if not md:
+            return f"Черновик `{cid}` не найден на диске (drafts/{cid}.md)."
+        return f"📝 Черновик `{cid}`:\n\n```markdown\n{md}\n```"
+
+    def _handle_contract_diff(self, route_data: dict, entity: str) -> str:
+        """Show the diff between the last two contract versions."""
+        cid = entity
+        result = self._executor.execute("diff_contract", {"contract_id": cid})
+        if "error" in result:
+            return result["error"]
+        diff_text = result.get("diff", "")
+        prev_ts = result.get("prev_ts", "?")
+        cur_ts = result.get("current_ts", "?")
+        return f"📊 Diff `{cid}` ({prev_ts} → {cur_ts}):\n\n```diff\n{diff_text}\n```"
+
+    def _handle_conflicts_audit(self, route_data: dict, entity: str) -> str:
+        """Report metric conflicts across contracts."""
+        from src.analyzer import MetricsAnalyzer, render_conflicts
+        analyzer = MetricsAnalyzer(self.memory)
+        conflicts = analyzer.detect_conflicts()
+        return render_conflicts(conflicts)
+
+    def _handle_relationships_show(self, route_data: dict, entity: str) -> str:
+        """List relationships of a contract."""
+        cid = entity
+        idx = self._read_json("contracts/relationships.json") or {"relationships": []}
+        items = idx.get("relationships") if isinstance(idx, dict) else []
+        if not isinstance(items, list):
+            items = []
+
+        # (from, to, record) with endpoints lower-cased once
+        edges = ((str(r.get("from") or "").lower(), str(r.get("to") or "").lower(), r) for r in items if isinstance(r, dict))
+        rels = [e for e in edges if e[0] == cid or e[1] == cid]
+        if not rels:
+            return f"Связей для `{cid}` не найдено."
+
+        # Only the header needs a contract name
+        rec = self.memory.get_contracts_by_ids({cid}).get(cid) or {}
+        title = rec.get("name") or rec.get("id") or cid
+        lines = [f"🔗 Связи для `{cid}` ({title}):", ""]
+        lines.extend(_relationship_line(f, t, r) for f, t, r in rels[:30])
+        if len(rels) > 30:
+            lines.append(f"…и ещё {len(rels)-30}")
+
+        return "\n".join(lines)
+
+    def _handle_governance_review_audit(self, route_data: dict, entity: str) -> str:
+        """List contracts that require review."""
+        items = find_contracts_requiring_review(self._list_contracts())
+        return render_review_report(items)
+
+    def _handle_governance_policy_show(self, route_data: dict, entity: str) -> str:
+        """Show an approval policy tier and its current role holders."""
+        tier_key = entity
+        # Stat-validated: repeat requests don't touch disk (values are not mutated here)
+        gov = self.memory.read_json_cached("context/governance.json") or {}
+        tiers = gov.get("tiers") if isinstance(gov, dict) else None
+        if not isinstance(tiers, dict) or tier_key not in tiers:
+            return f"Политика `{tier_key}` не найдена."
+        cfg = tiers.get(tier_key) or {}
+        req = cfg.get("approval_required") or []
+        thr = cfg.get("consensus_threshold")
+        desc = cfg.get("description") or ""
+
+        roles = self.memory.read_json_cached("context/roles.json") or {}
+        roles_dict = roles.get("roles") if isinstance(roles, dict) else None
+
+        lines = [
+            f"📜 Политика согласования {tier_key}", "",
+            *((desc, "") if desc else ()),
+            f"Требуемые роли: {', '.join(req) if req else '(нет)'}",
+            f"Порог консенсуса: {thr}",
+            "",
+        ]
+        if isinstance(roles_dict, dict):
+            lines.append("Текущее назначение пользователей на роли:")
+            assigned = ((role, roles_dict.get(role) or []) for role in req)
+            lines.extend(
+                f"- {role}: {', '.join(f'@{x}' for x in users if isinstance(x, str)) or '(не назначено)'}"
+                for role, users in assigned
+                if isinstance(users, list)
+            )
+        return "\n".join(lines)
+
+    def _handle_governance_requirements_for(self, route_data: dict, entity: str) -> str:
+        """Show approval requirements for a contract's tier."""
+        cid = entity
+        rec = self.memory.get_contract_by_id(cid) or {}
+        tier_key = str(rec.get("tier") or "tier_2")
+
+        gov = self.memory.read_json_cached("context/governance.json") or {}
+        tiers = gov.get("tiers") if isinstance(gov, dict) else None
+        cfg = tiers.get(tier_key) if isinstance(tiers, dict) else None
+        if not isinstance(cfg, dict):
+            return f"Не нашёл политику для `{cid}` (tier={tier_key})."
+
+        req = cfg.get("approval_required") or []
+        thr = cfg.get("consensus_threshold")
+        desc = cfg.get("description") or ""
+        return "\n".join([
+            f"✅ Требования согласования для `{cid}` (tier={tier_key})", "",
+            *((desc, "") if desc else ()),
+            f"Роли: {', '.join(req) if req else '(нет)'}",
+            f"Порог: {thr}",
+            "\nПодсказка: добавь согласующих в секцию `## Согласовано` как `@username — дата`.",
+        ])
+
+    def _handle_lifecycle_get_status(self, route_data: dict, entity: str) -> str:
+        """Show a contract's lifecycle status."""
+        cid = entity
+        status = (self.memory.get_contract_by_id(cid) or {}).get("status")
+        if not status:
+            return f"Статус для `{cid}` не найден."
+        return f"Статус `{cid}`: **{status}**"
+
+    def _handle_lifecycle_set_status(self, route_data: dict, entity: str) -> str:
+        """Set a contract's lifecycle status (entity = "<cid>:<status>")."""
+        ent = (route_data.get("entity") or "")
+        if ":" not in ent:
+            return "Неверный формат. Используй: `поставь статус <id> <draft|in_review|agreed|approved|active|deprecated|archived>`"
+        cid, st = ent.split(":", 1)
+        with self._updating("contracts/index.json"):
+            index = self._get_index()
             res = set_status(index, cid, st)
             if not res.ok:
-                return _result(f"Не получилось: {res.message}")
-            self.memory.write_json("contracts/index.json", index)
-            return _result(f"✅ {cid}: статус теперь **{st}**")
-
-        if route_data.get("type") == "roles_assign":
-            ent = (route_data.get("entity") or "")
-            pairs = []
-            for part in ent.split(","):
-                part = part.strip()
-                if not part or ":" not in part:
-                    continue
-                role, user = part.split(":", 1)
-                role = role.strip().lower()
-                user_raw = user.strip().lstrip("@")
-                # Resolve display name fragments to canonical username when possible.
+                return f"Не получилось: {res.message}"
+            self._write_json("contracts/index.json", index)
+        return f"✅ {cid}: статус теперь **{st}**"
+
+    def _handle_roles_assign(self, route_data: dict, entity: str) -> str:
+        """Persist role assignments (entity = "role:user,...") to tasks/roles.json."""
+        ent = (route_data.get("entity") or "")
+        pairs = []
+        for part in ent.split(","):
+            part = part.strip()
+            if not part or ":" not in part:
+                continue
+            role, user = part.split(":", 1)
+            role = role.strip().lower()
+            user_raw = user.strip().lstrip("@")
+            # Resolve display name fragments to canonical username when possible.
+            user_resolved = None
+            try:
+                if hasattr(self.mm, "resolve_username"):
+                    user_resolved = self.mm.resolve_username(user_raw)
+            except Exception:
                 user_resolved = None
-                try:
-                    if hasattr(self.mm, "resolve_username"):
-                        user_resolved = self.mm.resolve_username(user_raw)
-                except Exception:
-                    user_resolved = None
-                user = (user_resolved or user_raw).strip().lower()
-                if role and user:
-                    pairs.append((role, user))
+            user = (user_resolved or user_raw).strip().lower()
+            if role and user:
+                pairs.append((role, user))
 
-            if not pairs:
-                return _result("Не понял назначения ролей. Формат: `Data Lead — @username` / `Circle Lead — @username`.")
+        if not pairs:
+            return "Не понял назначения ролей. Формат: `Data Lead — @username` / `Circle Lead — @username`."
 
-            # Read runtime roles state from tasks/roles.json (writable). Fallback to context/roles.json defaults.
-            idx = self.memory.read_json("tasks/roles.json")
+        # Read runtime roles state from tasks/roles.json (writable). Fallback to context/roles.json defaults.
+        with self._updating("tasks/roles.json", "context/roles.json"):
+            idx = self._read_json("tasks/roles.json")
             if idx is None:
-                idx = self.memory.read_json("context/roles.json")
+                idx = self._read_json("context/roles.json")
             if not isinstance(idx, dict):
                 idx = {"roles": {}}
             roles = idx.get("roles")
@@ -486,31 +661,37 @@ class Agent:
                 roles = {}
                 idx["roles"] = roles
 
-            updated = []
-            for role, user in pairs:
-                users = roles.get(role)
-                if not isinstance(users, list):
-                    users = []
-                # de-dup, lower-case
-                users_l = [str(x).lower() for x in users if isinstance(x, str)]
-                if user.lower() not in users_l:
-                    users_l.append(user.lower())
-                roles[role] = users_l
-                updated.append((role, user))
+            # de-dup, lower-case the assigned roles; other roles are kept as-is
+            current = {
+                role: [u.lower() for u in roles[role] if isinstance(u, str)]
+                for role, _ in pairs if isinstance(roles.get(role), list)
+            }
+            roles.update(_merge_roles([current], pairs))
 
             # Persist ONLY to tasks/roles.json (runtime writable state)
-            self.memory.write_json("tasks/roles.json", idx)
+            self._write_json("tasks/roles.json", idx)
 
-            lines = ["✅ Роли обновлены (tasks/roles.json):", ""]
-            for role, user in updated:
-                lines.append(f"- {role}: @{user}")
-            lines.append("\nТеперь можно повторить: `зафиксируй контракт <id>`.")
-            return _result("\n".join(lines))
-
-        # ── Tool-use path ────────────────────────────────────────────────
-        current_thread_root = root_id or resolved_thread_root or post_id
-        reply = self._process_with_tools(username, message, channel_type, thread_context, route_data, current_thread_root)
-        return _result(reply)
+        lines = ["✅ Роли обновлены (tasks/roles.json):", ""]
+        for role, user in pairs:
+            lines.append(f"- {role}: @{user}")
+        lines.append("\nТеперь можно повторить: `зафиксируй контракт <id>`.")
+        return "\n".join(lines)
+
+    _HANDLERS = {
+        "contract_history": _handle_contract_history,
+        "contract_version": _handle_contract_version,
+        "show_contract": _handle_show_contract,
+        "show_draft": _handle_show_draft,
+        "contract_diff": _handle_contract_diff,
+        "conflicts_audit": _handle_conflicts_audit,
+        "relationships_show": _handle_relationships_show,
+        "governance_review_audit": _handle_governance_review_audit,
+        "governance_policy_show": _handle_governance_policy_show,
+        "governance_requirements_for": _handle_governance_requirements_for,
+        "lifecycle_get_status": _handle_lifecycle_get_status,
+        "lifecycle_set_status": _handle_lifecycle_set_status,
+        "roles_assign": _handle_roles_assign,
+    }
 
     def _enrich_participant_profile(
         self, username: str, message: str, route_type: str, thread_context: str | None
@@ -524,7 +705,7 @@ class Agent:
             if not current_profile:
                 return
 
-            enrichment_prompt = self.memory.read_file("prompts/profile_enrichment.md") or ""
+            enrichment_prompt = self.memory.read_file_cached("prompts/profile_enrichment.md") or ""
             if not enrichment_prompt:
                 return
 
@@ -543,6 +724,20 @@ class Agent:
         except Exception as e:
             logger.warning("Profile enrichment failed for %s: %s", username, e)
 
+    def _prefetch_context(self, username: str) -> str | None:
+        """Warm the system prompt cache and read the participant profile.
+
+        Runs on _io_pool once route() picks a tool-use route. Returns the
+        profile (or None); errors are logged, never raised.
+        """
+        try:
+            self.memory.read_file_cached("prompts/system_short.md")
+            self.memory.read_file_cached("prompts/system_full.md")
+            return self.memory.get_participant(username)
+        except Exception as e:
+            logger.warning("Context prefetch failed for %s: %s", username, e)
+            return None
+
     def _process_with_tools(
         self,
         username: str,
@@ -551,53 +746,52 @@ class Agent:
         thread_context: str | None,
         route_data: dict,
         thread_root_id: str | None = None,
+        prefetched_profile: Future | None = None,
     ) -> str:
-        """Process message using tool-use / function-calling path."""
-        # Route-specific system prompt: full prompt only for heavy contract operations
-        _FULL_PROMPT_TYPES = {"contract_discussion", "new_contract_init", "problem_report", "expert_opinion"}
+        """Process message using tool-use / function-calling path.
 
+        prefetched_profile: Future from _prefetch_context, used instead of
+        re-reading the participant profile.
+        """
+        # Route-specific system prompt: full prompt only for heavy contract operations
         if route_data.get("type") in _FULL_PROMPT_TYPES:
-            system_prompt = self.memory.read_file("prompts/system_full.md") or ""
+            system_prompt = self.memory.read_file_cached("prompts/system_full.md") or ""
         else:
-            system_prompt = self.memory.read_file("prompts/system_short.md") or ""
+            system_prompt = self.memory.read_file_cached("prompts/system_short.md") or ""
+        # The system prompt is assembled from parts and joined once at the end
+        parts = [system_prompt]
 
         # Expert opinion mode: append advisory instructions
         if route_data.get("type") == "expert_opinion":
-            expert_prompt = self.memory.read_file("prompts/expert_opinion.md") or ""
+            expert_prompt = self.memory.read_file_cached("prompts/expert_opinion.md") or ""
             if expert_prompt:
-                system_prompt += "\n" + expert_prompt
+                parts += ("\n", expert_prompt)
 
         # Load context files
         load_files = route_data.get("load_files", [])
-        context_files = self.memory.load_files(load_files) if load_files else ""
+        context_files = self.memory.load_files(load_files, budget_chars=CONTEXT_FILES_MAX_CHARS) if load_files else ""
 
         # Load participant profile only for routes that need it
-        _PROFILE_ROUTES = {"contract_discussion", "new_contract_init", "problem_report", "profile_intro"}
-
         if route_data.get("type") in _PROFILE_ROUTES:
-            participant_profile = self.memory.get_participant(username) or ""
+            if prefetched_profile is not None:
+                participant_profile = prefetched_profile.result() or ""
+            else:
+                participant_profile = self.memory.get_participant(username) or ""
         else:
             participant_profile = ""
-        if participant_profile:
-            context_files += f"\n\n--- participants/{username}.md ---\n{participant_profile}"
-
-        full_system = system_prompt
 
         # Inject cross-contract summaries and glossary for heavy routes
         if route_data.get("type") in _FULL_PROMPT_TYPES:
             try:
-                summaries = self.memory.get_summaries()
-                if summaries:
-                    from src.contract_summary import format_summaries_for_prompt
-                    summaries_block = format_summaries_for_prompt(summaries)
-                    if summaries_block:
-                        full_system += "\n\n" + summaries_block
+                summaries_block = self._summaries_block()
+                if summaries_block:
+                    parts += ("\n\n", summaries_block)
             except Exception as e:
                 logger.warning("Failed to load contract summaries: %s", e)
             try:
-                glossary = self.memory.read_file("context/glossary.json")
+                glossary = self.memory.read_file_cached("context/glossary.json")
                 if glossary:
-                    full_system += "\n\n# Глоссарий (обязательная терминология)\n\n" + glossary
+                    parts += ("\n\n# Глоссарий (обязательная терминология)\n\n", glossary)
             except Exception:
                 pass
 
@@ -605,21 +799,29 @@ class Agent:
         entity = route_data.get("entity")
         route_type = route_data.get("type", "")
         if entity:
-            full_system += f"\n\n# Текущий контракт\n\nТы сейчас работаешь над контрактом: `{entity}`\n"
-            full_system += f"Тип задачи: {route_type}\n"
-            full_system += "НЕ переключайся на другие контракты, если пользователь не попросил об этом явно.\n"
+            parts.append(
+                f"\n\n# Текущий контракт\n\nТы сейчас работаешь над контрактом: `{entity}`\n"
+                f"Тип задачи: {route_type}\n"
+                "НЕ переключайся на другие контракты, если пользователь не попросил об этом явно.\n"
+            )
+
+        if context_files or participant_profile:
+            parts += ("\n\n# Загруженный контекст\n\n", context_files)
+        if participant_profile:
+            parts.append(f"\n\n--- participants/{username}.md ---\n{participant_profile}")
 
-        if context_files:
-            full_system += "\n\n# Загруженный контекст\n\n" + context_files
+        full_system = "".join(parts)
 
         # Build user message
-        user_msg = f"@{username}: {message}"
         if thread_context:
-            user_msg = f"Контекст треда:\n{thread_context}\n\nНовое сообщение:\n{user_msg}"
+            user_msg = f"Контекст треда:\n{thread_context}\n\nНовое сообщение:\n@{username}: {message}"
+        else:
+            user_msg = f"@{username}: {message}"
 
         # Determine available tools based on route type
         tools = get_tools_for_route(route_data.get("type", ""), channel_type != "dm")
 
+        # Per message: thread_root_id is request state and messages may be handled concurrently
         executor = ToolExecutor(self.memory, self.mm, self.llm, thread_root_id=thread_root_id)
 
         # Use expert model for expert_opinion route
@@ -637,8 +839,27 @@ class Agent:
         )
         return reply
 
+    def _summaries_block(self) -> str:
+        """Contract-landscape prompt block, re-formatted only when summaries.json changes."""
+        read = getattr(self.memory, "read_json_cached", self.memory.read_json)
+        summaries = read("contracts/summaries.json")
+        if not isinstance(summaries, dict) or not summaries:
+            return ""
+        # Memory returns the same dict object while summaries.json is unchanged
+        cached = self._summaries_prompt
+        if cached and cached[0] is summaries:
+            return cached[1]
+        from src.contract_summary import format_summaries_for_prompt
+        block = format_summaries_for_prompt(summaries)
+        self._summaries_prompt = (summaries, block)
+        return block
+
     def onboard_participant(self, user_id: str, username: str, display_name: str) -> None:
-        """Create basic profile and send welcome DM."""
+        """Create basic profile and send welcome DM.
+
+        The profile is written before returning; the DM is sent in the
+        background.
+        """
         # Check if profile already exists
         existing = self.memory.get_participant(username)
         if existing:
@@ -648,23 +869,25 @@ class Agent:
         # Create basic profile
         now = datetime.now(timezone.utc).strftime("%Y-%m-%d")
         try:
-            self.memory.set_participant_active(username, True)
-            self.memory.set_participant_onboarded(username, True)
+            # One participants/index.json write; joined_at matches the profile date
+            with self.memory.transaction():
+                self.memory.set_participant_active(username, True, today=now)
+                self.memory.set_participant_onboarded(username, True)
         except Exception:
             # best-effort
             pass
-        profile = PARTICIPANT_TEMPLATE.format(
-            display_name=display_name or username,
-            username=username,
-            date=now,
-        )
+        name = display_name or username
+        p0, p1, p2, p3 = _PARTICIPANT_PARTS
+        profile = "".join((p0, name, p1, username, p2, now, p3))
         self.memory.update_participant(username, profile)
         logger.info("Created profile for %s", username)
 
         # Send welcome DM
-        welcome = ONBOARD_TEMPLATE.format(
-            display_name=display_name or username,
-        )
+        welcome = _ONBOARD_PARTS[0] + name + _ONBOARD_PARTS[1]
+        self._dm_pool.submit(self._send_onboard_dm, user_id, username, welcome)
+
+    def _send_onboard_dm(self, user_id: str, username: str, welcome: str) -> None:
+        """Send the onboarding DM (runs on _dm_pool)."""
         try:
             self.mm.send_dm(user_id, welcome)
             logger.info("Sent onboard DM to %s", username)
@@ -1,7 +1,11 @@
 from __future__ import annotations
 
 import re
+from collections import Counter
+from collections.abc import Iterator
 from dataclasses import dataclass
+from functools import lru_cache
+from itertools import combinations
 
 
 @dataclass
@@ -14,76 +18,78 @@ class Conflict:
 
 
 RE_H2 = re.compile(r"^##\s+(.+?)\s*$")
+RE_DATA_CONTRACT_H1 = re.compile(r"^[ \t]*# data contract:([^\n]*)", re.IGNORECASE | re.MULTILINE)
 
-STOP_WORDS_RU = {
+AMBIGUOUS_FORMULA_WORDS = ("примерно", "около", "приблизительно", "где-то", "как-то", "иногда")
+RE_AMBIGUOUS_FORMULA = re.compile("|".join(map(re.escape, AMBIGUOUS_FORMULA_WORDS)), re.IGNORECASE)
+
+# a term: >= 3 chars, no leading/trailing "-" or "_"
+RE_DEF_TOKENS = re.compile(r"[a-zа-я0-9][a-zа-я0-9_\-]+[a-zа-я0-9]", re.IGNORECASE)
+RE_REL_BULLET = re.compile(r"^[\-*•]\s+")
+RE_REL_ID = re.compile(r"[^a-zA-Z0-9_\-]")
+
+STOP_WORDS_RU = frozenset({
     "и", "в", "во", "на", "по", "из", "для", "что", "это", "как", "когда", "где", "или", "а",
     "мы", "вы", "они", "он", "она", "оно", "этот", "эта", "эти", "тот", "та", "те",
     "не", "нет", "да", "же", "ли", "бы",
     "секция", "контракт", "метрика", "показатель",
-}
+})
 
 
 def _extract_sections(md: str) -> dict[str, str]:
     md = md or ""
+    if "##" not in md:
+        return {}
     sections: dict[str, list[str]] = {}
     current: str | None = None
     for line in md.splitlines():
-        m = RE_H2.match(line)
-        if m:
-            current = m.group(1).strip()
-            sections.setdefault(current, [])
-            continue
+        if line.startswith("##"):
+            m = RE_H2.match(line)
+            if m:
+                current = m.group(1).strip()
+                sections.setdefault(current, [])
+                continue
         if current is not None:
             sections[current].append(line)
     return {k: "\n".join(v).strip() for k, v in sections.items()}
 
 
+class _NormTable(dict):
+    """str.translate table: keep a-z, 0-9 and whitespace, map anything else to a space."""
+
+    def __missing__(self, code: int) -> str:
+        ch = chr(code)
+        out = ch if ("a" <= ch <= "z" or "0" <= ch <= "9" or ch.isspace()) else " "
+        self[code] = out
+        return out
+
+
+_NORM_TABLE = _NormTable()
+
+
+@lru_cache(maxsize=2048)
 def _normalize_name(name: str) -> str:
-    s = (name or "").strip().lower()
-    # treat punctuation/hyphens/underscores as spaces
-    s = re.sub(r"[\-_/:]+", " ", s)
-    s = re.sub(r"[^a-z0-9\s]", " ", s)
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
+    # punctuation/hyphens/underscores/non-latin become spaces, then collapse
+    return " ".join((name or "").lower().translate(_NORM_TABLE).split())
 
 
-def _tokenize_definition(text: str) -> set[str]:
-    text = (text or "").lower()
-    # keep words and digits
-    tokens = re.findall(r"[a-zа-я0-9_\-]+", text, flags=re.IGNORECASE)
-    out: set[str] = set()
-    for t in tokens:
-        t = t.strip("-_")
-        if len(t) < 3:
-            continue
-        if t in STOP_WORDS_RU:
-            continue
-        out.add(t)
-    return out
+EXTRA_TIME_NORM = _normalize_name("Extra Time")
 
 
-def _jaccard(a: set[str], b: set[str]) -> float:
-    if not a and not b:
-        return 1.0
-    if not a or not b:
-        return 0.0
-    inter = len(a & b)
-    union = len(a | b)
-    return inter / union if union else 0.0
+def _tokenize_definition(text: str) -> set[str]:
+    # keep words and digits
+    return {t for t in RE_DEF_TOKENS.findall((text or "").lower()) if t not in STOP_WORDS_RU}
 
 
 def _extract_name(md: str) -> str | None:
-    for line in (md or "").splitlines():
-        s = line.strip()
-        if not s:
-            continue
-        if s.lower().startswith("# data contract:"):
-            return s.split(":", 1)[1].strip() or None
-    return None
+    m = RE_DATA_CONTRACT_H1.search(md or "")
+    return (m.group(1).strip() or None) if m else None
 
 
-def _extract_related_contract_ids(md: str) -> list[str]:
-    sections = _extract_sections(md)
+def _extract_related_contract_ids(md: str, sections: dict[str, str] | None = None) -> list[str]:
+    """Contract ids listed under «Связанные контракты» (sections: md already parsed)."""
+    if sections is None:
+        sections = _extract_sections(md)
     rel = sections.get("Связанные контракты", "")
     if not rel:
         return []
@@ -93,10 +99,10 @@ def _extract_related_contract_ids(md: str) -> list[str]:
         if not s:
             continue
         # accept "- id" / "* id" / "id"
-        s = re.sub(r"^[\-*•]\s+", "", s)
+        s = RE_REL_BULLET.sub("", s)
         # take first token-ish
         s = s.split("(", 1)[0].strip()
-        s = re.sub(r"[^a-zA-Z0-9_\-]", "", s)
+        s = RE_REL_ID.sub("", s)
         if s:
             ids.append(s.lower())
     return ids
@@ -136,7 +142,7 @@ class MetricsAnalyzer:
             name = _extract_name(md) or c.get("name") or cid
             formula = sections.get("Формула", "")
             linkage = sections.get("Связь с Extra Time", "")
-            related = _extract_related_contract_ids(md)
+            related = _extract_related_contract_ids(md, sections)
             definition = sections.get("Определение", "")
             loaded[cid] = {
                 "id": cid,
@@ -147,18 +153,15 @@ class MetricsAnalyzer:
                 "related": related,
                 "definition": (definition or "").strip(),
                 "def_tokens": _tokenize_definition(definition or ""),
+                "data_source": sections.get("Источник данных", "").strip(),
             }
 
         # Missing key sections + basic quality checks
-        ambiguous_words = ["примерно", "около", "приблизительно", "где-то", "как-то", "иногда"]
-
         for cid, d in loaded.items():
             if target_ids and cid not in target_ids:
                 continue
-            md = self.memory.get_contract(cid) or ""
-            sections = _extract_sections(md)
 
-            if not (d.get("formula") or "").strip():
+            if not d["formula"]:
                 conflicts.append(Conflict(
                     type="missing_formula",
                     severity="high",
@@ -167,8 +170,7 @@ class MetricsAnalyzer:
                     contracts=[cid],
                 ))
             else:
-                lowf = d["formula"].lower()
-                if any(w in lowf for w in ambiguous_words):
+                if RE_AMBIGUOUS_FORMULA.search(d["formula"]):
                     conflicts.append(Conflict(
                         type="ambiguous_formula",
                         severity="medium",
@@ -177,8 +179,7 @@ class MetricsAnalyzer:
                         contracts=[cid],
                     ))
 
-            definition = sections.get("Определение", "").strip()
-            if not definition:
+            if not d["definition"]:
                 conflicts.append(Conflict(
                     type="missing_definition",
                     severity="high",
@@ -187,8 +188,7 @@ class MetricsAnalyzer:
                     contracts=[cid],
                 ))
 
-            src = sections.get("Источник данных", "").strip()
-            if not src:
+            if not d["data_source"]:
                 conflicts.append(Conflict(
                     type="missing_data_source",
                     severity="high",
@@ -233,7 +233,7 @@ class MetricsAnalyzer:
                     contracts=[cid],
                 ))
             else:
-                if _normalize_name(parts[-1]) != _normalize_name("Extra Time"):
+                if _normalize_name(parts[-1]) != EXTRA_TIME_NORM:
                     conflicts.append(Conflict(
                         type="extra_time_path_not_ending",
                         severity="medium",
@@ -243,7 +243,7 @@ class MetricsAnalyzer:
                     ))
 
                 # Compare first part with metric name (normalized)
-                if _normalize_name(parts[0]) != _normalize_name(d["name"]):
+                if _normalize_name(parts[0]) != d["name_norm"]:
                     conflicts.append(Conflict(
                         type="extra_time_path_not_starting",
                         severity="low",
@@ -306,12 +306,16 @@ class MetricsAnalyzer:
             graph[cid] = [x for x in rel if x in loaded]
 
         # Cycle detection (dedup by canonical cycle key)
-        seen: set[str] = set()
-        stack: set[str] = set()
-        path: list[str] = []
-        reported_cycles: set[tuple[str, ...]] = set()
-
-        def _canon_cycle(cycle: list[str]) -> tuple[str, ...]:
+        # Nodes are dense indices into cids; ids are only materialized for reported cycles.
+        cids = list(loaded.keys())
+        idx_of = {c: i for i, c in enumerate(cids)}
+        graph_idx = [[idx_of[v] for v in graph[c]] for c in cids]
+        seen = bytearray(len(cids))
+        pos = [-1] * len(cids)  # index in path while the node is on the current DFS path
+        path: list[int] = []
+        reported_cycles: set[tuple[int, ...]] = set()
+
+        def _canon_cycle(cycle: list[int]) -> tuple[int, ...]:
             if len(cycle) < 3:
                 return tuple(cycle)
             core = cycle[:-1] if cycle and cycle[0] == cycle[-1] else cycle
@@ -320,22 +324,33 @@ class MetricsAnalyzer:
             rots = [tuple(core[i:] + core[:i]) for i in range(len(core))]
             return min(rots)
 
-        def dfs(u: str):
-            seen.add(u)
-            stack.add(u)
-            path.append(u)
-            for v in graph.get(u, []):
-                if v not in seen:
-                    dfs(v)
-                elif v in stack:
-                    try:
-                        idx = path.index(v)
-                        cycle = path[idx:] + [v]
-                    except ValueError:
-                        cycle = [u, v, u]
-                    key = _canon_cycle(cycle)
+        # Iterative DFS: a (node, edge iterator) work stack instead of recursion
+        for root in range(len(cids)):
+            if seen[root]:
+                continue
+            seen[root] = 1
+            pos[root] = 0
+            path.append(root)
+            work: list[tuple[int, Iterator[int]]] = [(root, iter(graph_idx[root]))]
+            while work:
+                u, it = work[-1]
+                v = next(it, -1)
+                if v < 0:
+                    work.pop()
+                    path.pop()
+                    pos[u] = -1
+                    continue
+                if not seen[v]:
+                    seen[v] = 1
+                    pos[v] = len(path)
+                    path.append(v)
+                    work.append((v, iter(graph_idx[v])))
+                elif pos[v] >= 0:
+                    cycle_idx = path[pos[v]:] + [v]
+                    key = _canon_cycle(cycle_idx)
                     if key and key not in reported_cycles:
                         reported_cycles.add(key)
+                        cycle = [cids[x] for x in cycle_idx]
                         title = "Циклическая зависимость контрактов"
                         details = "Обнаружен цикл по секции «Связанные контракты»: " + " → ".join(cycle)
                         conflicts.append(Conflict(
@@ -345,55 +360,48 @@ class MetricsAnalyzer:
                             details=details,
                             contracts=list(dict.fromkeys(cycle)),
                         ))
-            stack.remove(u)
-            path.pop()
-
-        for cid in graph.keys():
-            if cid not in seen:
-                dfs(cid)
 
         # Overlapping definitions heuristic
-        # When target_ids is set, only compare targets vs all others (O(n*k))
-        cids = list(loaded.keys())
-        pairs_to_check: list[tuple[int, int]] = []
-        if target_ids:
-            target_indices = {i for i, c in enumerate(cids) if c in target_ids}
-            for i in target_indices:
-                for j in range(len(cids)):
-                    if i != j and (i, j) not in pairs_to_check and (j, i) not in pairs_to_check:
-                        pairs_to_check.append((min(i, j), max(i, j)))
-        else:
-            for i in range(len(cids)):
-                for j in range(i + 1, len(cids)):
-                    pairs_to_check.append((i, j))
-
-        for i, j in pairs_to_check:
-                a = loaded[cids[i]]
-                b = loaded[cids[j]]
-                if a["name_norm"] == b["name_norm"]:
-                    continue
-                a_tokens = a.get("def_tokens") or set()
-                b_tokens = b.get("def_tokens") or set()
-                sim = _jaccard(a_tokens, b_tokens)
-                inter = a_tokens & b_tokens
-
-                # Heuristic: either high Jaccard OR enough shared keywords
-                # NOTE: for RU text with synonyms, Jaccard can be low; allow >=5 shared terms as a soft signal.
-                if (
-                    (sim >= 0.45 and len(a_tokens) >= 6 and len(b_tokens) >= 6)
-                    or (len(inter) >= 5)
-                ):
-                    shared_preview = ", ".join(sorted(list(inter))[:12])
-                    conflicts.append(Conflict(
-                        type="overlapping_definitions",
-                        severity="medium",
-                        title=f"Похоже пересекающиеся определения: {a['name']} ↔ {b['name']}",
-                        details=(
-                            f"Эвристика: сходство определений (Jaccard) = {sim:.2f}. "
-                            f"Общие термины: {shared_preview or '(нет)'}"
-                        ),
-                        contracts=[a["id"], b["id"]],
-                    ))
+        # Only pairs sharing at least one term can fire, so count shared terms
+        # per pair from an inverted index instead of scanning all N² pairs.
+        postings: dict[str, list[int]] = {}
+        for idx, cid in enumerate(cids):
+            for t in loaded[cid]["def_tokens"]:
+                postings.setdefault(t, []).append(idx)
+        shared_counts: Counter[tuple[int, int]] = Counter()
+        for plist in postings.values():
+            if len(plist) > 1:
+                shared_counts.update(combinations(plist, 2))
+
+        for (i, j), inter in sorted(shared_counts.items()):
+            # When target_ids is set, only compare targets vs all others
+            if target_ids and cids[i] not in target_ids and cids[j] not in target_ids:
+                continue
+            a = loaded[cids[i]]
+            b = loaded[cids[j]]
+            if a["name_norm"] == b["name_norm"]:
+                continue
+            a_len = len(a["def_tokens"])
+            b_len = len(b["def_tokens"])
+            sim = inter / (a_len + b_len - inter)
+
+            # Heuristic: either high Jaccard OR enough shared keywords
+            # NOTE: for RU text with synonyms, Jaccard can be low; allow >=5 shared terms as a soft signal.
+            if (
+                (sim >= 0.45 and a_len >= 6 and b_len >= 6)
+                or (inter >= 5)
+            ):
+                shared_preview = ", ".join(sorted(a["def_tokens"] & b["def_tokens"])[:12])
+                conflicts.append(Conflict(
+                    type="overlapping_definitions",
+                    severity="medium",
+                    title=f"Похоже пересекающиеся определения: {a['name']} ↔ {b['name']}",
+                    details=(
+                        f"Эвристика: сходство определений (Jaccard) = {sim:.2f}. "
+                        f"Общие термины: {shared_preview or '(нет)'}"
+                    ),
+                    contracts=[a["id"], b["id"]],
+                ))
 
         return conflicts
 
@@ -20,11 +20,13 @@ def _float(key: str, default: float) -> float:
 # ── Thread context ───────────────────────────────────────────────────────────
 THREAD_MAX_MESSAGES = _int("THREAD_MAX_MESSAGES", 15)
 THREAD_MAX_CHARS = _int("THREAD_MAX_CHARS", 4000)
+CONTEXT_FILES_MAX_CHARS = _int("CONTEXT_FILES_MAX_CHARS", 64000)  # route load_files in the tool-path prompt
 THREAD_TTL_DAYS = _int("THREAD_TTL_DAYS", 7)
 
 # ── Listener dedup ───────────────────────────────────────────────────────────
 DEDUP_TTL_SECONDS = _int("DEDUP_TTL_SECONDS", 86400)  # 24 hours
 DEDUP_MAX_ENTRIES = _int("DEDUP_MAX_ENTRIES", 4000)
+LISTENER_WORKERS = _int("LISTENER_WORKERS", 4)  # concurrent messages; 1 = handle inline
 
 # ── Memory I/O ───────────────────────────────────────────────────────────────
 WRITE_MAX_RETRIES = _int("WRITE_MAX_RETRIES", 3)
@@ -64,7 +66,14 @@ DASHBOARD_PORT = _int("DASHBOARD_PORT", 8050)
 
 # ── LLM ──────────────────────────────────────────────────────────────────────
 LLM_TIMEOUT_SECONDS = _int("LLM_TIMEOUT_SECONDS", 120)
+LLM_REQUEST_TIMEOUT_SECONDS = _float("LLM_REQUEST_TIMEOUT_SECONDS", 60.0)  # per attempt inside the tool loop
+LLM_REQUEST_MAX_RETRIES = _int("LLM_REQUEST_MAX_RETRIES", 2)  # in-turn retries on timeout/429/5xx
+LLM_STREAM_TOOLS = os.environ.get("DAAI_LLM_STREAM", "0") == "1"  # stream tool-loop completions
 EXPERT_MODEL = os.environ.get("EXPERT_MODEL", "openai/gpt-4.1")
+LLM_CACHE_ENABLED = os.environ.get("DAAI_LLM_CACHE", "0") == "1"
+LLM_CACHE_PATH = os.environ.get(
+    "DAAI_LLM_CACHE_PATH", os.path.join(os.path.expanduser("~"), ".cache", "daai", "agent_cache.sqlite")
+)
 BOT_DISPLAY_NAME = os.environ.get("BOT_DISPLAY_NAME", "Финист")
 BOT_USERNAME = os.environ.get("MATTERMOST_BOT_USERNAME", "")
 
@@ -37,28 +37,37 @@ def _snippet(text: str, max_len: int) -> str:
 
 def _extract_sections(md: str) -> dict[str, str]:
     """Extract ## sections from markdown (same logic as analyzer.py)."""
+    if "##" not in md:
+        return {}
     sections: dict[str, list[str]] = {}
     current: str | None = None
     for line in md.splitlines():
-        m = RE_H2.match(line)
-        if m:
-            current = m.group(1).strip()
-            sections.setdefault(current, [])
-            continue
+        if line.startswith("##"):
+            m = RE_H2.match(line)
+            if m:
+                current = m.group(1).strip()
+                sections.setdefault(current, [])
+                continue
         if current is not None:
             sections[current].append(line)
     return {k: "\n".join(v).strip() for k, v in sections.items()}
 
 
-def generate_summary(contract_id: str, markdown: str, status: str) -> dict:
-    """Generate a deterministic summary dict from contract markdown."""
+def generate_summary(
+    contract_id: str, markdown: str, status: str, sections: dict[str, str] | None = None,
+) -> dict:
+    """Generate a deterministic summary dict from contract markdown.
+
+    sections: the markdown's ## sections if the caller already parsed them.
+    """
     md = markdown or ""
 
     # Extract name from # Data Contract: <name>
     m = RE_H1.search(md)
     name = m.group(1).strip() if m else contract_id
 
-    sections = _extract_sections(md)
+    if sections is None:
+        sections = _extract_sections(md)
 
     result = {
         "id": contract_id,
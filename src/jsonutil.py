@@ -0,0 +1,54 @@
+"""JSON helpers: orjson when installed, stdlib json otherwise.
+
+Output is equivalent to the stdlib calls used across the codebase
+(`ensure_ascii=False`, optionally `indent=2`); compact output omits the
+spaces after separators. Values orjson can't handle (e.g. ints wider than
+64 bits) fall back to the stdlib encoder.
+"""
+
+from __future__ import annotations
+
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+def dumps(obj) -> str:
+    """Compact JSON, equivalent to json.dumps(obj, ensure_ascii=False)."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+        except TypeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def dumps_pretty(obj) -> str:
+    """Indented JSON, like json.dumps(obj, ensure_ascii=False, indent=2)."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode("utf-8")
+        except TypeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False, indent=2)
+
+
+def loads(data: str | bytes):
+    """Parse JSON; raises json.JSONDecodeError (orjson's error subclasses it)."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def object_text(text: str) -> str | None:
+    """Slice from the first '{' to the last '}' of an LLM response, or None.
+
+    Same span a greedy DOTALL '{.*}' search finds, without its backtracking
+    on output with many unbalanced braces.
+    """
+    i = text.find("{")
+    j = text.rfind("}")
+    return text[i : j + 1] if i >= 0 and j > i else None
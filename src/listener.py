@@ -1,18 +1,37 @@
 from __future__ import annotations
 
+import asyncio
 import hashlib
-import json
 import logging
 import os
+import re
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
-from src.config import DEDUP_TTL_SECONDS, DEDUP_MAX_ENTRIES, RESPONSE_DEDUP_WINDOW_SECONDS
+from src import jsonutil
+from src.config import (
+    DEDUP_TTL_SECONDS, DEDUP_MAX_ENTRIES, RESPONSE_DEDUP_WINDOW_SECONDS, LISTENER_WORKERS,
+)
 
 logger = logging.getLogger(__name__)
 
 _DEDUP_FILE = "tasks/seen_posts.json"
 
+# Striped locks that serialize messages of the same conversation (thread root)
+_CONVERSATION_LOCK_STRIPES = 64
+
+# Words that make a first ping from a new user look like an actual request
+_REQUEST_KEYWORDS_RE = re.compile(
+    "|".join([
+        "контракт", "статус", "начни", "покажи", "очеред", "план", "расхожд", "проблем",
+        "сохран", "зафикс", "обнов", "создай", "создать",
+        "аудит", "конфликт", "проверь",
+        "reminder", "дайджест", "digest",
+    ]),
+    re.IGNORECASE,
+)
+
 
 class Listener:
     def __init__(self, agent, mattermost_client, planner=None):
@@ -24,11 +43,22 @@ class Listener:
         self._seen_post_ids = set()
         self._inflight_post_ids = set()
         self._dedup_lock = threading.Lock()
+        self._persist_lock = threading.Lock()  # seen_posts.json read-modify-write
 
         # Response dedup: prevent sending near-identical replies in the same thread
         self._recent_replies: dict[str, tuple[float, str]] = {}
         self._reply_dedup_lock = threading.Lock()
 
+        # Concurrent handling: events run on a worker pool so slow LLM calls
+        # neither block the WebSocket loop nor queue unrelated conversations.
+        self._pool = (
+            ThreadPoolExecutor(max_workers=LISTENER_WORKERS, thread_name_prefix="listener")
+            if LISTENER_WORKERS > 1 else None
+        )
+        self._conversation_locks = [threading.Lock() for _ in range(_CONVERSATION_LOCK_STRIPES)]
+        # Futures of events handed to the pool and not finished yet
+        self._pending: set[asyncio.Future] = set()
+
         # Load persisted dedup state
         self._load_seen_posts()
 
@@ -50,6 +80,10 @@ class Listener:
 
     def _persist_seen_post(self, post_id: str):
         """Append a post_id to the persistent dedup file (best-effort)."""
+        with self._persist_lock:
+            self._persist_seen_post_locked(post_id)
+
+    def _persist_seen_post_locked(self, post_id: str):
         try:
             data = self.agent.memory.read_json(_DEDUP_FILE)
             if not isinstance(data, dict) or not isinstance(data.get("posts"), list):
@@ -77,14 +111,33 @@ class Listener:
         self.mm.connect_websocket(self._handle_event_async)
 
     async def _handle_event_async(self, event_raw):
-        """Async wrapper required by mattermostdriver WebSocket."""
-        self._handle_event(event_raw)
+        """Async wrapper required by mattermostdriver WebSocket.
+
+        With a worker pool the event is handed off without awaiting it, so
+        the WebSocket keeps reading while earlier messages are processed.
+        """
+        if self._pool is None:
+            self._handle_event(event_raw)
+            return
+        fut = asyncio.get_running_loop().run_in_executor(self._pool, self._handle_event, event_raw)
+        self._pending.add(fut)
+        fut.add_done_callback(self._event_done)
+
+    def _event_done(self, fut: asyncio.Future) -> None:
+        """Forget a finished pool event and log anything that escaped _handle_event."""
+        self._pending.discard(fut)
+        if not fut.cancelled() and fut.exception() is not None:
+            logger.error("Event handler failed: %s", fut.exception(), exc_info=fut.exception())
+
+    def _conversation_lock(self, key: str) -> threading.Lock:
+        """Lock shared by all messages of one conversation (keyed by thread root)."""
+        return self._conversation_locks[hash(key) % _CONVERSATION_LOCK_STRIPES]
 
     def _handle_event(self, event_raw):
         """Handle a raw WebSocket event."""
         try:
             if isinstance(event_raw, str):
-                event = json.loads(event_raw)
+                event = jsonutil.loads(event_raw)
             else:
                 event = event_raw
 
@@ -109,7 +162,7 @@ class Listener:
             return
 
         if isinstance(post_raw, str):
-            post = json.loads(post_raw)
+            post = jsonutil.loads(post_raw)
         else:
             post = post_raw
 
@@ -144,7 +197,9 @@ class Listener:
                 self._inflight_post_ids.add(post_id)
 
         try:
-            self._process_posted(post_id, root_id, user_id, channel_id, message, data)
+            # Replies in one thread are handled in order; other conversations run in parallel
+            with self._conversation_lock(root_id or post_id):
+                self._process_posted(post_id, root_id, user_id, channel_id, message, data)
         finally:
             if post_id:
                 with self._dedup_lock:
@@ -251,16 +306,7 @@ class Listener:
 
                     # If this looks like a simple hello/first ping (not an actual request),
                     # stop here to avoid spamming the channel with a second long welcome.
-                    low = message.lower()
-                    looks_like_real_request = (
-                        ("?" in message)
-                        or any(k in low for k in [
-                            "контракт", "статус", "начни", "покажи", "очеред", "план", "расхожд", "проблем",
-                            "сохрани", "сохран", "зафикс", "обнов", "создай", "создать",
-                            "аудит", "конфликт", "проверь",
-                            "reminder", "дайджест", "digest",
-                        ])
-                    )
+                    looks_like_real_request = ("?" in message) or bool(_REQUEST_KEYWORDS_RE.search(message))
                     if not looks_like_real_request and len(message) <= 120:
                         return
 
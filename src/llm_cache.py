@@ -0,0 +1,75 @@
+"""Persistent response cache for LLM calls.
+
+Used to skip repeated identical requests during development
+(e.g. re-running scripts/test_tools_live.py with DAAI_LLM_CACHE=1). Only
+clients that are given a cache use one; the bot's LLMClient has none.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(*parts) -> str:
+    """Stable sha256 key over JSON-serializable request parts."""
+    raw = json.dumps(list(parts), sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class BaseCache(ABC):
+    """Minimal cache interface: lookup(key) -> str | None, update(key, value)."""
+
+    @abstractmethod
+    def lookup(self, key: str) -> str | None:
+        ...
+
+    @abstractmethod
+    def update(self, key: str, value: str) -> None:
+        ...
+
+
+class DiskCache(BaseCache):
+    """SQLite-backed cache: one row per key, value stored as UTF-8 blob."""
+
+    def __init__(self, path: str):
+        self.path = path
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, ts INTEGER NOT NULL)"
+        )
+        self._conn.commit()
+
+    def lookup(self, key: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return bytes(row[0]).decode("utf-8")
+
+    def update(self, key: str, value: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, ts) VALUES (?, ?, ?)",
+                (key, value.encode("utf-8"), int(time.time())),
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
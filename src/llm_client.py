@@ -1,39 +1,221 @@
+import hashlib
 import json
 import logging
 import os
 import re
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from types import SimpleNamespace
 from typing import Callable
 
+import httpx
 import openai
 
-from src.config import LLM_TIMEOUT_SECONDS, EXPERT_MODEL
+from src.config import (
+    LLM_TIMEOUT_SECONDS,
+    LLM_REQUEST_TIMEOUT_SECONDS,
+    LLM_REQUEST_MAX_RETRIES,
+    LLM_STREAM_TOOLS,
+    EXPERT_MODEL,
+)
+from src import jsonutil
+from src.tool_definitions import READ_TOOLS
+from src.llm_cache import BaseCache, make_cache_key
 
 logger = logging.getLogger(__name__)
 
-_INVOKE_RE = re.compile(r'<invoke\s+name="([^"]+)">\s*(.*?)</invoke>', re.DOTALL)
-_PARAM_RE = re.compile(r'<parameter\s+name="([^"]+)">(.*?)</parameter>', re.DOTALL)
+# Opening tags only: bodies are found with str.find on the closing tag, so
+# unmatched or malformed tags cost one linear scan instead of regex backtracking.
+_INVOKE_OPEN_RE = re.compile(r'<invoke\s+name="([^"]+)">')
+_PARAM_OPEN_RE = re.compile(r'<parameter\s+name="([^"]+)">')
+
+
+def _iter_tags(text: str, open_re: re.Pattern, close: str):
+    """Yield (name, body, start, end) for each <tag name="...">body</tag> in text."""
+    pos = 0
+    while True:
+        m = open_re.search(text, pos)
+        if m is None:
+            return
+        end = text.find(close, m.end())
+        if end < 0:
+            return  # no closing tag after this opener, so none after later ones either
+        yield m.group(1), text[m.end():end], m.start(), end + len(close)
+        pos = end + len(close)
+
+
+def _split_xml_tool_calls(content: str) -> tuple[list[tuple[str, dict]], str]:
+    """Parse XML <invoke> tool calls from text and strip them in one pass.
+
+    Returns ([(tool_name, args_dict)], content without the invoke blocks).
+    """
+    calls: list[tuple[str, dict]] = []
+    # Plain-text replies (the common case) skip the scan entirely
+    if "</invoke>" not in content:
+        return calls, content
+    kept: list[str] = []
+    prev = 0
+    for name, body, start, end in _iter_tags(content, _INVOKE_OPEN_RE, "</invoke>"):
+        args = {pname: value.strip() for pname, value, _, _ in _iter_tags(body, _PARAM_OPEN_RE, "</parameter>")}
+        calls.append((name, args))
+        kept.append(content[prev:start])
+        prev = end
+    if not calls:
+        return calls, content
+    kept.append(content[prev:])
+    return calls, "".join(kept).strip()
+
+
+# Read-only tools may run concurrently when the model requests several at once
+_PARALLEL_SAFE_TOOLS = frozenset(t["function"]["name"] for t in READ_TOOLS)
+_MAX_TOOL_WORKERS = 4
+
+
+def _tool_call_key(name: str, args: dict) -> str:
+    raw = name + json.dumps(args, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _execute_tool_calls(
+    calls: list[tuple[str, dict]],
+    tool_executor: Callable[[str, dict], dict],
+    seen: dict[str, dict] | None = None,
+) -> list[dict]:
+    """Execute tool calls, returning results in call order.
+
+    Runs them in parallel only when there are several and all are read-only;
+    anything involving a write stays sequential to keep state changes ordered.
+
+    `seen` memoizes read-only results for the current tool loop: a repeated
+    identical read call is answered from it instead of re-executing. Any write
+    call clears it, since the state the reads saw may have changed.
+    """
+    if seen is None:
+        seen = {}
+
+    if len(calls) > 1 and all(name in _PARALLEL_SAFE_TOOLS for name, _ in calls):
+        keys = [_tool_call_key(name, args) for name, args in calls]
+        pending = {k: c for k, c in zip(keys, calls) if k not in seen}
+        if len(pending) > 1:
+            with ThreadPoolExecutor(max_workers=min(len(pending), _MAX_TOOL_WORKERS)) as pool:
+                results = pool.map(lambda c: tool_executor(c[0], c[1]), pending.values())
+                seen.update(zip(pending.keys(), results))
+        else:
+            for k, (name, args) in pending.items():
+                seen[k] = tool_executor(name, args)
+        return [seen[k] for k in keys]
 
-
-def _parse_xml_tool_calls(content: str) -> list[tuple[str, dict]]:
-    """Parse XML <invoke> tool calls from text. Returns [(tool_name, args_dict)]."""
     results = []
-    for m in _INVOKE_RE.finditer(content):
-        tool_name = m.group(1)
-        args = {}
-        for pm in _PARAM_RE.finditer(m.group(2)):
-            args[pm.group(1)] = pm.group(2).strip()
-        results.append((tool_name, args))
+    for name, args in calls:
+        if name in _PARALLEL_SAFE_TOOLS:
+            key = _tool_call_key(name, args)
+            if key in seen:
+                logger.info("Tool call %s repeated — reusing result", name)
+            else:
+                seen[key] = tool_executor(name, args)
+            results.append(seen[key])
+        else:
+            results.append(tool_executor(name, args))
+            seen.clear()
     return results
 
 
-def _strip_xml_invokes(content: str) -> str:
-    """Remove <invoke>...</invoke> blocks from content."""
-    return _INVOKE_RE.sub('', content).strip()
+class _StreamedMessage:
+    """Assistant message assembled from streamed chunks.
+
+    Mirrors the attributes the tool loop reads from SDK messages
+    (`content`, `tool_calls[i].id/.function.name/.function.arguments`).
+    """
+
+    def __init__(self, content: str | None, tool_calls: list):
+        self.role = "assistant"
+        self.content = content
+        self.tool_calls = tool_calls or None
+
+    def to_dict(self) -> dict:
+        d = {"role": "assistant", "content": self.content}
+        if self.tool_calls:
+            d["tool_calls"] = [
+                {
+                    "id": tc.id,
+                    "type": "function",
+                    "function": {"name": tc.function.name, "arguments": tc.function.arguments},
+                }
+                for tc in self.tool_calls
+            ]
+        return d
+
+
+def _assemble_stream(stream, on_tool_call: Callable[[str, str], None] | None = None) -> SimpleNamespace:
+    """Collect a streamed chat completion into a response-like object.
+
+    Tool-call fragments arrive keyed by `index`; their `arguments` strings are
+    concatenated per index. Returns an object with `.choices[0].message` and
+    `.usage`, like a non-streamed response.
+
+    `on_tool_call(name, arguments)` is invoked for each tool call as soon as
+    it is complete (the stream has moved on to a later index), while the rest
+    of the response is still being generated.
+    """
+    content_parts: list[str] = []
+    calls: dict[int, dict] = {}
+    done = 0  # calls below this index have been passed to on_tool_call
+    usage = None
+    for chunk in stream:
+        if getattr(chunk, "usage", None):
+            usage = chunk.usage
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        if delta.content:
+            content_parts.append(delta.content)
+        for tcd in delta.tool_calls or []:
+            if on_tool_call is not None and tcd.index > done:
+                for i in range(done, tcd.index):
+                    if i in calls:
+                        on_tool_call(calls[i]["name"], "".join(calls[i]["arguments"]))
+                done = tcd.index
+            slot = calls.setdefault(tcd.index, {"id": None, "name": "", "arguments": []})
+            if tcd.id:
+                slot["id"] = tcd.id
+            if tcd.function is not None:
+                if tcd.function.name:
+                    slot["name"] += tcd.function.name
+                if tcd.function.arguments:
+                    slot["arguments"].append(tcd.function.arguments)
+
+    tool_calls = [
+        SimpleNamespace(
+            id=c["id"] or f"stream_{i}",
+            type="function",
+            function=SimpleNamespace(name=c["name"], arguments="".join(c["arguments"]) or "{}"),
+        )
+        for i, c in sorted(calls.items())
+    ]
+    message = _StreamedMessage("".join(content_parts) or None, tool_calls)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+def _system_message(system_prompt: str, model: str) -> dict:
+    """Build the system message; mark it cacheable for Anthropic models.
+
+    OpenRouter forwards `cache_control` to Anthropic, so the static system
+    prompt is billed/prefilled once per cache window instead of every turn.
+    Other providers (OpenAI, Gemini) cache long prefixes automatically.
+    """
+    if model.startswith("anthropic/"):
+        return {
+            "role": "system",
+            "content": [
+                {"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}},
+            ],
+        }
+    return {"role": "system", "content": system_prompt}
 
 
 class LLMClient:
-    def __init__(self):
+    def __init__(self, cache: BaseCache | None = None):
         api_key = os.environ["OPENROUTER_API_KEY"]
         base_url = os.environ.get("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
         self.cheap_model = os.environ.get("CHEAP_MODEL", "anthropic/claude-3.5-haiku")
@@ -42,14 +224,51 @@ class LLMClient:
 
         self.expert_model = EXPERT_MODEL
 
+        # One pooled keep-alive connection set for all calls (incl. parallel
+        # tool-loop threads) so turns don't pay a fresh TLS handshake.
+        # SDK retries are off: _call and _create_completion retry with backoff themselves.
         self.client = openai.OpenAI(
             base_url=base_url,
             api_key=api_key,
             timeout=LLM_TIMEOUT_SECONDS,
+            max_retries=0,
+            http_client=openai.DefaultHttpxClient(
+                limits=httpx.Limits(max_keepalive_connections=8, max_connections=32),
+            ),
         )
         self.log_costs = os.environ.get("LOG_LLM_COSTS", "true").lower() == "true"
+        # Optional response cache for dev scripts (see llm_cache); never set in production
+        self.cache = cache
+        self._local = threading.local()
+        # Read-only tool calls started while a streamed turn is still generating
+        self._tool_pool = ThreadPoolExecutor(max_workers=_MAX_TOOL_WORKERS, thread_name_prefix="llm-tools")
         logger.info("LLM client initialized: cheap=%s, heavy=%s, expert=%s, fallback=%s, timeout=%ds", self.cheap_model, self.heavy_model, self.expert_model, self.fallback_model, LLM_TIMEOUT_SECONDS)
 
+    def warmup(self) -> None:
+        """Open a pooled connection to the API ahead of the first real call.
+
+        Best-effort: errors are logged and ignored.
+        """
+        try:
+            self.client.models.list()
+        except Exception as e:
+            logger.info("LLM warmup failed (ignored): %s", e)
+
+    def close(self) -> None:
+        """Release pooled HTTP connections (and the response cache, if any)."""
+        self.client.close()
+        self._tool_pool.shutdown(wait=False)
+        if self.cache is not None and hasattr(self.cache, "close"):
+            self.cache.close()
+
+    @property
+    def last_trace(self) -> list[dict]:
+        """Per-turn timings of the last call_with_tools made from this thread.
+
+        Each entry: {turn, latency_ms, tools_ms, prompt_tokens, completion_tokens}.
+        """
+        return getattr(self._local, "trace", [])
+
     def call_cheap(self, system_prompt: str, user_message: str) -> str:
         """Fast cheap call for routing and simple responses."""
         return self._call(
@@ -82,6 +301,10 @@ class LLMClient:
         max_turns: int = 5,
         max_tokens: int = 4000,
         model: str | None = None,
+        temperature: float = 0.3,
+        staged_tools: list[dict] | None = None,
+        stage_after: int = 1,
+        cache_salt: str | None = None,
     ) -> str:
         """Agentic loop: LLM calls tools, gets results, generates final text.
 
@@ -93,45 +316,120 @@ class LLMClient:
             max_turns: Maximum number of tool-calling rounds.
             max_tokens: Max tokens per LLM call.
             model: Override model (default: self.heavy_model).
+            temperature: Sampling temperature (0 for deterministic test runs).
+            staged_tools: Extra tools (e.g. write tools) offered only from turn
+                `stage_after` on; earlier turns send the smaller `tools` schema.
+            stage_after: First turn index at which `staged_tools` are added.
+            cache_salt: Extra response-cache key component, e.g. a hash of the
+                state the tools will read (see Memory.state_hash). Same prompt
+                with different state then misses the cache. A reply is only
+                cached if the loop ran no write tools: a hit replays the text,
+                not the tool calls, so their side effects would be skipped.
 
         Returns:
             Final text response from the LLM.
         """
         active_model = model or self.heavy_model
+        self._local.trace = []
+
+        cache_key = None
+        executor = tool_executor
+        writes: list[str] = []
+        if self.cache is not None:
+            cache_key = make_cache_key(
+                system_prompt, user_message, tools, active_model, temperature,
+                *([staged_tools, stage_after] if staged_tools else []),
+                *([cache_salt] if cache_salt else []),
+            )
+            cached = self.cache.lookup(cache_key)
+            if cached is not None:
+                logger.info("LLM [tools] cache hit key=%s", cache_key[:12])
+                return cached
+
+            def tracked(name: str, args: dict) -> dict:
+                if name not in _PARALLEL_SAFE_TOOLS:
+                    writes.append(name)
+                return tool_executor(name, args)
+
+            executor = tracked
+
+        reply = self._run_tool_loop(
+            system_prompt, user_message, tools, executor,
+            max_turns=max_turns, max_tokens=max_tokens, active_model=active_model,
+            temperature=temperature, staged_tools=staged_tools, stage_after=stage_after,
+        )
+        if cache_key is not None and reply and not writes:
+            self.cache.update(cache_key, reply)
+        return reply
 
+    def _run_tool_loop(
+        self,
+        system_prompt: str,
+        user_message: str,
+        tools: list[dict],
+        tool_executor: Callable[[str, dict], dict],
+        *,
+        max_turns: int,
+        max_tokens: int,
+        active_model: str,
+        temperature: float = 0.3,
+        staged_tools: list[dict] | None = None,
+        stage_after: int = 1,
+    ) -> str:
+        """Run the tool-calling loop against the API (no caching)."""
+        trace = self._local.trace
         messages = [
-            {"role": "system", "content": system_prompt},
+            _system_message(system_prompt, active_model),
             {"role": "user", "content": user_message},
         ]
 
-        for turn in range(max_turns):
+        staged_all = (tools + staged_tools) if staged_tools else tools
+        seen_calls: dict[str, dict] = {}
+        early: dict[str, Future] = {}
+
+        def start_read_call(name: str, arguments: str) -> None:
+            # Streaming only: run a finished read-only call while later ones stream.
+            # Writes still wait for the whole turn, so state changes stay ordered.
+            if name not in _PARALLEL_SAFE_TOOLS:
+                return
             try:
-                response = self.client.chat.completions.create(
-                    model=active_model,
-                    messages=messages,
-                    tools=tools if tools else openai.NOT_GIVEN,
-                    max_tokens=max_tokens,
-                    temperature=0.3,
-                    frequency_penalty=0.3,
-                )
-            except openai.APITimeoutError as e:
-                logger.warning("LLM timeout in tool loop (turn %d): %s", turn, e)
-                time.sleep(2 * (turn + 1))
-                continue
-            except openai.RateLimitError as e:
-                logger.warning("LLM rate limit in tool loop (turn %d): %s", turn, e)
-                time.sleep(2 * (turn + 1))
+                args = jsonutil.loads(arguments or "{}")
+            except json.JSONDecodeError:
+                return
+            key = _tool_call_key(name, args)
+            if key not in seen_calls and key not in early:
+                early[key] = self._tool_pool.submit(tool_executor, name, args)
+
+        for turn in range(max_turns):
+            turn_tools = staged_all if turn >= stage_after else tools
+            t0 = time.perf_counter()
+            response = self._create_completion(
+                turn,
+                on_tool_call=start_read_call,
+                model=active_model,
+                messages=messages,
+                tools=turn_tools if turn_tools else openai.NOT_GIVEN,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                frequency_penalty=0.3,
+            )
+            if response is None:
+                # Retries exhausted — give up on this turn, let the loop try again
                 continue
-            except openai.APIStatusError as e:
-                if e.status_code >= 500:
-                    logger.warning("LLM server error in tool loop (turn %d): %s", turn, e)
-                    time.sleep(2 * (turn + 1))
-                    continue
-                raise
 
             choice = response.choices[0]
             msg = choice.message
 
+            usage = response.usage
+            entry = {
+                "turn": turn,
+                "latency_ms": (time.perf_counter() - t0) * 1000,
+                "tools_ms": 0.0,
+                "prompt_tokens": usage.prompt_tokens if usage else None,
+                "completion_tokens": usage.completion_tokens if usage else None,
+            }
+            trace.append(entry)
+
             if self.log_costs and response.usage:
                 logger.info(
                     "LLM [tools turn=%d] model=%s prompt_tokens=%d completion_tokens=%d",
@@ -143,7 +441,7 @@ class LLMClient:
 
             # If no tool calls — check for XML fallback, otherwise return text
             if not msg.tool_calls:
-                xml_calls = _parse_xml_tool_calls(msg.content or "")
+                xml_calls, clean_content = _split_xml_tool_calls(msg.content or "")
                 if not xml_calls:
                     reply = msg.content or ""
                     if not reply.strip() and turn > 0:
@@ -151,7 +449,6 @@ class LLMClient:
                     return reply
 
                 logger.info("Fallback: parsed %d XML tool call(s) from text", len(xml_calls))
-                clean_content = _strip_xml_invokes(msg.content or "")
 
                 # Build synthetic tool_calls for message history
                 synth_calls = []
@@ -161,7 +458,7 @@ class LLMClient:
                         "type": "function",
                         "function": {
                             "name": tool_name,
-                            "arguments": json.dumps(args, ensure_ascii=False),
+                            "arguments": jsonutil.dumps(args),
                         }
                     })
 
@@ -171,32 +468,42 @@ class LLMClient:
                     "tool_calls": synth_calls,
                 })
 
-                for idx, (tool_name, args) in enumerate(xml_calls):
-                    result = tool_executor(tool_name, args)
+                t_tools = time.perf_counter()
+                results = _execute_tool_calls(xml_calls, tool_executor, seen_calls)
+                for idx, result in enumerate(results):
                     messages.append({
                         "role": "tool",
                         "tool_call_id": synth_calls[idx]["id"],
-                        "content": json.dumps(result, ensure_ascii=False),
+                        "content": jsonutil.dumps(result),
                     })
+                entry["tools_ms"] = (time.perf_counter() - t_tools) * 1000
                 continue
 
             # Append assistant message with tool calls
-            messages.append(msg)
+            messages.append(msg.to_dict() if isinstance(msg, _StreamedMessage) else msg)
 
             # Execute each tool and append results
+            t_tools = time.perf_counter()
+            for key, fut in early.items():
+                seen_calls[key] = fut.result()
+            early.clear()
+            calls = []
             for tc in msg.tool_calls:
                 try:
-                    args = json.loads(tc.function.arguments)
+                    args = jsonutil.loads(tc.function.arguments)
                 except json.JSONDecodeError:
                     args = {}
                     logger.warning("Failed to parse tool args for %s: %s", tc.function.name, tc.function.arguments)
+                calls.append((tc.function.name, args))
 
-                result = tool_executor(tc.function.name, args)
+            results = _execute_tool_calls(calls, tool_executor, seen_calls)
+            for tc, result in zip(msg.tool_calls, results):
                 messages.append({
                     "role": "tool",
                     "tool_call_id": tc.id,
-                    "content": json.dumps(result, ensure_ascii=False),
+                    "content": jsonutil.dumps(result),
                 })
+            entry["tools_ms"] = (time.perf_counter() - t_tools) * 1000
 
         # Max turns exceeded — return whatever text we have
         result = ""
@@ -211,6 +518,42 @@ class LLMClient:
             result = self._generate_fallback_reply(messages)
         return result
 
+    def _create_completion(self, turn: int, on_tool_call: Callable[[str, str], None] | None = None, **kwargs):
+        """One chat completion with a per-attempt timeout and quick retries.
+
+        Timeouts, connection errors, 429 and 5xx are retried up to
+        LLM_REQUEST_MAX_RETRIES times with exponential backoff (0.5s, 1s, ...).
+        When they are exhausted, waits 2*(turn+1)s and returns None so the
+        caller skips the turn; other API errors propagate. When streaming,
+        completed tool calls are reported to `on_tool_call` (see _assemble_stream).
+        """
+        for attempt in range(LLM_REQUEST_MAX_RETRIES + 1):
+            try:
+                if LLM_STREAM_TOOLS:
+                    stream = self.client.chat.completions.create(
+                        timeout=LLM_REQUEST_TIMEOUT_SECONDS,
+                        stream=True,
+                        stream_options={"include_usage": True},
+                        **kwargs,
+                    )
+                    return _assemble_stream(stream, on_tool_call)
+                return self.client.chat.completions.create(
+                    timeout=LLM_REQUEST_TIMEOUT_SECONDS,
+                    **kwargs,
+                )
+            except openai.APIConnectionError as e:  # includes APITimeoutError
+                logger.warning("LLM timeout in tool loop (turn %d, attempt %d): %s", turn, attempt + 1, e)
+            except openai.RateLimitError as e:
+                logger.warning("LLM rate limit in tool loop (turn %d, attempt %d): %s", turn, attempt + 1, e)
+            except openai.APIStatusError as e:
+                if e.status_code < 500:
+                    raise
+                logger.warning("LLM server error in tool loop (turn %d, attempt %d): %s", turn, attempt + 1, e)
+            if attempt < LLM_REQUEST_MAX_RETRIES:
+                time.sleep(0.5 * 2 ** attempt)
+        time.sleep(2 * (turn + 1))
+        return None
+
     def _generate_fallback_reply(self, messages: list) -> str:
         """Generate a reply via fallback model when tool loop produced empty response."""
         try:
@@ -291,7 +634,7 @@ class LLMClient:
 
                 return content
 
-            except openai.APITimeoutError as e:
+            except openai.APIConnectionError as e:  # includes APITimeoutError
                 logger.warning("LLM timeout (attempt %d/%d): %s", attempt, max_retries, e)
                 if attempt < max_retries:
                     time.sleep(backoff * attempt)
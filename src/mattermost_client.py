@@ -107,9 +107,8 @@ class MattermostClient:
 
     # ── Reading data ────────────────────────────────────────────────
 
-    def get_user_info(self, user_id: str) -> dict:
-        """Get username and display name for a user."""
-        user = self.driver.users.get_user(user_id)
+    @staticmethod
+    def _user_info(user: dict) -> dict:
         return {
             "user_id": user["id"],
             "username": user["username"],
@@ -117,6 +116,22 @@ class MattermostClient:
             "email": user.get("email", ""),
         }
 
+    def get_user_info(self, user_id: str) -> dict:
+        """Get username and display name for a user."""
+        user = self.driver.users.get_user(user_id)
+        return self._user_info(user)
+
+    def get_users_by_ids(self, user_ids: list[str]) -> dict[str, dict]:
+        """Get info for several users in one request (POST /users/ids).
+
+        Returns {user_id: info} in the get_user_info format; unknown ids are omitted.
+        """
+        ids = list(dict.fromkeys(u for u in user_ids if u))
+        if not ids:
+            return {}
+        users = self.driver.users.get_users_by_ids(ids) or []
+        return {u["id"]: self._user_info(u) for u in users if isinstance(u, dict) and u.get("id")}
+
     def get_channel_members(self) -> list[dict]:
         """Get members of the Data Contracts channel."""
         members = self.driver.channels.get_channel_members(self.channel_id)
@@ -177,9 +192,34 @@ class MattermostClient:
         except Exception:
             return None
 
+        return self._match_username(users, q)
+
+    def resolve_username_variants(self, text: str) -> str | None:
+        """resolve_username for free text like "Никита Корабовцев" in one search.
+
+        Searches by the first word (a superset of full-name matches), then
+        ranks the results locally: the full text first, then the first word.
+        """
+        q = (text or "").strip().lstrip("@").strip()
+        words = q.split()
+        if len(words) < 2:
+            return self.resolve_username(q)
+
+        try:
+            users = self.driver.users.search_users({"term": words[0]}) or []
+        except Exception:
+            return None
+
+        return self._match_username(users, q, fallback=False) or self._match_username(users, words[0])
+
+    @staticmethod
+    def _match_username(users: list, q: str, fallback: bool = True) -> str | None:
+        """Pick a username from search results for query q (lowercase) or None."""
+        ql = q.lower()
+
         # Prefer exact username match (case-insensitive)
         for u in users:
-            if isinstance(u, dict) and str(u.get("username") or "").lower() == q.lower():
+            if isinstance(u, dict) and str(u.get("username") or "").lower() == ql:
                 return str(u.get("username")).lower()
 
         # Prefer exact display name match
@@ -187,9 +227,12 @@ class MattermostClient:
             return f"{u.get('first_name','')} {u.get('last_name','')}".strip().lower()
 
         for u in users:
-            if isinstance(u, dict) and disp(u) and disp(u) == q.lower():
+            if isinstance(u, dict) and disp(u) and disp(u) == ql:
                 return str(u.get("username") or "").lower() or None
 
+        if not fallback:
+            return None
+
         # Fallback: first result with username
         for u in users:
             if isinstance(u, dict) and u.get("username"):
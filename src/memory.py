@@ -4,19 +4,180 @@ import json
 import logging
 import os
 import hashlib
+import threading
 import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
+from functools import wraps
 
+from src import jsonutil
 from src.config import WRITE_MAX_RETRIES, WRITE_BACKOFF_BASE, THREAD_TTL_DAYS
 
 logger = logging.getLogger(__name__)
 
+_TRUNCATE = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+_APPEND = os.O_WRONLY | os.O_CREAT | os.O_APPEND
+
+
+def _write_fd(fd: int, data: bytes) -> None:
+    """os.write until all of data is written."""
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def _write_bytes(full: str, data: bytes, flags: int = _TRUNCATE) -> None:
+    """Write encoded bytes through a raw fd, without a text-file object per write."""
+    fd = os.open(full, flags, 0o666)
+    try:
+        _write_fd(fd, data)
+    finally:
+        os.close(fd)
+
+
+def _locked(method):
+    """Run a Memory read-modify-write method under the instance's write lock.
+
+    Inside a transaction the lock is kept until the transaction flushes, so
+    the buffered result can't be overwritten by another thread's update.
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        tx = self._tx()
+        if tx is not None:
+            self._hold_write_lock(tx)
+            return method(self, *args, **kwargs)
+        with self._write_lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+@dataclass
+class _Transaction:
+    """Writes buffered by Memory.transaction() until it exits."""
+    writes: dict[str, str] = field(default_factory=dict)
+    appends: dict[str, list[str]] = field(default_factory=dict)
+    locked: bool = False  # holds Memory._write_lock until the flush
+
 
 class Memory:
     _ACTIVE_THREADS_FILE = "tasks/active_threads.json"
 
     def __init__(self):
         self.base_dir = os.environ.get("DATA_DIR", ".")
+        # Optional in-memory overlay (see enable_overlay); None = disk only
+        self._overlay: dict[str, str] | None = None
+        self._memory_only = False
+        self._overlay_lock = threading.Lock()
+        # Serializes read-modify-write updates (the @_locked methods and
+        # transaction flushes) across listener workers, scheduler and planner threads
+        self._write_lock = threading.RLock()
+        # full path -> (st_mtime_ns, st_size, text); see read_file_cached
+        self._file_cache: dict[str, tuple[int, int, str]] = {}
+        # full path -> ((st_mtime_ns, st_size), parsed JSON); see read_json_cached
+        self._json_cache: dict[str, tuple[tuple[int, int], dict | list]] = {}
+        # (full index path, st_mtime_ns, st_size) -> lower-cased id -> record
+        self._by_id_cache: tuple[tuple, dict[str, dict]] | None = None
+        # full path -> ((st_mtime_ns, st_size), normalized roles); see read_roles
+        self._roles_cache: dict[str, tuple[tuple[int, int], dict[str, list[str]]]] = {}
+        # (full path, limit) -> ((st_mtime_ns, st_size), entries); see get_contract_history
+        self._history_cache: dict[tuple[str, int | None], tuple[tuple[int, int], list[dict]]] = {}
+        # Per-thread write buffer of an open transaction(); see _tx
+        self._tx_local = threading.local()
+
+    def enable_overlay(self, memory_only: bool = False) -> None:
+        """Serve written files from an in-memory overlay (scripts, tests).
+
+        Writes go to the overlay and reads check it before disk. With
+        memory_only=True disk writes are skipped entirely; otherwise files
+        are still written through for inspection.
+        """
+        self._overlay = {}
+        self._memory_only = memory_only
+
+    def _forget(self, path: str) -> None:
+        """Drop stat-validated cache entries for a path this instance rewrites."""
+        full = self._path(path)
+        self._file_cache.pop(full, None)
+        self._json_cache.pop(full, None)
+        self._roles_cache.pop(full, None)
+        if path == "contracts/index.json":
+            self._by_id_cache = None
+
+    def _tx(self) -> _Transaction | None:
+        """The transaction open in this thread, if any."""
+        return getattr(self._tx_local, "tx", None)
+
+    def _unflushed(self, path: str) -> bool:
+        """True if reads of path are served from the overlay or an open transaction
+        rather than disk (so stat-validated caches don't apply)."""
+        tx = self._tx()
+        if tx is not None and (path in tx.writes or path in tx.appends):
+            return True
+        return self._overlay is not None and path in self._overlay
+
+    @contextmanager
+    def transaction(self, lock: bool = False):
+        """Defer this thread's writes until the block exits, then flush them together.
+
+        write_file/write_json/write_batch land in a buffer (reads in the same
+        thread see it, repeated writes to a path collapse to the last one);
+        append_jsonl lines are queued. On exit files go out in one write_batch,
+        then the queued appends. The buffer is flushed even if the block
+        raises, so writes made before the error are kept as they would be
+        without a transaction. Nested calls join the outer transaction.
+
+        The write lock is taken for the flush, and from the first @_locked
+        call (or from entry, with lock=True, for a read-modify-write done
+        through plain reads and writes) until the flush. Blocks that only
+        read or buffer never wait on other threads.
+        """
+        tx = self._tx()
+        if tx is not None:
+            if lock:
+                self._hold_write_lock(tx)
+            yield
+            return
+        tx = self._tx_local.tx = _Transaction()
+        try:
+            if lock:
+                self._hold_write_lock(tx)
+            yield
+        finally:
+            self._tx_local.tx = None
+            try:
+                with self._write_lock:
+                    if tx.writes:
+                        self.write_batch(list(tx.writes.items()))
+                    for path, lines in tx.appends.items():
+                        self._append_text(path, "".join(lines))
+            finally:
+                if tx.locked:
+                    self._write_lock.release()
+
+    def _hold_write_lock(self, tx: _Transaction) -> None:
+        """Take the write lock for the rest of the transaction (once)."""
+        if not tx.locked:
+            self._write_lock.acquire()
+            tx.locked = True
+
+    def _tx_put(self, path: str, content: str) -> bool:
+        """Buffer a whole-file write in the open transaction. Returns True if buffered."""
+        tx = self._tx()
+        if tx is None:
+            return False
+        tx.writes[path] = content
+        tx.appends.pop(path, None)
+        return True
+
+    def _overlay_put(self, path: str, content: str) -> bool:
+        """Record a write in the overlay. Returns True if the disk write should be skipped."""
+        if self._overlay is None:
+            return False
+        self._overlay[path] = content
+        return self._memory_only
 
     def _utc_ts(self) -> str:
         # include microseconds to avoid collisions on rapid successive saves
@@ -51,6 +212,18 @@ class Memory:
 
     def read_file(self, path: str) -> str | None:
         """Read a file relative to base_dir. Returns None if not found."""
+        tx = self._tx()
+        if tx is not None:
+            pending = "".join(tx.appends.get(path, ()))
+            if path in tx.writes:
+                return tx.writes[path] + pending
+            if pending:
+                return (self._read_file(path) or "") + pending
+        return self._read_file(path)
+
+    def _read_file(self, path: str) -> str | None:
+        if self._overlay is not None and path in self._overlay:
+            return self._overlay[path]
         full = self._path(path)
         try:
             with open(full, "r", encoding="utf-8") as f:
@@ -59,27 +232,65 @@ class Memory:
             logger.debug("File not found: %s", full)
             return None
 
+    def read_file_cached(self, path: str) -> str | None:
+        """read_file for rarely-changing files (prompts, context).
+
+        Text is kept in memory and served while the file's mtime and size
+        are unchanged, so external edits are still picked up.
+        """
+        if self._unflushed(path):
+            return self.read_file(path)
+        full = self._path(path)
+        try:
+            st = os.stat(full)
+        except FileNotFoundError:
+            self._file_cache.pop(full, None)
+            return None
+        cached = self._file_cache.get(full)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2]
+        text = self.read_file(path)
+        if text is not None:
+            self._file_cache[full] = (st.st_mtime_ns, st.st_size, text)
+        return text
+
     def write_file(self, path: str, content: str) -> None:
         """Write content to a file relative to base_dir (with retry)."""
+        self._forget(path)
+        if self._tx_put(path, content):
+            return
+        if self._overlay_put(path, content):
+            return
         full = self._path(path)
 
         def _do():
             os.makedirs(os.path.dirname(full), exist_ok=True)
-            with open(full, "w", encoding="utf-8") as f:
-                f.write(content)
+            _write_bytes(full, content.encode("utf-8"))
 
         self._retry_io(_do, f"write_file({path})")
         logger.debug("Written: %s", full)
 
     def append_jsonl(self, path: str, data: dict) -> None:
         """Append a JSON line to a JSONL file (with retry)."""
+        line = jsonutil.dumps(data) + "\n"
+        tx = self._tx()
+        if tx is not None:
+            tx.appends.setdefault(path, []).append(line)
+            return
+        self._append_text(path, line)
+
+    def _append_text(self, path: str, text: str) -> None:
         full = self._path(path)
-        line = json.dumps(data, ensure_ascii=False) + "\n"
+
+        if self._overlay is not None:
+            with self._overlay_lock:
+                prev = self.read_file(path) or ""
+                if self._overlay_put(path, prev + text):
+                    return
 
         def _do():
             os.makedirs(os.path.dirname(full), exist_ok=True)
-            with open(full, "a", encoding="utf-8") as f:
-                f.write(line)
+            _write_bytes(full, text.encode("utf-8"), _APPEND)
 
         self._retry_io(_do, f"append_jsonl({path})")
 
@@ -89,23 +300,95 @@ class Memory:
         if content is None:
             return None
         try:
-            return json.loads(content)
+            return jsonutil.loads(content)
         except json.JSONDecodeError:
             logger.error("Invalid JSON in %s", path)
             return None
 
+    def read_json_cached(self, path: str) -> dict | list | None:
+        """read_json for rarely-changing files (governance, glossary).
+
+        The parsed value is kept while the file's mtime and size are
+        unchanged. It is shared between calls and must not be mutated.
+        """
+        if self._unflushed(path):
+            return self.read_json(path)
+        full = self._path(path)
+        try:
+            st = os.stat(full)
+        except FileNotFoundError:
+            self._json_cache.pop(full, None)
+            return None
+        key = (st.st_mtime_ns, st.st_size)
+        cached = self._json_cache.get(full)
+        if cached and cached[0] == key:
+            return cached[1]
+        data = self.read_json(path)
+        if data is not None:
+            self._json_cache[full] = (key, data)
+        return data
+
     def write_json(self, path: str, data) -> None:
         """Write data as formatted JSON (with retry)."""
         full = self._path(path)
-        serialized = json.dumps(data, ensure_ascii=False, indent=2)
+        serialized = jsonutil.dumps_pretty(data)
+        self._forget(path)
+        if self._tx_put(path, serialized):
+            return
+        if self._overlay_put(path, serialized):
+            return
 
         def _do():
             os.makedirs(os.path.dirname(full), exist_ok=True)
-            with open(full, "w", encoding="utf-8") as f:
-                f.write(serialized)
+            _write_bytes(full, serialized.encode("utf-8"))
 
         self._retry_io(_do, f"write_json({path})")
 
+    def state_hash(self, paths: list[str]) -> str:
+        """sha256 over the current contents of the given files (order-independent).
+
+        Missing files hash differently from empty ones. Used to key caches
+        on the relevant slice of on-disk state.
+        """
+        h = hashlib.sha256()
+        for path in sorted(set(paths)):
+            content = self.read_file(path)
+            h.update(path.encode("utf-8") + b"\0")
+            if content is None:
+                h.update(b"\1missing\0")
+            else:
+                h.update(b"\2" + content.encode("utf-8") + b"\0")
+        return h.hexdigest()
+
+    def seed_many(self, files: dict[str, str | bytes | dict | list]) -> None:
+        """Write several files at once (fixtures, test setup).
+
+        Values: str/bytes are written as-is, dict/list as formatted JSON
+        (same format as write_json). Directories are created once per unique dir.
+        """
+        payloads: dict[str, bytes] = {}
+        for path, value in files.items():
+            if isinstance(value, bytes):
+                payloads[path] = value
+            elif isinstance(value, str):
+                payloads[path] = value.encode("utf-8")
+            else:
+                payloads[path] = jsonutil.dumps_pretty(value).encode("utf-8")
+
+        if self._overlay is not None:
+            for path, data in payloads.items():
+                self._overlay_put(path, data.decode("utf-8"))
+            if self._memory_only:
+                return
+
+        def _do():
+            for d in {os.path.dirname(self._path(p)) for p in payloads}:
+                os.makedirs(d, exist_ok=True)
+            for path, data in payloads.items():
+                _write_bytes(self._path(path), data)
+
+        self._retry_io(_do, f"seed_many({len(payloads)} files)")
+
     # ── Contracts ───────────────────────────────────────────────────
 
     def list_contracts(self) -> list[dict]:
@@ -115,10 +398,78 @@ class Memory:
             return data["contracts"]
         return []
 
+    def _contracts_by_id(self) -> dict[str, dict]:
+        """Index records keyed by lower-cased id; rebuilt when index.json changes.
+
+        Records are shared between calls and must not be mutated.
+        """
+        path = "contracts/index.json"
+        if self._unflushed(path):
+            key = None
+        else:
+            full = self._path(path)
+            try:
+                st = os.stat(full)
+                key = (full, st.st_mtime_ns, st.st_size)
+            except FileNotFoundError:
+                return {}
+            if self._by_id_cache and self._by_id_cache[0] == key:
+                return self._by_id_cache[1]
+        by_id: dict[str, dict] = {}
+        for c in self.list_contracts():
+            if isinstance(c, dict) and c.get("id"):
+                by_id.setdefault(str(c["id"]).lower(), c)  # first match wins, as in list scans
+        if key is not None:
+            self._by_id_cache = (key, by_id)
+        return by_id
+
+    def get_contract_by_id(self, contract_id: str) -> dict | None:
+        """Index record for one contract id (case-insensitive), or None."""
+        return self._contracts_by_id().get(str(contract_id or "").lower())
+
+    def get_contracts_by_ids(self, ids) -> dict[str, dict]:
+        """Index records for the given ids, keyed by lower-cased id."""
+        by_id = self._contracts_by_id()
+        wanted = {str(i).lower() for i in ids}
+        return {cid: by_id[cid] for cid in wanted if cid in by_id}
+
+    # ── Roles ───────────────────────────────────────────────────────
+
+    def read_roles(self, path: str) -> dict[str, list[str]]:
+        """role -> users from a roles.json file, normalized once per file version.
+
+        Users are lower-cased and de-duplicated in first-seen order; non-list
+        entries are dropped. The result is shared between calls and must not
+        be mutated.
+        """
+        full = self._path(path)
+        key = None
+        if not self._unflushed(path):
+            try:
+                st = os.stat(full)
+            except FileNotFoundError:
+                return {}
+            key = (st.st_mtime_ns, st.st_size)
+            cached = self._roles_cache.get(full)
+            if cached and cached[0] == key:
+                return cached[1]
+
+        data = self.read_json(path)
+        raw = data.get("roles") if isinstance(data, dict) else None
+        roles: dict[str, list[str]] = {}
+        if isinstance(raw, dict):
+            for rk, users in raw.items():
+                if isinstance(rk, str) and isinstance(users, list):
+                    roles[rk] = list(dict.fromkeys(u.lower() for u in users if isinstance(u, str)))
+        if key is not None:
+            self._roles_cache[full] = (key, roles)
+        return roles
+
     def get_contract(self, contract_id: str) -> str | None:
         """Read a contract markdown file."""
         return self.read_file(f"contracts/{contract_id}.md")
 
+    @_locked
     def save_contract(self, contract_id: str, content: str) -> None:
         """Save a finalized contract.
 
@@ -170,6 +521,7 @@ class Memory:
         for entry in history_entries:
             self.append_jsonl(history_path, entry)
 
+    @_locked
     def delete_contract(self, contract_id: str) -> bool:
         """Remove a contract from the index and delete associated files.
 
@@ -193,6 +545,11 @@ class Memory:
             f"drafts/{contract_id}.md",
             f"drafts/{contract_id}_discussion.json",
         ]:
+            if self._overlay is not None:
+                self._overlay.pop(path, None)
+            tx = self._tx()
+            if tx is not None:
+                tx.writes.pop(path, None)
             full = self._path(path)
             try:
                 os.remove(full)
@@ -212,10 +569,11 @@ class Memory:
             self.save_queue(filtered_queue)
 
         # Remove from reminders
-        reminders = self.get_reminders()
-        filtered_reminders = [r for r in reminders if r.get("contract_id") != contract_id]
-        if len(filtered_reminders) != len(reminders):
-            self.save_reminders(filtered_reminders)
+        def drop(reminders: list[dict]) -> list[dict] | None:
+            kept = [r for r in reminders if r.get("contract_id") != contract_id]
+            return kept if len(kept) != len(reminders) else None
+
+        self.update_reminders(drop)
 
         # Remove from active threads
         threads_data = self.read_json(self._ACTIVE_THREADS_FILE)
@@ -239,15 +597,34 @@ class Memory:
         self.audit_log("contract_deleted", contract_id=contract_id)
         return True
 
-    def get_contract_history(self, contract_id: str) -> list[dict]:
-        """Return version history metadata for a contract."""
+    def get_contract_history(self, contract_id: str, limit: int | None = None) -> list[dict]:
+        """Return version history metadata for a contract (oldest first).
+
+        With limit, only the last `limit` entries are parsed and returned.
+        The list is cached until history.jsonl changes and is shared between
+        calls: it must not be mutated.
+        """
         history_path = f"contracts/versions/{contract_id}/history.jsonl"
-        return self.read_jsonl(history_path)
+        if self._unflushed(history_path):
+            return self.read_jsonl(history_path, limit=limit)
+        full = self._path(history_path)
+        try:
+            st = os.stat(full)
+        except FileNotFoundError:
+            return []
+        key = (st.st_mtime_ns, st.st_size)
+        cached = self._history_cache.get((full, limit))
+        if cached and cached[0] == key:
+            return cached[1]
+        items = self.read_jsonl(history_path, limit=limit)
+        self._history_cache[(full, limit)] = (key, items)
+        return items
 
     def get_contract_version(self, contract_id: str, ts: str) -> str | None:
         """Return a specific version snapshot by timestamp string."""
         return self.read_file(f"contracts/versions/{contract_id}/{ts}.md")
 
+    @_locked
     def update_contract_index(self, contract_id: str, data: dict) -> None:
         """Update or add a contract in the index.
 
@@ -277,18 +654,27 @@ class Memory:
 
         self.write_json("contracts/index.json", index)
 
-    def read_jsonl(self, path: str) -> list[dict]:
-        """Read JSONL file and return list of dicts. Returns [] if not found."""
-        content = self.read_file(path)
+    def read_jsonl(self, path: str, limit: int | None = None) -> list[dict]:
+        """Read JSONL file and return list of dicts. Returns [] if not found.
+
+        With limit, only the last `limit` non-empty lines are parsed.
+        """
+        return self._parse_jsonl(self.read_file(path), path, limit)
+
+    @staticmethod
+    def _parse_jsonl(content: str | None, path: str, limit: int | None = None) -> list[dict]:
+        """Parse JSONL text (see read_jsonl); path is only used in log messages."""
         if not content:
             return []
+        lines = (ln.strip() for ln in content.splitlines())
+        if limit is not None:
+            lines = deque((ln for ln in lines if ln), maxlen=limit)
         items = []
-        for line in content.splitlines():
-            line = line.strip()
+        for line in lines:
             if not line:
                 continue
             try:
-                items.append(json.loads(line))
+                items.append(jsonutil.loads(line))
             except json.JSONDecodeError:
                 logger.error("Invalid JSONL line in %s", path)
         return items
@@ -315,7 +701,7 @@ class Memory:
 
     def get_participant(self, username: str) -> str | None:
         """Read participant profile."""
-        return self.read_file(f"participants/{username}.md")
+        return self.read_file_cached(f"participants/{username}.md")
 
     def update_participant(self, username: str, content: str) -> None:
         """Write participant profile."""
@@ -348,6 +734,7 @@ class Memory:
             if f.endswith(".md")
         ]
 
+    @_locked
     def upsert_participant_index(self, username: str, data: dict) -> None:
         idx = self.read_json("participants/index.json") or {"participants": []}
         items = idx.get("participants") or []
@@ -362,8 +749,9 @@ class Memory:
         idx["participants"] = items
         self.write_json("participants/index.json", idx)
 
-    def set_participant_active(self, username: str, active: bool) -> None:
-        now = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    def set_participant_active(self, username: str, active: bool, today: str | None = None) -> None:
+        """Mark a participant (in)active; today (YYYY-MM-DD) defaults to the current UTC date."""
+        now = today or datetime.now(timezone.utc).strftime("%Y-%m-%d")
         patch = {"active": active}
         if active:
             patch.setdefault("joined_at", now)
@@ -412,16 +800,47 @@ class Memory:
 
     # ── Reminders ───────────────────────────────────────────────────
 
+    _REMINDERS_FILE = "tasks/reminders.json"
+    _REMINDERS_LOG_FILE = "tasks/reminders_added.jsonl"
+
     def get_reminders(self) -> list[dict]:
-        """Get all active reminders."""
-        data = self.read_json("tasks/reminders.json")
-        if data and "reminders" in data:
-            return data["reminders"]
-        return []
+        """Get all active reminders: the saved list plus any appended since."""
+        data = self.read_json(self._REMINDERS_FILE)
+        reminders = data["reminders"] if data and "reminders" in data else []
+        added = self.read_jsonl(self._REMINDERS_LOG_FILE)
+        return reminders + added if added else reminders
+
+    @_locked
+    def append_reminder(self, reminder: dict) -> None:
+        """Add one reminder by appending a line instead of rewriting the list.
+
+        The next save_reminders folds appended reminders into reminders.json.
+        """
+        self.append_jsonl(self._REMINDERS_LOG_FILE, reminder)
 
+    @_locked
     def save_reminders(self, reminders: list[dict]) -> None:
-        """Save reminders list."""
-        self.write_json("tasks/reminders.json", {"reminders": reminders})
+        """Save reminders list (replacing the appended ones, which get_reminders included).
+
+        To change reminders read earlier use update_reminders, which keeps
+        the ones appended in between.
+        """
+        writes = [(self._REMINDERS_FILE, jsonutil.dumps_pretty({"reminders": reminders}))]
+        if self.read_file(self._REMINDERS_LOG_FILE):
+            writes.append((self._REMINDERS_LOG_FILE, ""))
+        self.write_batch(writes)
+
+    @_locked
+    def update_reminders(self, fn) -> None:
+        """Read, change and save reminders under the write lock.
+
+        fn gets the current list (saved plus appended) and returns the new
+        one, or None to leave it as is. append_reminder waits meanwhile, so
+        nothing is lost; keep fn quick (no LLM or network calls).
+        """
+        reminders = fn(self.get_reminders())
+        if reminders is not None:
+            self.save_reminders(reminders)
 
     # ── Queue ───────────────────────────────────────────────────────
 
@@ -458,6 +877,7 @@ class Memory:
     def save_summaries(self, data: dict) -> None:
         self.write_json("contracts/summaries.json", data)
 
+    @_locked
     def update_summary(self, contract_id: str, summary_data: dict) -> None:
         summaries = self.get_summaries()
         summaries[contract_id] = summary_data
@@ -512,6 +932,7 @@ class Memory:
                 result[contract_id] = root_post_id
         return result
 
+    @_locked
     def set_active_thread(self, contract_id: str, root_post_id: str) -> None:
         """Register or update the active thread for a contract."""
         data = self.read_json(self._ACTIVE_THREADS_FILE)
@@ -527,6 +948,7 @@ class Memory:
         }
         self.write_json(self._ACTIVE_THREADS_FILE, data)
 
+    @_locked
     def cleanup_expired_threads(self) -> int:
         """Remove expired entries from active_threads.json. Returns count removed."""
         data = self.read_json(self._ACTIVE_THREADS_FILE)
@@ -576,6 +998,18 @@ class Memory:
         """
         import tempfile
 
+        for rel_path, _ in writes:
+            self._forget(rel_path)
+        if self._tx() is not None:
+            for rel_path, content in writes:
+                self._tx_put(rel_path, content)
+            return
+        if self._overlay is not None:
+            for rel_path, content in writes:
+                self._overlay_put(rel_path, content)
+            if self._memory_only:
+                return
+
         staged: list[tuple[str, str]] = []  # (temp_path, final_path)
 
         try:
@@ -587,13 +1021,11 @@ class Memory:
                     prefix=".tmp_",
                     suffix=".md" if rel_path.endswith(".md") else ".json",
                 )
+                staged.append((tmp, final))
                 try:
-                    with os.fdopen(fd, "w", encoding="utf-8") as f:
-                        f.write(content)
-                except Exception:
+                    _write_fd(fd, content.encode("utf-8"))
+                finally:
                     os.close(fd)
-                    raise
-                staged.append((tmp, final))
         except Exception:
             # Clean up any temp files
             for tmp, _ in staged:
@@ -650,11 +1082,26 @@ class Memory:
 
     # ── Load multiple files for context ─────────────────────────────
 
-    def load_files(self, paths: list[str]) -> str:
-        """Load multiple files and concatenate as context block."""
+    def load_files(self, paths: list[str], budget_chars: int | None = None) -> str:
+        """Load multiple files and concatenate as context block.
+
+        Duplicate paths are loaded once. With budget_chars, loading stops
+        once the block reaches the budget; the last file is cut and marked.
+        """
         parts = []
-        for p in paths:
-            content = self.read_file(p)
-            if content:
-                parts.append(f"--- {p} ---\n{content}")
+        used = 0
+        for p in dict.fromkeys(paths):
+            content = self.read_file_cached(p)
+            if not content:
+                continue
+            part = f"--- {p} ---\n{content}"
+            if budget_chars is not None:
+                room = budget_chars - used
+                if room <= 0:
+                    break
+                if len(part) > room:
+                    parts.append(part[:room] + "\n…(усечено)")
+                    break
+                used += len(part) + 2
+            parts.append(part)
         return "\n\n".join(parts)
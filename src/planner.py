@@ -12,6 +12,7 @@ import time
 import threading
 from datetime import datetime, timezone, timedelta
 
+from src import jsonutil
 from src.config import (
     PLANNER_RUN_TIME,
     PLANNER_WORKDAYS,
@@ -552,14 +553,14 @@ class ContinuousPlanner:
                 entry["contract_snippets"] = snippets
             conflicts_summary.append(entry)
 
-        user_message = json.dumps({
+        user_message = jsonutil.dumps_pretty({
             "candidates": candidates_summary,
             "active_initiatives": active_initiatives,
             "conflicts": conflicts_summary,
             "total_contracts": len(gathered.get("contracts", [])),
             "uncovered_metrics": len(gathered.get("uncovered", [])),
             "pending_reminders": len(gathered.get("reminders", [])),
-        }, ensure_ascii=False, indent=2)
+        })
 
         try:
             response = self.llm.call_heavy(system_prompt, user_message, max_tokens=1000)
@@ -579,11 +580,10 @@ class ContinuousPlanner:
             result = json.loads(text)
         except json.JSONDecodeError:
             # Try to extract JSON from response
-            import re
-            m = re.search(r'\{.*\}', response, re.DOTALL)
-            if m:
+            obj = jsonutil.object_text(response)
+            if obj is not None:
                 try:
-                    result = json.loads(m.group())
+                    result = json.loads(obj)
                 except json.JSONDecodeError:
                     logger.warning("Planner: failed to parse LLM response: %s", response[:200])
                     return []
@@ -10,6 +10,8 @@ import logging
 import os
 from datetime import datetime, timezone
 
+from src import jsonutil
+
 logger = logging.getLogger(__name__)
 
 
@@ -257,12 +259,12 @@ class ActionDispatcher:
 
         # Load prompt and call LLM
         system_prompt = self.memory.read_file("prompts/conflict_resolution.md") or ""
-        user_message = json.dumps({
+        user_message = jsonutil.dumps_pretty({
             "contract_id": contract_id,
             "conflicts": conflict_details,
             "contract_contents": contract_snippets,
             "hint": hint,
-        }, ensure_ascii=False, indent=2)
+        })
 
         response = self.llm.call_heavy(system_prompt, user_message, max_tokens=1500)
 
@@ -276,12 +278,10 @@ class ActionDispatcher:
         try:
             result = json.loads(text)
         except json.JSONDecodeError:
-            import re
-            m = re.search(r'\{.*\}', response, re.DOTALL)
-            if m:
-                result = json.loads(m.group())
-            else:
+            obj = jsonutil.object_text(response)
+            if obj is None:
                 return None
+            result = json.loads(obj)
 
         options = result.get("options", [])
         if not options or not isinstance(options, list):
@@ -311,11 +311,8 @@ class ActionDispatcher:
         stakeholders = initiative.get("stakeholders", [])
 
         # Resolve human-readable contract name
-        contract_name = contract_id
-        for c in (self.memory.list_contracts() or []):
-            if isinstance(c, dict) and str(c.get("id", "")).lower() == contract_id.lower():
-                contract_name = c.get("name") or contract_id
-                break
+        rec = self.memory.get_contract_by_id(contract_id) or {}
+        contract_name = rec.get("name") or contract_id
 
         mentions = " ".join(f"@{s}" for s in stakeholders) if stakeholders else ""
 
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import re
+from collections.abc import Iterable
 from dataclasses import dataclass
 
 
@@ -12,6 +13,9 @@ class Relationship:
     description: str
 
 
+RE_WORD = re.compile(r"\w+")
+
+
 def _norm_id(s: str) -> str:
     return (s or "").strip().lower()
 
@@ -26,14 +30,20 @@ def detect_mentions(*, contract_id: str, contract_md: str, known_contract_ids: l
     """
     cid = _norm_id(contract_id)
     text = (contract_md or "").lower()
+    words = set(RE_WORD.findall(text))
     rels: list[Relationship] = []
 
     for other in known_contract_ids:
         oid = _norm_id(other)
         if not oid or oid == cid:
             continue
-        # word boundary match (ids are snake_case-ish)
-        if re.search(rf"\b{re.escape(oid)}\b", text):
+        # word boundary match (ids are snake_case-ish): a pure \w id is a
+        # whole word iff it is one of the text's \w runs
+        if RE_WORD.fullmatch(oid):
+            found = oid in words
+        else:
+            found = re.search(rf"\b{re.escape(oid)}\b", text) is not None
+        if found:
             rels.append(Relationship(
                 from_id=cid,
                 to_id=oid,
@@ -44,9 +54,11 @@ def detect_mentions(*, contract_id: str, contract_md: str, known_contract_ids: l
     return rels
 
 
-def upsert_relationships(index: dict, new_rels: list[Relationship]) -> tuple[dict, int]:
+def upsert_relationships(index: dict, new_rels: Iterable[Relationship]) -> tuple[dict, int]:
     """Upsert relationships into a relationships.json-like dict.
 
+    new_rels: any records with from_id/to_id/type/description
+    (Relationship, relationships_llm.ProposedRelationship).
     Dedup key: (from,to,type)
     """
     if not index or not isinstance(index, dict):
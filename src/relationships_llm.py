@@ -3,8 +3,10 @@ from __future__ import annotations
 import json
 from dataclasses import dataclass
 
+from src import jsonutil
 
-ALLOWED_REL_TYPES = {"mentions", "subset_of", "aggregates", "inverse", "depends_on"}
+
+ALLOWED_REL_TYPES = frozenset({"mentions", "subset_of", "aggregates", "inverse", "depends_on"})
 
 
 @dataclass
@@ -47,7 +49,7 @@ def build_prompt(*, contract_id: str, contract_md: str, known_contracts: list[di
         f"{contract_md}\n"
         "---\n\n"
         "Известные контракты (id+name+status):\n"
-        + json.dumps(known, ensure_ascii=False, indent=2)
+        + jsonutil.dumps_pretty(known)
     )
 
     return system, user
@@ -62,7 +64,11 @@ def parse_and_validate(raw: str, *, contract_id: str, known_ids: set[str]) -> li
         raw = "\n".join([ln for ln in lines if not ln.strip().startswith("```")]).strip()
 
     data = json.loads(raw)
-    rels = data.get("relationships")
+    return validate(data.get("relationships"), contract_id=contract_id, known_ids=known_ids)
+
+
+def validate(rels, *, contract_id: str, known_ids: set[str]) -> list[ProposedRelationship]:
+    """Validate proposed relationship dicts (from the LLM JSON or a tool call)."""
     if not isinstance(rels, list):
         return []
 
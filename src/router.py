@@ -31,11 +31,11 @@ def _slugify(text: str) -> str:
     return slug[:60]
 
 
-CHEAP_TYPES = {"contract_request", "status_request", "irrelevant"}
-HEAVY_TYPES = {
+CHEAP_TYPES = frozenset({"contract_request", "status_request", "irrelevant"})
+HEAVY_TYPES = frozenset({
     "contract_discussion", "problem_report", "new_contract_init",
     "general_question", "profile_intro", "data_query", "expert_opinion",
-}
+})
 
 # Keywords indicating user is asking for agent's expert opinion/analysis
 _OPINION_KEYWORDS = [
@@ -45,6 +45,16 @@ _OPINION_KEYWORDS = [
     "как эксперт", "твоя оценка", "твоя рекомендация", "как считаешь",
     "на твой взгляд", "с твоей точки",
 ]
+_OPINION_RE = re.compile("|".join(map(re.escape, _OPINION_KEYWORDS)), re.IGNORECASE)
+# Words never taken as the contract id of an expert-opinion question (besides the bot's names)
+_EXPERT_ENTITY_SKIP = frozenset({"финист", "ясный", "контракт", "метрик", "данных"})
+
+# Explicit save/finalize wording that routes straight to contract_discussion
+_FINALIZE_KEYWORDS = [
+    "зафиксир", "сохрани", "финальная версия",
+    "опубликуй финальную", "опубликовать финальную",
+]
+_FINALIZE_RE = re.compile("|".join(map(re.escape, _FINALIZE_KEYWORDS)), re.IGNORECASE)
 
 
 def route(llm_client, memory, username: str, message: str,
@@ -142,15 +152,7 @@ def route(llm_client, memory, username: str, message: str,
     # Finalize/save contract fast-path (no LLM):
     # If the user explicitly asks to save/finalize/fix a contract, route to contract_discussion (heavy)
     # so side-effects are allowed.
-    low = (message or "").lower()
-    if any(k in low for k in [
-        "зафиксир",
-        "сохрани",
-        "сохранить",
-        "финальная версия",
-        "опубликуй финальную",
-        "опубликовать финальную",
-    ]):
+    if _FINALIZE_RE.search(message or ""):
         m = re.search(r"\b([a-z0-9_\-]{3,})\b\s*$", (message or "").strip(), re.IGNORECASE)
         if m:
             cid = m.group(1).lower()
@@ -194,20 +196,20 @@ def route(llm_client, memory, username: str, message: str,
     # ── Expert opinion detection: direct @mention of bot + opinion keywords ──
     bot_username = BOT_USERNAME.lower()
     bot_display = BOT_DISPLAY_NAME.lower()
-    low = (message or "").lower()
+    # Only messages with an @mention pay for the lower-cased copy
+    low = (message or "").lower() if "@" in (message or "") else ""
 
     is_direct_address = any(
         f"@{name}" in low
         for name in [bot_username, bot_display]
         if name
     )
-    if is_direct_address and any(kw in low for kw in _OPINION_KEYWORDS):
+    if is_direct_address and _OPINION_RE.search(message):
         # Try to extract contract_id from message or thread context
         entity = None
-        skip = {"финист", "ясный", bot_username, bot_display, "контракт", "метрик", "данных"}
         for cid_match in re.finditer(r"\b([a-z][a-z0-9_]{2,})\b", message, re.IGNORECASE):
             candidate = cid_match.group(1).lower()
-            if candidate not in skip:
+            if candidate not in _EXPERT_ENTITY_SKIP and candidate != bot_username and candidate != bot_display:
                 entity = candidate
                 break
         # Also try finding contract_id in thread context
@@ -222,7 +224,8 @@ def route(llm_client, memory, username: str, message: str,
                     f"contracts/{entity}.md"]
         return {"type": "expert_opinion", "entity": entity, "load_files": load, "model": "expert"}
 
-    router_prompt = memory.read_file("prompts/router.md") or ""
+    read = getattr(memory, "read_file_cached", memory.read_file)
+    router_prompt = read("prompts/router.md") or ""
 
     user_input = (
         f'Сообщение от @{username} в {channel_type}:\n'
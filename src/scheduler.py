@@ -9,6 +9,7 @@ from datetime import datetime, timezone, timedelta
 
 import schedule
 
+from src import jsonutil
 from src.config import (
     REMINDER_STEP_DAYS,
     REMINDER_DEFAULT_INTERVAL_DAYS,
@@ -19,6 +20,30 @@ from src.config import (
 
 logger = logging.getLogger(__name__)
 
+_PLACEHOLDER_RE = re.compile(r"\{([A-Z0-9_]+)\}")
+
+
+def _render_placeholders(text: str, ctx: dict[str, str]) -> str:
+    """Substitute {KEY} placeholders from ctx in one pass; unknown keys stay as-is."""
+    if not ctx or "{" not in text:
+        return text
+    return _PLACEHOLDER_RE.sub(lambda m: ctx.get(m.group(1), m.group(0)), text)
+
+
+def _replace_sent(current: list[dict], sent: list[tuple[str, dict]]) -> list[dict]:
+    """Swap in updated reminders, matched by their JSON as read before sending.
+
+    Reminders added, removed or changed meanwhile are kept as they are now.
+    """
+    pending: dict[str, list[dict]] = {}
+    for before, rem in sent:
+        pending.setdefault(before, []).append(rem)
+    out = []
+    for rem in current:
+        queued = pending.get(jsonutil.dumps(rem))
+        out.append(queued.pop(0) if queued else rem)
+    return out
+
 
 class Scheduler:
     def __init__(self, agent, memory, mattermost_client, llm_client):
@@ -54,7 +79,8 @@ class Scheduler:
                 return
 
             now = datetime.now(timezone.utc)
-            updated = False
+            # (reminder as read, updated reminder) for each one sent this run
+            sent: list[tuple[str, dict]] = []
 
             for rem in reminders:
                 next_str = rem.get("next_reminder")
@@ -64,6 +90,7 @@ class Scheduler:
                 next_dt = datetime.fromisoformat(next_str)
                 if next_dt > now:
                     continue
+                before = jsonutil.dumps(rem)
 
                 step = rem.get("escalation_step", 1)
                 contract_id = rem.get("contract_id", "")
@@ -77,19 +104,13 @@ class Scheduler:
 
                 message = None
 
-                def _render(text: str, ctx: dict[str, str]) -> str:
-                    out = text
-                    for k, v in (ctx or {}).items():
-                        out = out.replace("{" + k + "}", v)
-                    return out
-
                 def apply(marker: str, base_text: str, ctx: dict[str, str]) -> str:
                     # Wrapper marker
                     if templates and marker in templates:
                         wrapped = templates.replace(marker, base_text)
-                        return _render(wrapped, ctx).strip()
+                        return _render_placeholders(wrapped, ctx).strip()
                     # No wrapper marker: still allow placeholders inside base_text
-                    return _render(base_text, ctx).strip()
+                    return _render_placeholders(base_text, ctx).strip()
 
                 if step == 1:
                     # Soft reminder — template substitution, no LLM (MVP)
@@ -207,15 +228,16 @@ class Scheduler:
                 # Update next reminder (+2 days)
                 rem["last_reminder"] = now.isoformat()
                 rem["next_reminder"] = (now + timedelta(days=REMINDER_DEFAULT_INTERVAL_DAYS)).isoformat()
-                updated = True
+                sent.append((before, rem))
 
                 logger.info(
                     "Sent reminder step %d for %s to @%s",
                     step, contract_id, target_user,
                 )
 
-            if updated:
-                self.memory.save_reminders(reminders)
+            if sent:
+                # Messages went out without the write lock; merge into the current list
+                self.memory.update_reminders(lambda current: _replace_sent(current, sent))
 
         except Exception as e:
             logger.error("Error in check_reminders: %s", e, exc_info=True)
@@ -458,5 +480,4 @@ def _format_open_questions_digest(items: list[dict]) -> str:
 
 
 def _format_json(data) -> str:
-    import json
-    return json.dumps(data, ensure_ascii=False, indent=2)
+    return jsonutil.dumps_pretty(data)
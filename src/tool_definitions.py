@@ -175,12 +175,27 @@ WRITE_TOOLS: list[dict] = [
         "Валидирует контракт (структура + governance + glossary) и сохраняет если всё ок. "
         "Возвращает {success: bool, contract_id: str, errors: [...], warnings: [...]}. "
         "При ошибках контракт НЕ сохраняется — объясни пользователю все проблемы. "
-        "force=true: glossary issues становятся warnings (не блокируют сохранение).",
+        "force=true: glossary issues становятся warnings (не блокируют сохранение). "
+        "relationships: семантические связи с известными контрактами — передай их сразу, "
+        "тогда отдельный анализ связей не запускается.",
         {
             "properties": {
                 "contract_id": {"type": "string", "description": "ID контракта"},
                 "content": {"type": "string", "description": "Полный markdown текст контракта"},
                 "force": {"type": "boolean", "description": "Если true — glossary issues не блокируют сохранение (становятся warnings)", "default": False},
+                "relationships": {
+                    "type": "array",
+                    "description": "Связи текущего контракта (максимум 10), только id известных контрактов",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "to": {"type": "string", "description": "ID связанного контракта"},
+                            "type": {"type": "string", "enum": ["mentions", "subset_of", "aggregates", "inverse", "depends_on"]},
+                            "description": {"type": "string", "description": "1 короткое предложение по-русски"},
+                        },
+                        "required": ["to", "type"],
+                    },
+                },
             },
             "required": ["contract_id", "content"],
         },
@@ -375,26 +390,27 @@ def get_all_tools() -> list[dict]:
     return get_read_tools() + get_write_tools() + get_data_query_tools()
 
 
-_GENERAL_TOOL_NAMES = {"read_contract", "read_draft", "list_contracts"}
-
-
-def get_tools_for_route(route_type: str, is_channel: bool) -> list[dict]:
-    """Return only relevant tools for a given route type."""
-    if route_type == "profile_intro":
-        return [t for t in WRITE_TOOLS if t["function"]["name"] == "update_participant"]
+_GENERAL_TOOL_NAMES = frozenset({"read_contract", "read_draft", "list_contracts"})
 
-    if route_type == "general_question":
-        return [t for t in READ_TOOLS if t["function"]["name"] in _GENERAL_TOOL_NAMES]
+# Per-route tool lists, built once at import (tool definitions are static)
+_PROFILE_INTRO_TOOLS = [t for t in WRITE_TOOLS if t["function"]["name"] == "update_participant"]
+_GENERAL_TOOLS = [t for t in READ_TOOLS if t["function"]["name"] in _GENERAL_TOOL_NAMES]
+_EXPERT_TOOLS = READ_TOOLS + DATA_QUERY_TOOLS
+_CHANNEL_TOOLS = READ_TOOLS + WRITE_TOOLS
 
-    if route_type == "data_query":
-        return list(DATA_QUERY_TOOLS)
+_ROUTE_TOOLS: dict[str, list[dict]] = {
+    "profile_intro": _PROFILE_INTRO_TOOLS,
+    "general_question": _GENERAL_TOOLS,
+    "data_query": DATA_QUERY_TOOLS,
+    # Expert mode: read tools + data query for analysis, no write tools
+    "expert_opinion": _EXPERT_TOOLS,
+}
 
-    if route_type == "expert_opinion":
-        # Expert mode: read tools + data query for analysis, no write tools
-        return list(READ_TOOLS) + list(DATA_QUERY_TOOLS)
 
-    # contract_discussion, new_contract_init, problem_report — full set
-    tools = list(READ_TOOLS)
-    if is_channel:
-        tools += list(WRITE_TOOLS)
-    return tools
+def get_tools_for_route(route_type: str, is_channel: bool) -> list[dict]:
+    """Return only relevant tools for a given route type."""
+    tools = _ROUTE_TOOLS.get(route_type)
+    if tools is None:
+        # contract_discussion, new_contract_init, problem_report — full set
+        tools = _CHANNEL_TOOLS if is_channel else READ_TOOLS
+    return list(tools)
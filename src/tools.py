@@ -23,6 +23,7 @@ from src.relationships import detect_mentions, upsert_relationships
 from src.relationships_llm import (
     build_prompt as build_relationships_prompt,
     parse_and_validate as parse_relationships_llm,
+    validate as validate_relationships,
 )
 from src.contract_summary import generate_summary
 from src.config import BOT_USERNAME, BOT_DISPLAY_NAME
@@ -55,53 +56,64 @@ def _is_invalid_contract_id(contract_id: str) -> str | None:
 
 def _extract_section(markdown: str, section_name: str) -> str:
     """Extract content of a markdown ## section by name."""
-    lines = (markdown or "").splitlines()
+    needle = section_name.lower()
     in_section = False
     result: list[str] = []
-    for line in lines:
-        if line.strip().startswith("## ") and section_name.lower() in line.lower():
+    for line in (markdown or "").splitlines():
+        is_heading = line.strip().startswith("## ")
+        if is_heading and needle in line.lower():
             in_section = True
             continue
         if in_section:
-            if line.strip().startswith("## "):
+            if is_heading:
                 break
             result.append(line)
     return "\n".join(result).strip()
 
 
+# "# Data Contract: <name>" (any case) or another "#" heading mentioning "Data Contract"
+_CONTRACT_NAME_RE = re.compile(
+    r"^[ \t]*(?:(?i:# data contract:)|(?=#[^\n]*Data Contract)#[^\n:]*:)([^\n]*)", re.M
+)
+# The title heading sits at the top of a contract; don't scan the whole body
+_CONTRACT_NAME_SCAN_CHARS = 2048
+
+# Write/DDL keywords rejected by query_data, matched in one pass over the SQL
+_FORBIDDEN_SQL_RE = re.compile(
+    r"\b(INSERT|UPDATE|DELETE|DROP|TRUNCATE|CREATE|ALTER|GRANT|REVOKE)\b"
+)
+
+
 def _extract_contract_name(markdown: str) -> str | None:
-    for line in (markdown or "").splitlines():
-        line = line.strip()
-        if not line:
-            continue
-        if line.lower().startswith("# data contract:"):
-            return line.split(":", 1)[1].strip() or None
-        if line.startswith("#") and "Data Contract" in line:
-            parts = line.split(":", 1)
-            if len(parts) == 2:
-                return parts[1].strip() or None
-    return None
+    m = _CONTRACT_NAME_RE.search((markdown or "")[:_CONTRACT_NAME_SCAN_CHARS])
+    return (m.group(1).strip() or None) if m else None
 
 
 def _merge_roles(memory) -> dict:
     """Merge read-only defaults (context/roles.json) with runtime state (tasks/roles.json)."""
     roles: dict[str, list[str]] = {}
     for path in ("context/roles.json", "tasks/roles.json"):
-        src = memory.read_json(path) or {}
-        if isinstance(src, dict) and isinstance(src.get("roles"), dict):
-            for rk, users in src["roles"].items():
-                if not isinstance(rk, str) or not isinstance(users, list):
-                    continue
-                cur = roles.get(rk, [])
-                cur_lower = [x.lower() for x in cur]
-                for u in users:
-                    if isinstance(u, str) and u.lower() not in cur_lower:
-                        cur.append(u.lower())
-                        cur_lower.append(u.lower())
-                roles[rk] = cur
+        for rk, users in memory.read_roles(path).items():
+            cur = roles.setdefault(rk, [])
+            cur.extend(u for u in users if u not in cur)
     return roles
 
 
+def _role_map(memory) -> dict[str, str]:
+    """user (lower-cased) -> role, as check_approval_policy expects."""
+    return {u: role for role, users in _merge_roles(memory).items() for u in users}
+
+
+# Tools whose file writes execute() buffers in one memory.transaction().
+# save_contract/save_draft open their own around the writes so their LLM,
+# MCP and Mattermost calls stay outside it; the other tools only read, post,
+# or write a single file.
+_TRANSACTION_TOOLS = frozenset({
+    "update_discussion", "add_reminder", "update_participant", "save_decision",
+    "assign_role", "set_contract_status", "approve_contract",
+})
+
+
 class ToolExecutor:
     """Dispatches tool calls to handler methods.
 
@@ -111,6 +123,9 @@ class ToolExecutor:
         llm_client: LLMClient for relationship detection (optional)
     """
 
+    # Tool name -> unbound _tool_<name> method; filled in after the class body
+    _TOOLS: dict = {}
+
     def __init__(self, memory, mattermost_client=None, llm_client=None, thread_root_id: str | None = None):
         self.memory = memory
         self.mm = mattermost_client
@@ -119,11 +134,15 @@ class ToolExecutor:
 
     def execute(self, tool_name: str, args: dict) -> dict:
         """Dispatch tool call to handler. Returns JSON-serializable result."""
-        handler = getattr(self, f"_tool_{tool_name}", None)
+        handler = self._TOOLS.get(tool_name)
         if not handler:
             return {"error": f"Unknown tool: {tool_name}"}
         try:
-            return handler(**args)
+            if tool_name not in _TRANSACTION_TOOLS:
+                return handler(self, **args)
+            # A tool's file writes (record, index, audit, ...) are flushed together
+            with self.memory.transaction():
+                return handler(self, **args)
         except Exception as e:
             logger.exception("Tool %s failed: %s", tool_name, e)
             return {"error": f"Tool {tool_name} failed: {e}"}
@@ -149,7 +168,7 @@ class ToolExecutor:
         return {"contract_id": contract_id, "discussion": data}
 
     def _tool_read_governance_policy(self, tier: str) -> dict:
-        gov = self.memory.read_json("context/governance.json") or {}
+        gov = self.memory.read_json_cached("context/governance.json") or {}
         tiers = gov.get("tiers") if isinstance(gov, dict) else None
         if not isinstance(tiers, dict) or tier not in tiers:
             return {"error": f"Политика {tier} не найдена"}
@@ -188,14 +207,13 @@ class ToolExecutor:
         return {"ok": report.ok, "issues": issues, "warnings": warnings}
 
     def _tool_check_approval(self, contract_id: str, contract_md: str) -> dict:
-        gov = self.memory.read_json("context/governance.json") or {}
+        gov = self.memory.read_json_cached("context/governance.json") or {}
         tiers = (gov.get("tiers") or {}) if isinstance(gov, dict) else {}
         tier_key = "tier_2"  # default
 
-        for c in (self.memory.list_contracts() or []):
-            if isinstance(c, dict) and str(c.get("id") or "").lower() == contract_id.lower() and c.get("tier"):
-                tier_key = str(c["tier"])
-                break
+        rec = self.memory.get_contract_by_id(contract_id) or {}
+        if rec.get("tier"):
+            tier_key = str(rec["tier"])
 
         tier_cfg = tiers.get(tier_key) if isinstance(tiers, dict) else None
         if not isinstance(tier_cfg, dict):
@@ -207,15 +225,9 @@ class ToolExecutor:
             consensus_threshold=float(tier_cfg.get("consensus_threshold") or 1.0),
         )
 
-        roles = _merge_roles(self.memory)
-        role_map = {}
-        for role, users in roles.items():
-            for u in users:
-                role_map[u.lower()] = role
-
-        check = check_approval_policy(contract_md=contract_md, policy=policy, role_map=role_map)
+        check = check_approval_policy(contract_md=contract_md, policy=policy, role_map=_role_map(self.memory))
 
-        glossary = self.memory.read_json("context/glossary.json")
+        glossary = self.memory.read_json_cached("context/glossary.json")
         glossary_issues = []
         try:
             gi = check_ambiguity(contract_md, glossary)
@@ -302,13 +314,12 @@ class ToolExecutor:
 
         # Determine tier
         tier_key = "tier_2"
-        for c in (self.memory.list_contracts() or []):
-            if isinstance(c, dict) and str(c.get("id") or "").lower() == contract_id.lower() and c.get("tier"):
-                tier_key = str(c["tier"])
-                break
+        rec = self.memory.get_contract_by_id(contract_id) or {}
+        if rec.get("tier"):
+            tier_key = str(rec["tier"])
 
         # Governance info
-        gov = self.memory.read_json("context/governance.json") or {}
+        gov = self.memory.read_json_cached("context/governance.json") or {}
         tiers = (gov.get("tiers") or {}) if isinstance(gov, dict) else {}
         tier_cfg = tiers.get(tier_key, {}) if isinstance(tiers, dict) else {}
         required_roles = tier_cfg.get("approval_required", []) if isinstance(tier_cfg, dict) else []
@@ -404,33 +415,17 @@ class ToolExecutor:
 
     # ── Write tools ──────────────────────────────────────────────────────
 
-    def _tool_save_contract(self, contract_id: str, content: str, force: bool = False) -> dict:
-        """Validate + governance + glossary + save. Returns structured result."""
-        err = _is_invalid_contract_id(contract_id)
-        if err:
-            return {"success": False, "contract_id": contract_id, "errors": [err], "warnings": []}
+    def _governance_errors(self, contract_id: str, content: str) -> list[str]:
+        """Tier approval check shared by save_contract and preflight_save_contract."""
         errors: list[str] = []
-        warnings: list[str] = []
-
-        # 1. Validation
-        report = validate_contract(content)
-        if not report.ok:
-            for i in report.issues:
-                if i.code == "missing_optional_section" or i.code.startswith("formula_missing"):
-                    warnings.append(i.message)
-                else:
-                    errors.append(f"Валидация: {i.message}")
-
-        # 2. Governance
         try:
-            gov = self.memory.read_json("context/governance.json") or {}
+            gov = self.memory.read_json_cached("context/governance.json") or {}
             tiers = (gov.get("tiers") or {}) if isinstance(gov, dict) else {}
             tier_key = "tier_2"
 
-            for c in (self.memory.list_contracts() or []):
-                if isinstance(c, dict) and str(c.get("id") or "").lower() == contract_id.lower() and c.get("tier"):
-                    tier_key = str(c["tier"])
-                    break
+            rec = self.memory.get_contract_by_id(contract_id) or {}
+            if rec.get("tier"):
+                tier_key = str(rec["tier"])
 
             tier_cfg = tiers.get(tier_key) if isinstance(tiers, dict) else None
             if isinstance(tier_cfg, dict):
@@ -440,22 +435,59 @@ class ToolExecutor:
                     consensus_threshold=float(tier_cfg.get("consensus_threshold") or 1.0),
                 )
 
-                roles = _merge_roles(self.memory)
-                role_map = {}
-                for role, users in roles.items():
-                    for u in users:
-                        role_map[u.lower()] = role
-
-                check = check_approval_policy(contract_md=content, policy=policy, role_map=role_map)
+                check = check_approval_policy(contract_md=content, policy=policy, role_map=_role_map(self.memory))
                 if not check.ok:
                     missing = ", ".join(check.missing_roles) or "(неизвестно)"
                     errors.append(f"Governance ({tier_key}): не хватает ролей: {missing}")
         except Exception as e:
             logger.warning("Governance check failed: %s", e)
+        return errors
+
+    def preflight_save_contract(self, contract_id: str, content: str | None = None) -> str | None:
+        """Run save_contract's deterministic governance check without saving.
+
+        `content` defaults to the current draft. Returns the first blocking
+        reason, or None when governance would let the save through.
+        """
+        err = _is_invalid_contract_id(contract_id)
+        if err:
+            return err
+        if content is None:
+            content = self.memory.get_draft(contract_id)
+            if content is None:
+                return f"Черновик {contract_id} не найден (drafts/{contract_id}.md)"
+        errors = self._governance_errors(contract_id, content)
+        return errors[0] if errors else None
+
+    def _tool_save_contract(
+        self, contract_id: str, content: str, force: bool = False, relationships: list | None = None,
+    ) -> dict:
+        """Validate + governance + glossary + save. Returns structured result.
+
+        `relationships` lets the calling model propose semantic links in the
+        same tool call; when given, the separate relationships LLM call is skipped.
+        """
+        err = _is_invalid_contract_id(contract_id)
+        if err:
+            return {"success": False, "contract_id": contract_id, "errors": [err], "warnings": []}
+        errors: list[str] = []
+        warnings: list[str] = []
+
+        # 1. Validation
+        report = validate_contract(content)
+        if not report.ok:
+            for i in report.issues:
+                if i.code == "missing_optional_section" or i.code.startswith("formula_missing"):
+                    warnings.append(i.message)
+                else:
+                    errors.append(f"Валидация: {i.message}")
+
+        # 2. Governance
+        errors.extend(self._governance_errors(contract_id, content))
 
         # 3. Glossary (force=True downgrades to warnings)
         try:
-            glossary = self.memory.read_json("context/glossary.json")
+            glossary = self.memory.read_json_cached("context/glossary.json")
             glossary_issues = check_ambiguity(content, glossary)
             for gi in glossary_issues:
                 if force:
@@ -474,76 +506,71 @@ class ToolExecutor:
                 "warnings": warnings,
             }
 
-        # 5. Save
-        self.memory.save_contract(contract_id, content)
+        # 5. Relationships: the LLM call runs before the writes (best-effort)
+        rels = self._proposed_relationships(contract_id, content, relationships)
+
+        # 6. Save; contract, index, relationships, tree, audit and summary are flushed together
         name = _extract_contract_name(content) or contract_id
-        now_date = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        sections = None
+        with self.memory.transaction():
+            self.memory.save_contract(contract_id, content)
+            now_date = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+            self.memory.update_contract_index(contract_id, {
+                "name": name,
+                "status": "agreed",
+                "file": f"contracts/{contract_id}.md",
+                "agreed_date": now_date,
+                "status_updated_at": now_date,
+            })
 
-        self.memory.update_contract_index(contract_id, {
-            "name": name,
-            "status": "agreed",
-            "file": f"contracts/{contract_id}.md",
-            "agreed_date": now_date,
-            "status_updated_at": now_date,
-        })
+            if rels:
+                try:
+                    idx = self.memory.read_json("contracts/relationships.json") or {"relationships": []}
+                    # detect_mentions / relationships_llm only yield from_id/to_id/type records
+                    idx2, added = upsert_relationships(idx, rels)
+                    if added:
+                        self.memory.write_json("contracts/relationships.json", idx2)
+                        logger.info("Relationships updated: +%d", added)
+                except Exception as e:
+                    logger.warning("Failed to update relationships: %s", e)
 
-        # Best-effort: relationships
-        try:
-            known_contracts = self.memory.list_contracts() or []
-            known_ids = [c.get("id") for c in known_contracts if isinstance(c, dict) and c.get("id")]
-            rels = detect_mentions(contract_id=contract_id, contract_md=content, known_contract_ids=known_ids)
+            # Best-effort: metrics tree
+            try:
+                tree_text = self.memory.read_file("context/metrics_tree.md") or ""
 
-            if self.llm:
+                # Grow tree from "Связь с Extra Time" path
                 try:
-                    system, user = build_relationships_prompt(
-                        contract_id=contract_id, contract_md=content, known_contracts=known_contracts,
-                    )
-                    raw = self.llm.call_heavy(system, user)
-                    parsed = parse_relationships_llm(
-                        raw, contract_id=contract_id, known_ids=set(x for x in known_ids if isinstance(x, str)),
-                    )
-                    rels.extend(parsed)
+                    from src.validator import _extract_sections
+                    sections = _extract_sections(content)
+                    linkage = sections.get("Связь с Extra Time", "")
+                    if linkage:
+                        path_parts = parse_linkage_path(linkage)
+                        if len(path_parts) >= 2:
+                            grow = ensure_path_in_tree(tree_text, path_parts)
+                            if grow.ok and grow.changed:
+                                self.memory.write_file("context/metrics_tree.md", grow.new_text)
+                                tree_text = grow.new_text
                 except Exception as e:
-                    logger.info("Relationships LLM skipped: %s", e)
+                    logger.warning("Tree growth failed: %s", e)
 
-            if rels:
-                idx = self.memory.read_json("contracts/relationships.json") or {"relationships": []}
-                normalized = [r for r in rels if hasattr(r, "from_id")]
-                idx2, added = upsert_relationships(idx, normalized)
-                if added:
-                    self.memory.write_json("contracts/relationships.json", idx2)
-                    logger.info("Relationships updated: +%d", added)
-        except Exception as e:
-            logger.warning("Failed to update relationships: %s", e)
+                patch = mark_contract_agreed(tree_text, name)
+                if not patch.ok:
+                    patch = mark_contract_agreed(tree_text, contract_id)
+                if patch.ok and patch.changed:
+                    self.memory.write_file("context/metrics_tree.md", patch.new_text)
+            except Exception:
+                pass
 
-        # Best-effort: metrics tree
-        try:
-            tree_text = self.memory.read_file("context/metrics_tree.md") or ""
+            self.memory.audit_log("save_contract", contract_id=contract_id, name=name)
 
-            # Grow tree from "Связь с Extra Time" path
             try:
-                from src.validator import _extract_sections
-                sections = _extract_sections(content)
-                linkage = sections.get("Связь с Extra Time", "")
-                if linkage:
-                    path_parts = parse_linkage_path(linkage)
-                    if len(path_parts) >= 2:
-                        grow = ensure_path_in_tree(tree_text, path_parts)
-                        if grow.ok and grow.changed:
-                            self.memory.write_file("context/metrics_tree.md", grow.new_text)
-                            tree_text = grow.new_text
+                summary = generate_summary(contract_id, content, "agreed", sections)
+                self.memory.update_summary(contract_id, summary)
             except Exception as e:
-                logger.warning("Tree growth failed: %s", e)
-
-            patch = mark_contract_agreed(tree_text, name)
-            if not patch.ok:
-                patch = mark_contract_agreed(tree_text, contract_id)
-            if patch.ok and patch.changed:
-                self.memory.write_file("context/metrics_tree.md", patch.new_text)
-        except Exception:
-            pass
+                logger.warning("Failed to update summary for %s: %s", contract_id, e)
 
-        # Best-effort: suggest next contract (proactive)
+        # Best-effort: suggest next contract (proactive); posts after the flush
         try:
             from src.suggestion_engine import SuggestionEngine
             engine = SuggestionEngine(self.memory, self.llm)
@@ -558,14 +585,6 @@ class ToolExecutor:
         except Exception as e:
             logger.warning("Post-agreement suggestion failed: %s", e)
 
-        self.memory.audit_log("save_contract", contract_id=contract_id, name=name)
-
-        try:
-            summary = generate_summary(contract_id, content, "agreed")
-            self.memory.update_summary(contract_id, summary)
-        except Exception as e:
-            logger.warning("Failed to update summary for %s: %s", contract_id, e)
-
         logger.info("Saved contract: %s", contract_id)
         return {
             "success": True,
@@ -573,22 +592,54 @@ class ToolExecutor:
             "warnings": warnings,
         }
 
+    def _proposed_relationships(self, contract_id: str, content: str, relationships: list | None) -> list:
+        """Mentions plus inline or LLM-proposed links for a contract being saved (best-effort)."""
+        try:
+            known_contracts = self.memory.list_contracts() or []
+            known_ids = [c.get("id") for c in known_contracts if isinstance(c, dict) and c.get("id")]
+            rels = detect_mentions(contract_id=contract_id, contract_md=content, known_contract_ids=known_ids)
+
+            if isinstance(relationships, list):
+                # save_contract's schema has no "from": it is always this contract
+                inline = [{**r, "from": r.get("from") or contract_id} for r in relationships if isinstance(r, dict)]
+                rels.extend(validate_relationships(
+                    inline, contract_id=contract_id, known_ids=set(x for x in known_ids if isinstance(x, str)),
+                ))
+            elif self.llm:
+                try:
+                    system, user = build_relationships_prompt(
+                        contract_id=contract_id, contract_md=content, known_contracts=known_contracts,
+                    )
+                    raw = self.llm.call_heavy(system, user)
+                    parsed = parse_relationships_llm(
+                        raw, contract_id=contract_id, known_ids=set(x for x in known_ids if isinstance(x, str)),
+                    )
+                    rels.extend(parsed)
+                except Exception as e:
+                    logger.info("Relationships LLM skipped: %s", e)
+            return rels
+        except Exception as e:
+            logger.warning("Failed to detect relationships: %s", e)
+            return []
+
     def _tool_save_draft(self, contract_id: str, content: str) -> dict:
         err = _is_invalid_contract_id(contract_id)
         if err:
             return {"success": False, "error": err}
-        self.memory.save_draft(contract_id, content)
         name = _extract_contract_name(content) or contract_id
-        self.memory.update_contract_index(contract_id, {
-            "name": name,
-            "status": "draft",
-            "file": f"drafts/{contract_id}.md",
-        })
-        try:
-            summary = generate_summary(contract_id, content, "draft")
-            self.memory.update_summary(contract_id, summary)
-        except Exception as e:
-            logger.warning("Failed to update draft summary for %s: %s", contract_id, e)
+        # Draft, index and summary are flushed together, before the MCP check below
+        with self.memory.transaction():
+            self.memory.save_draft(contract_id, content)
+            self.memory.update_contract_index(contract_id, {
+                "name": name,
+                "status": "draft",
+                "file": f"drafts/{contract_id}.md",
+            })
+            try:
+                summary = generate_summary(contract_id, content, "draft")
+                self.memory.update_summary(contract_id, summary)
+            except Exception as e:
+                logger.warning("Failed to update draft summary for %s: %s", contract_id, e)
 
         logger.info("Saved draft: %s", contract_id)
         result: dict = {"success": True, "contract_id": contract_id, "name": name}
@@ -615,9 +666,7 @@ class ToolExecutor:
     def _tool_add_reminder(self, reminder: dict) -> dict:
         if not isinstance(reminder, dict):
             return {"error": "reminder must be a JSON object"}
-        reminders = self.memory.get_reminders()
-        reminders.append(reminder)
-        self.memory.save_reminders(reminders)
+        self.memory.append_reminder(reminder)
         logger.info("Added reminder for %s", reminder.get("contract_id"))
         return {"success": True, "reminder_id": reminder.get("id")}
 
@@ -718,13 +767,12 @@ class ToolExecutor:
             return {"error": f"Контракт или черновик {contract_id} не найден"}
 
         # Determine tier
-        gov = self.memory.read_json("context/governance.json") or {}
+        gov = self.memory.read_json_cached("context/governance.json") or {}
         tiers = (gov.get("tiers") or {}) if isinstance(gov, dict) else {}
         tier_key = "tier_2"
-        for c in (self.memory.list_contracts() or []):
-            if isinstance(c, dict) and str(c.get("id") or "").lower() == contract_id.lower() and c.get("tier"):
-                tier_key = str(c["tier"])
-                break
+        rec = self.memory.get_contract_by_id(contract_id) or {}
+        if rec.get("tier"):
+            tier_key = str(rec["tier"])
 
         tier_cfg = tiers.get(tier_key) if isinstance(tiers, dict) else None
         if not isinstance(tier_cfg, dict):
@@ -797,13 +845,7 @@ class ToolExecutor:
         state = ApprovalState.from_dict(state_data)
 
         # Check user's role
-        roles = _merge_roles(self.memory)
-        role_map = {}
-        for role, users in roles.items():
-            for u in users:
-                role_map[u.lower()] = role
-
-        user_role = role_map.get(username)
+        user_role = _role_map(self.memory).get(username)
         if not user_role or user_role not in state.required_roles:
             return {
                 "error": f"@{username} не имеет необходимой роли для согласования. "
@@ -908,10 +950,9 @@ class ToolExecutor:
         sql_upper = sql.upper().strip()
 
         # Safety checks
-        forbidden = ["INSERT", "UPDATE", "DELETE", "DROP", "TRUNCATE", "CREATE", "ALTER", "GRANT", "REVOKE"]
-        for kw in forbidden:
-            if re.search(rf"\b{kw}\b", sql_upper):
-                return {"error": f"Запрещённая операция: {kw}. Только SELECT."}
+        m = _FORBIDDEN_SQL_RE.search(sql_upper)
+        if m:
+            return {"error": f"Запрещённая операция: {m.group(1)}. Только SELECT."}
 
         if "CROSS JOIN" in sql_upper:
             return {"error": "CROSS JOIN запрещён."}
@@ -1140,6 +1181,11 @@ class ToolExecutor:
         return {"success": True, "contract_id": contract_id, "status": status, "message": result.message}
 
 
+ToolExecutor._TOOLS = {
+    name[len("_tool_"):]: fn for name, fn in vars(ToolExecutor).items() if name.startswith("_tool_")
+}
+
+
 def backfill_summaries(memory) -> int:
     """Generate summaries for all existing contracts. Returns count of summaries created."""
     index = memory.list_contracts() or []
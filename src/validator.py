@@ -35,6 +35,8 @@ REQUIRED_SECTIONS = [
 
 OPTIONAL_SECTIONS = ["Известные проблемы", "Связанные контракты"]
 
+RE_H2 = re.compile(r"^##\s+(.+?)\s*$")
+
 # All accepted arrow characters/sequences for "Связь с Extra Time"
 ARROW_PATTERNS = ["→", "->", "—>", "=>"]
 
@@ -42,16 +44,19 @@ ARROW_PATTERNS = ["→", "->", "—>", "=>"]
 def _extract_sections(md: str) -> dict[str, str]:
     """Extract sections by '## <title>' headings."""
     md = md or ""
+    if "##" not in md:
+        return {}
     lines = md.splitlines()
     sections: dict[str, list[str]] = {}
     current = None
 
     for line in lines:
-        m = re.match(r"^##\s+(.+?)\s*$", line)
-        if m:
-            current = m.group(1).strip()
-            sections.setdefault(current, [])
-            continue
+        if line.startswith("##"):
+            m = RE_H2.match(line)
+            if m:
+                current = m.group(1).strip()
+                sections.setdefault(current, [])
+                continue
         if current is not None:
             sections[current].append(line)
 
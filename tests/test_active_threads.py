@@ -5,7 +5,7 @@ import unittest
 from datetime import datetime, timedelta, timezone
 from unittest.mock import MagicMock, patch
 
-from src.agent import Agent, ProcessResult, THREAD_TRACKING_TYPES
+from src.agent import Agent, ProcessResult, THREAD_TRACKING_TYPES, ONBOARD_TEMPLATE, PARTICIPANT_TEMPLATE
 from src.memory import Memory
 
 
@@ -148,6 +148,108 @@ class TestAgentProcessResult(unittest.TestCase):
         self.assertIsInstance(result, ProcessResult)
         self.assertIn("tasks/roles.json", result.reply)
 
+    def test_ensure_in_review_skips_index_reread_until_it_changes(self):
+        agent = Agent(self.llm, self.mem, self.mm)
+        agent.process_message("testuser", "обсудим headcount", "channel", None, post_id="p1")
+        idx = self.mem.read_json("contracts/index.json")
+        self.assertEqual(idx["contracts"][0]["status"], "in_review")
+
+        agent.process_message("testuser", "обсудим headcount", "channel", None, post_id="p2")
+        with patch.object(self.mem, "read_json", wraps=self.mem.read_json) as rj:
+            agent.process_message("testuser", "обсудим headcount", "channel", None, post_id="p3")
+        self.assertNotIn("contracts/index.json", [c.args[0] for c in rj.call_args_list])
+
+        # Reset elsewhere (tool, planner, manual edit): the next discussion promotes it again
+        idx["contracts"][0]["status"] = "draft"
+        self.mem.write_json("contracts/index.json", idx)
+        agent.process_message("testuser", "обсудим headcount", "channel", None, post_id="p4")
+        self.assertEqual(self.mem.get_contract_by_id("headcount")["status"], "in_review")
+
+    def test_participant_profile_prefetched_once(self):
+        seen = {}
+
+        class CapturingLLM(FakeLLM):
+            def call_with_tools(self, **kw):
+                seen.update(kw)
+                return "tool reply"
+
+        self.mem.write_file("participants/testuser.md", "# testuser profile")
+        agent = Agent(CapturingLLM(), self.mem, self.mm)
+        agent._enrich_participant_profile = MagicMock()  # re-reads the profile by design
+        with patch.object(self.mem, "get_participant", wraps=self.mem.get_participant) as gp:
+            agent.process_message("testuser", "обсудим headcount", "channel", None, post_id="p1")
+        gp.assert_called_once_with("testuser")
+        self.assertIn("# testuser profile", seen["system_prompt"])
+
+    def test_fast_path_skips_context_prefetch(self):
+        agent = Agent(self.llm, self.mem, self.mm)
+        self.mem.save_contract("revenue", "# v1")
+        with patch.object(agent, "_prefetch_context") as pc:
+            agent.process_message("testuser", "история контракта revenue", "channel", None)
+        pc.assert_not_called()
+
+    def test_contract_history_read_reused_until_history_changes(self):
+        agent = Agent(self.llm, self.mem, self.mm)
+        self.mem.save_contract("revenue", "# v1")
+        first = agent.process_message("testuser", "история контракта revenue", "channel", None)
+        self.assertIn("История версий `revenue` (последние 1):\n\n- `", first.reply)
+        with patch.object(self.mem, "read_jsonl", wraps=self.mem.read_jsonl) as rj:
+            again = agent.process_message("testuser", "история контракта revenue", "channel", None)
+        rj.assert_not_called()
+        self.assertEqual(again.reply, first.reply)
+
+        self.mem.save_contract("revenue", "# v2")
+        third = agent.process_message("testuser", "история контракта revenue", "channel", None)
+        self.assertIn("(последние 3)", third.reply)
+
+    def test_summaries_block_formatted_once_per_file_version(self):
+        prompts = []
+
+        class CapturingLLM(FakeLLM):
+            def call_with_tools(self, **kw):
+                prompts.append(kw["system_prompt"])
+                return "tool reply"
+
+        self.mem.save_summaries({"headcount": {"id": "headcount", "name": "Headcount", "status": "agreed"}})
+        agent = Agent(CapturingLLM(), self.mem, self.mm)
+        agent._enrich_participant_profile = MagicMock()
+        with patch("src.contract_summary.format_summaries_for_prompt", return_value="# block v1") as fmt:
+            agent.process_message("testuser", "обсудим headcount", "channel", None, post_id="p1")
+            agent.process_message("testuser", "обсудим headcount", "channel", None, post_id="p2")
+            fmt.assert_called_once()
+            self.mem.update_summary("churn", {"id": "churn", "name": "Churn", "status": "draft"})
+            fmt.return_value = "# block v2"
+            agent.process_message("testuser", "обсудим headcount", "channel", None, post_id="p3")
+        self.assertEqual(fmt.call_count, 2)
+        self.assertIn("# block v1", prompts[1])
+        self.assertIn("# block v2", prompts[2])
+
+    def test_relationships_show_lists_both_directions(self):
+        self.mem.write_json("contracts/relationships.json", {"relationships": [
+            {"from": "Revenue", "to": "margin", "type": "inverse"},
+            {"from": "churn", "to": "REVENUE", "type": "depends_on", "description": " d "},
+            {"from": "a", "to": "b", "type": "x"},
+            "junk",
+        ]})
+        agent = Agent(self.llm, self.mem, self.mm)
+        reply = agent.process_message("testuser", "покажи связи revenue", "channel", None).reply
+        self.assertEqual(reply.splitlines()[2:], [
+            "- `revenue` ↔ `margin` — **inverse**",
+            "- `churn` → `revenue` — **depends_on** — d",
+        ])
+
+    def test_onboard_fills_templates(self):
+        mm = MagicMock()
+        agent = Agent(self.llm, self.mem, mm)
+        agent.onboard_participant("uid1", "ivan", "")
+        agent._dm_pool.shutdown(wait=True)
+        profile = self.mem.get_participant("ivan")
+        date = profile.split("В канале с: ", 1)[1][:10]
+        self.assertEqual(profile, PARTICIPANT_TEMPLATE.format(display_name="ivan", username="ivan", date=date))
+        rec = self.mem.read_json("participants/index.json")["participants"][0]
+        self.assertEqual((rec["joined_at"], rec["active"], rec["onboarded"]), (date, True, True))
+        mm.send_dm.assert_called_once_with("uid1", ONBOARD_TEMPLATE.format(display_name="ivan"))
+
     def test_thread_reuse_top_level_message(self):
         """Top-level message about known contract reuses active thread."""
         # Pre-register an active thread
@@ -234,5 +336,68 @@ class TestAgentProcessResult(unittest.TestCase):
         self.assertIsNone(result.thread_root_id)
 
 
+class TestBuildThreadContext(unittest.TestCase):
+    POSTS = [
+        {"id": "p1", "user_id": "u1", "message": "раз"},
+        {"id": "p2", "user_id": "bot123", "message": "ответ бота"},
+        {"id": "p3", "user_id": "u2", "message": "два"},
+        {"id": "p4", "user_id": "u1", "message": "три"},
+        {"id": "p5", "user_id": "u3", "message": "текущее"},
+    ]
+
+    def test_batch_lookup_single_call(self):
+        mm = MagicMock()
+        mm.bot_user_id = "bot123"
+        mm.get_users_by_ids.return_value = {
+            "u1": {"username": "alice"}, "u2": {"username": "bob"},
+        }
+        agent = Agent(FakeLLM(), MagicMock(), mm)
+
+        ctx = agent._build_thread_context(self.POSTS, exclude_post_id="p5")
+
+        mm.get_users_by_ids.assert_called_once()
+        self.assertEqual(set(mm.get_users_by_ids.call_args.args[0]), {"u1", "u2"})
+        mm.get_user_info.assert_not_called()
+        self.assertEqual(ctx, "@alice: раз\nAI-архитектор: ответ бота\n@bob: два\n@alice: три")
+
+    def test_falls_back_to_per_user_lookup(self):
+        """Clients without get_users_by_ids still resolve names (and 'unknown' on failure)."""
+        class MM(FakeMM):
+            def get_user_info(self, uid):
+                if uid == "u2":
+                    raise RuntimeError("404")
+                return {"username": f"user_{uid}"}
+
+        agent = Agent(FakeLLM(), MagicMock(), MM())
+        ctx = agent._build_thread_context(self.POSTS[:3])
+        self.assertEqual(ctx, "@user_u1: раз\nAI-архитектор: ответ бота\nunknown: два")
+
+    def test_posts_outside_char_budget_are_not_resolved(self):
+        posts = [{"id": "old", "user_id": "u_old", "message": "x" * 50}] + [
+            {"id": f"p{i}", "user_id": "u1", "message": "y" * 10} for i in range(3)
+        ]
+        mm = MagicMock()
+        mm.bot_user_id = "bot123"
+        mm.get_users_by_ids.return_value = {"u1": {"username": "alice"}}
+        agent = Agent(FakeLLM(), MagicMock(), mm)
+
+        with patch("src.agent.THREAD_MAX_CHARS", 25):
+            ctx = agent._build_thread_context(posts)
+
+        self.assertEqual(set(mm.get_users_by_ids.call_args.args[0]), {"u1"})
+        full = "\n".join(["@old: " + "x" * 50] + ["@alice: " + "y" * 10] * 3)
+        self.assertEqual(ctx, "…(начало треда обрезано)\n" + full[-25:])
+
+    def test_user_info_memoized_within_request(self):
+        mm = MagicMock()
+        mm.bot_user_id = "bot123"
+        mm.get_users_by_ids.return_value = {"u1": {"username": "alice"}}
+        agent = Agent(FakeLLM(), MagicMock(), mm)
+
+        agent._build_thread_context(self.POSTS[:2])
+        agent._build_thread_context(self.POSTS[:2])
+        mm.get_users_by_ids.assert_called_once()
+
+
 if __name__ == "__main__":
     unittest.main()
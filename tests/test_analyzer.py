@@ -1,4 +1,4 @@
-"""Tests for analyzer.py — conflict detection, cycle detection, Jaccard similarity."""
+"""Tests for analyzer.py — conflict detection, cycle detection, definition overlap."""
 
 import json
 import pytest
@@ -11,8 +11,9 @@ from src.analyzer import (
     _extract_sections,
     _normalize_name,
     _tokenize_definition,
-    _jaccard,
     _extract_related_contract_ids,
+    _extract_name,
+    RE_AMBIGUOUS_FORMULA,
 )
 
 
@@ -43,6 +44,10 @@ class TestNormalizeName:
     def test_special_chars(self):
         assert _normalize_name("A/B Test") == "a b test"
 
+    def test_non_latin_and_whitespace_collapse(self):
+        assert _normalize_name("  MAU (дневной)\t__v2: ") == "mau v2"
+        assert _normalize_name(None) == ""
+
 
 class TestTokenizeDefinition:
     def test_basic(self):
@@ -53,6 +58,9 @@ class TestTokenizeDefinition:
         # short words filtered
         assert "за" not in tokens
 
+    def test_edge_separators_trimmed(self):
+        assert _tokenize_definition("__mau-daily-- ab_ -ab- x_y") == {"mau-daily", "x_y"}
+
     def test_stop_words(self):
         tokens = _tokenize_definition("и в на по из для что это")
         assert len(tokens) == 0
@@ -62,23 +70,6 @@ class TestTokenizeDefinition:
         assert _tokenize_definition(None) == set()
 
 
-class TestJaccard:
-    def test_identical(self):
-        s = {"a", "b", "c"}
-        assert _jaccard(s, s) == 1.0
-
-    def test_disjoint(self):
-        assert _jaccard({"a", "b"}, {"c", "d"}) == 0.0
-
-    def test_partial(self):
-        # {a, b, c} & {b, c, d} = {b, c}, union = {a, b, c, d}
-        assert _jaccard({"a", "b", "c"}, {"b", "c", "d"}) == 2 / 4
-
-    def test_empty(self):
-        assert _jaccard(set(), set()) == 1.0
-        assert _jaccard({"a"}, set()) == 0.0
-
-
 class TestExtractRelatedContractIds:
     def test_basic(self):
         md = "## Связанные контракты\n- win_ni\n- churn_rate\n"
@@ -94,6 +85,16 @@ class TestExtractRelatedContractIds:
         assert ids == ["win_ni"]
 
 
+class TestExtractName:
+    def test_heading(self):
+        assert _extract_name("\n  # DATA CONTRACT: Win NI \n## Формула") == "Win NI"
+
+    def test_missing_or_empty(self):
+        assert _extract_name("# Data Contract:   \n") is None
+        assert _extract_name("## Data Contract: x\ntext") is None
+        assert _extract_name(None) is None
+
+
 # ── Analyzer integration tests ───────────────────────────────────────────────
 
 VALID_CONTRACT = """\
@@ -207,6 +208,37 @@ class TestDetectConflicts:
         types = [c.type for c in conflicts]
         assert "ambiguous_formula" in types
 
+    def test_ambiguous_formula_words_any_case(self):
+        assert RE_AMBIGUOUS_FORMULA.search("Примерно SUM(x)")
+        assert RE_AMBIGUOUS_FORMULA.search("COUNT(*) где-то")
+        assert not RE_AMBIGUOUS_FORMULA.search("SUM(revenue) / COUNT(orders)")
+
+    def test_sections_parsed_once_per_contract(self, memory, monkeypatch):
+        import src.analyzer as analyzer_mod
+        _setup_contract(memory, "test_metric", VALID_CONTRACT)
+        calls = []
+        orig = analyzer_mod._extract_sections
+        monkeypatch.setattr(analyzer_mod, "_extract_sections", lambda md: calls.append(md) or orig(md))
+        MetricsAnalyzer(memory).detect_conflicts()
+        assert len(calls) == 1
+
+    def test_overlapping_definitions(self, memory):
+        definition = "Количество активных клиентов оплативших подписку через мобильное приложение"
+        _setup_contract(memory, "test_metric", VALID_CONTRACT.replace("Количество тестовых метрик за период.", definition))
+        other = VALID_CONTRACT.replace("Test Metric", "Other Metric")
+        _setup_contract(memory, "other_metric", other.replace("Количество тестовых метрик за период.", definition))
+        _setup_contract(memory, "bad_metric", CONTRACT_NO_FORMULA)
+        conflicts = MetricsAnalyzer(memory).detect_conflicts()
+        overlaps = [c for c in conflicts if c.type == "overlapping_definitions"]
+        assert len(overlaps) == 1
+        assert set(overlaps[0].contracts) == {"test_metric", "other_metric"}
+        assert "Jaccard) = 1.00" in overlaps[0].details
+        assert "клиентов" in overlaps[0].details
+        scoped = MetricsAnalyzer(memory).detect_conflicts(only_contract_ids=["bad_metric"])
+        assert not [c for c in scoped if c.type == "overlapping_definitions"]
+        scoped = MetricsAnalyzer(memory).detect_conflicts(only_contract_ids=["other_metric"])
+        assert [c.contracts for c in scoped if c.type == "overlapping_definitions"] == [overlaps[0].contracts]
+
     def test_self_reference(self, memory):
         contract = VALID_CONTRACT + "\n## Связанные контракты\n- self_ref\n"
         _setup_contract(memory, "self_ref", contract)
@@ -225,6 +257,23 @@ class TestDetectConflicts:
         types = [c.type for c in conflicts]
         assert "cyclic_dependency" in types
 
+    def test_deep_related_chain_with_cycle(self):
+        class ChainMemory:
+            n = 1500
+
+            def list_contracts(self):
+                return [{"id": f"c{i}"} for i in range(self.n)]
+
+            def get_contract(self, cid):
+                nxt = int(cid[1:]) + 1
+                related = f"c{nxt}" if nxt < self.n else "c0"
+                return f"# Data Contract: {cid}\n\n## Связанные контракты\n- {related}\n"
+
+        conflicts = MetricsAnalyzer(ChainMemory()).detect_conflicts()
+        cycles = [c for c in conflicts if c.type == "cyclic_dependency"]
+        assert len(cycles) == 1
+        assert len(cycles[0].contracts) == ChainMemory.n
+
     def test_unknown_related_contract(self, memory):
         contract = VALID_CONTRACT + "\n## Связанные контракты\n- nonexistent_id\n"
         _setup_contract(memory, "test_metric", contract)
@@ -85,6 +85,12 @@ class TestGenerateSummary:
         assert s["definition"] == "(уточняется)"
         assert s["formula"] == ""
 
+    def test_presplit_sections_reused(self):
+        s = generate_summary("rev_001", FULL_CONTRACT, "agreed", {"Формула": "COUNT(x)"})
+        assert s["name"] == "Revenue per Client"
+        assert s["formula"] == "COUNT(x)"
+        assert s["definition"] == ""
+
     def test_empty_markdown(self):
         s = generate_summary("empty_001", "", "draft")
         assert s["name"] == "empty_001"
@@ -4,6 +4,7 @@ Tests the full flow from a WebSocket 'posted' event to sending a reply,
 with mocked Mattermost and LLM clients.
 """
 
+import asyncio
 import json
 import threading
 from unittest.mock import MagicMock, patch, call
@@ -230,3 +231,26 @@ class TestListenerIntegration:
         call_kwargs = agent.process_message.call_args[1]
         assert call_kwargs["thread_context"] is not None
         assert "Начинаем" in call_kwargs["thread_context"]
+
+
+class TestListenerConcurrency:
+    def test_async_handler_returns_before_processing_finishes(self, listener, agent, mm):
+        release = threading.Event()
+        done = threading.Event()
+
+        def slow(**kw):
+            release.wait(5)
+            done.set()
+            return ProcessResult(reply="Ответ бота", thread_root_id=None)
+
+        agent.process_message = MagicMock(side_effect=slow)
+        asyncio.run(listener._handle_event_async(_make_posted_event("вопрос?")))
+        assert not done.is_set()
+
+        release.set()
+        listener._pool.shutdown(wait=True)
+        assert done.is_set()
+        mm.send_to_channel.assert_called_once()
+
+    def test_thread_replies_share_conversation_lock(self, listener):
+        assert listener._conversation_lock("root_1") is listener._conversation_lock("root_1")
@@ -0,0 +1,117 @@
+"""Tests for the persistent LLM response cache."""
+
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from src.llm_cache import DiskCache, make_cache_key
+
+
+class FakeMessage:
+    def __init__(self, content=None, tool_calls=None):
+        self.content = content
+        self.tool_calls = tool_calls
+
+
+class FakeChoice:
+    def __init__(self, message):
+        self.message = message
+
+
+class FakeResponse:
+    def __init__(self, message):
+        self.choices = [FakeChoice(message)]
+        self.usage = None
+
+
+class DiskCacheTest(unittest.TestCase):
+    def test_lookup_miss_then_hit(self):
+        with tempfile.TemporaryDirectory() as td:
+            cache = DiskCache(os.path.join(td, "sub", "cache.sqlite"))
+            self.assertIsNone(cache.lookup("k"))
+            cache.update("k", "ответ")
+            self.assertEqual(cache.lookup("k"), "ответ")
+            cache.close()
+
+    def test_persists_across_instances(self):
+        with tempfile.TemporaryDirectory() as td:
+            path = os.path.join(td, "cache.sqlite")
+            c1 = DiskCache(path)
+            c1.update("k", "v")
+            c1.close()
+            c2 = DiskCache(path)
+            self.assertEqual(c2.lookup("k"), "v")
+            c2.close()
+
+    def test_key_depends_on_all_parts(self):
+        base = make_cache_key("sys", "user", [{"a": 1}], "m")
+        self.assertEqual(base, make_cache_key("sys", "user", [{"a": 1}], "m"))
+        self.assertNotEqual(base, make_cache_key("sys", "user2", [{"a": 1}], "m"))
+        self.assertNotEqual(base, make_cache_key("sys", "user", [{"a": 2}], "m"))
+        self.assertNotEqual(base, make_cache_key("sys", "user", [{"a": 1}], "m2"))
+
+
+class CallWithToolsCacheTest(unittest.TestCase):
+    @patch.dict("os.environ", {"OPENROUTER_API_KEY": "test-key", "DAAI_LLM_CACHE": "1"})
+    def test_client_has_no_cache_unless_given(self):
+        with patch("openai.OpenAI"):
+            from src.llm_client import LLMClient
+            client = LLMClient()
+        self.assertIsNone(client.cache)
+
+    @patch.dict("os.environ", {"OPENROUTER_API_KEY": "test-key"})
+    def test_second_call_served_from_cache(self):
+        with tempfile.TemporaryDirectory() as td:
+            cache = DiskCache(os.path.join(td, "cache.sqlite"))
+            with patch("openai.OpenAI"):
+                from src.llm_client import LLMClient
+                client = LLMClient(cache=cache)
+            client.client.chat.completions.create = MagicMock(
+                return_value=FakeResponse(FakeMessage(content="готово"))
+            )
+
+            kwargs = dict(
+                system_prompt="system",
+                user_message="привет",
+                tools=[],
+                tool_executor=lambda name, args: {},
+            )
+            self.assertEqual(client.call_with_tools(**kwargs), "готово")
+            self.assertEqual(client.call_with_tools(**kwargs), "готово")
+            self.assertEqual(client.client.chat.completions.create.call_count, 1)
+
+            # Different state salt -> cache miss
+            self.assertEqual(client.call_with_tools(**kwargs, cache_salt="roles-v2"), "готово")
+            self.assertEqual(client.client.chat.completions.create.call_count, 2)
+            cache.close()
+
+    @patch.dict("os.environ", {"OPENROUTER_API_KEY": "test-key"})
+    def test_loop_with_write_tool_not_cached(self):
+        with tempfile.TemporaryDirectory() as td:
+            cache = DiskCache(os.path.join(td, "cache.sqlite"))
+            with patch("openai.OpenAI"):
+                from src.llm_client import LLMClient
+                client = LLMClient(cache=cache)
+
+            call = MagicMock()
+            call.id = "c1"
+            call.function.name = "save_contract"
+            call.function.arguments = '{"contract_id": "x", "content": "md"}'
+            turns = [FakeMessage(tool_calls=[call]), FakeMessage(content="сохранено")] * 2
+            client.client.chat.completions.create = MagicMock(side_effect=[FakeResponse(m) for m in turns])
+            saved = []
+
+            def executor(name, args):
+                saved.append(name)
+                return {"success": True}
+
+            kwargs = dict(system_prompt="system", user_message="сохрани", tools=[], tool_executor=executor)
+            self.assertEqual(client.call_with_tools(**kwargs), "сохранено")
+            self.assertEqual(client.call_with_tools(**kwargs), "сохранено")
+            self.assertEqual(saved, ["save_contract", "save_contract"])
+            cache.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,6 +4,8 @@ import json
 import unittest
 from unittest.mock import MagicMock, patch
 
+from src.config import LLM_REQUEST_MAX_RETRIES, LLM_REQUEST_TIMEOUT_SECONDS
+
 
 class FakeToolCall:
     def __init__(self, call_id, name, arguments):
@@ -332,6 +334,318 @@ class CallWithToolsTest(unittest.TestCase):
 
         self.assertEqual(result, "")
 
+    def test_last_trace_records_each_turn(self):
+        """Each API turn is recorded with latency and token usage."""
+        client = self._make_client()
+
+        tc = FakeToolCall("tc_1", "read_draft", {"contract_id": "t"})
+        client.client.chat.completions.create = MagicMock(side_effect=[
+            FakeResponse(FakeMessage(content=None, tool_calls=[tc])),
+            FakeResponse(FakeMessage(content="Готово")),
+        ])
+
+        client.call_with_tools(
+            system_prompt="s", user_message="u", tools=[],
+            tool_executor=lambda n, a: {"ok": True},
+        )
+
+        trace = client.last_trace
+        self.assertEqual([t["turn"] for t in trace], [0, 1])
+        self.assertEqual(trace[0]["prompt_tokens"], 100)
+        self.assertEqual(trace[0]["completion_tokens"], 50)
+        self.assertTrue(all(t["latency_ms"] >= 0 for t in trace))
+
+    def test_timeout_retried_within_turn(self):
+        """A timed-out attempt is retried in the same turn after a short backoff."""
+        import openai
+        client = self._make_client()
+
+        client.client.chat.completions.create = MagicMock(side_effect=[
+            openai.APITimeoutError(request=MagicMock()),
+            FakeResponse(FakeMessage(content="Готово")),
+        ])
+
+        with patch("src.llm_client.time.sleep") as mock_sleep:
+            result = client.call_with_tools(
+                system_prompt="s", user_message="u", tools=[],
+                tool_executor=lambda n, a: {"ok": True},
+                max_turns=1,
+            )
+
+        self.assertEqual(result, "Готово")
+        mock_sleep.assert_called_once_with(0.5)
+        self.assertEqual(
+            client.client.chat.completions.create.call_args.kwargs["timeout"], LLM_REQUEST_TIMEOUT_SECONDS,
+        )
+
+    def test_exhausted_retries_back_off_before_next_turn(self):
+        """Once in-turn retries run out the turn is skipped after the turn backoff."""
+        import openai
+        client = self._make_client()
+
+        errors = [openai.RateLimitError("slow down", response=MagicMock(status_code=429), body=None)]
+        client.client.chat.completions.create = MagicMock(
+            side_effect=errors * (LLM_REQUEST_MAX_RETRIES + 1) + [FakeResponse(FakeMessage(content="Готово"))],
+        )
+
+        with patch("src.llm_client.time.sleep") as mock_sleep:
+            result = client.call_with_tools(
+                system_prompt="s", user_message="u", tools=[],
+                tool_executor=lambda n, a: {"ok": True},
+                max_turns=2,
+            )
+
+        self.assertEqual(result, "Готово")
+        delays = [c.args[0] for c in mock_sleep.call_args_list]
+        self.assertEqual(delays, [0.5 * 2 ** i for i in range(LLM_REQUEST_MAX_RETRIES)] + [2])
+
+    def test_system_prompt_cacheable_for_anthropic(self):
+        """Anthropic models get the system prompt as a cache_control block."""
+        client = self._make_client()
+        client.client.chat.completions.create = MagicMock(
+            return_value=FakeResponse(FakeMessage(content="ok"))
+        )
+
+        client.call_with_tools(
+            system_prompt="S", user_message="u", tools=[],
+            tool_executor=lambda n, a: {}, model="anthropic/claude-sonnet-4",
+        )
+        system = client.client.chat.completions.create.call_args.kwargs["messages"][0]
+        self.assertEqual(system["content"][0]["cache_control"], {"type": "ephemeral"})
+        self.assertEqual(system["content"][0]["text"], "S")
+
+        client.call_with_tools(
+            system_prompt="S", user_message="u", tools=[],
+            tool_executor=lambda n, a: {}, model="openai/gpt-4.1",
+        )
+        system = client.client.chat.completions.create.call_args.kwargs["messages"][0]
+        self.assertEqual(system, {"role": "system", "content": "S"})
+
+    def test_parallel_read_tools_keep_order(self):
+        """Several read-only calls in one turn run concurrently; results keep call order."""
+        import threading
+        import time as _time
+        client = self._make_client()
+
+        tcs = [
+            FakeToolCall("tc_a", "read_draft", {"contract_id": "a"}),
+            FakeToolCall("tc_b", "read_contract", {"contract_id": "b"}),
+            FakeToolCall("tc_c", "read_roles", {}),
+        ]
+        client.client.chat.completions.create = MagicMock(side_effect=[
+            FakeResponse(FakeMessage(content=None, tool_calls=tcs)),
+            FakeResponse(FakeMessage(content="Готово")),
+        ])
+
+        threads = set()
+        def executor(name, args):
+            threads.add(threading.get_ident())
+            _time.sleep(0.05)
+            return {"tool": name}
+
+        client.call_with_tools(
+            system_prompt="s", user_message="u", tools=[], tool_executor=executor,
+        )
+
+        messages = client.client.chat.completions.create.call_args.kwargs["messages"]
+        tool_msgs = [m for m in messages if isinstance(m, dict) and m.get("role") == "tool"]
+        self.assertEqual([m["tool_call_id"] for m in tool_msgs], ["tc_a", "tc_b", "tc_c"])
+        self.assertEqual(
+            [json.loads(m["content"])["tool"] for m in tool_msgs],
+            ["read_draft", "read_contract", "read_roles"],
+        )
+        self.assertGreater(len(threads), 1)
+
+    def test_write_tools_run_sequentially(self):
+        """A turn containing a write tool executes calls in order, one at a time."""
+        import threading
+        client = self._make_client()
+
+        tcs = [
+            FakeToolCall("tc_a", "read_draft", {"contract_id": "a"}),
+            FakeToolCall("tc_b", "save_draft", {"contract_id": "a", "content": "x"}),
+        ]
+        client.client.chat.completions.create = MagicMock(side_effect=[
+            FakeResponse(FakeMessage(content=None, tool_calls=tcs)),
+            FakeResponse(FakeMessage(content="Готово")),
+        ])
+
+        order = []
+        def executor(name, args):
+            order.append((name, threading.get_ident()))
+            return {"ok": True}
+
+        client.call_with_tools(
+            system_prompt="s", user_message="u", tools=[], tool_executor=executor,
+        )
+        self.assertEqual([n for n, _ in order], ["read_draft", "save_draft"])
+        self.assertEqual({t for _, t in order}, {threading.get_ident()})
+
+    def test_streamed_tool_call_assembled(self):
+        """With streaming on, tool-call fragments are joined per index before execution."""
+        from types import SimpleNamespace as NS
+        client = self._make_client()
+
+        def chunk(content=None, tool_calls=None, usage=None):
+            choices = [] if usage else [NS(delta=NS(content=content, tool_calls=tool_calls))]
+            return NS(choices=choices, usage=usage)
+
+        def tcd(index, id=None, name=None, arguments=None):
+            return NS(index=index, id=id, function=NS(name=name, arguments=arguments))
+
+        stream1 = [
+            chunk(tool_calls=[tcd(0, id="tc_1", name="read_draft", arguments='{"contract')]),
+            chunk(tool_calls=[tcd(0, arguments='_id": "lead"}')]),
+            chunk(usage=FakeUsage()),
+        ]
+        stream2 = [chunk(content="Черновик "), chunk(content="найден.")]
+
+        client.client.chat.completions.create = MagicMock(side_effect=[iter(stream1), iter(stream2)])
+
+        calls = []
+        with patch("src.llm_client.LLM_STREAM_TOOLS", True):
+            result = client.call_with_tools(
+                system_prompt="s", user_message="u", tools=[],
+                tool_executor=lambda n, a: calls.append((n, a)) or {"ok": True},
+            )
+
+        self.assertEqual(result, "Черновик найден.")
+        self.assertEqual(calls, [("read_draft", {"contract_id": "lead"})])
+        self.assertTrue(client.client.chat.completions.create.call_args.kwargs["stream"])
+        history = client.client.chat.completions.create.call_args.kwargs["messages"]
+        self.assertEqual(history[2]["tool_calls"][0]["id"], "tc_1")
+        self.assertEqual(client.last_trace[0]["prompt_tokens"], 100)
+
+    def test_streamed_read_call_starts_before_stream_ends(self):
+        """A complete read-only call runs while later tool calls are still streaming."""
+        import threading
+        from types import SimpleNamespace as NS
+        client = self._make_client()
+
+        def chunk(tool_calls=None, content=None):
+            return NS(choices=[NS(delta=NS(content=content, tool_calls=tool_calls))], usage=None)
+
+        def tcd(index, id=None, name=None, arguments=None):
+            return NS(index=index, id=id, function=NS(name=name, arguments=arguments))
+
+        started = threading.Event()
+        seen_during_stream = []
+
+        def stream1():
+            yield chunk([tcd(0, id="a", name="read_draft", arguments='{"contract_id": "x"}')])
+            yield chunk([tcd(1, id="b", name="save_draft", arguments='{"contract_id": "x", ')])
+            seen_during_stream.append(started.wait(timeout=2))
+            yield chunk([tcd(1, arguments='"content": "y"}')])
+
+        client.client.chat.completions.create = MagicMock(
+            side_effect=[stream1(), iter([chunk(content="Готово")])]
+        )
+
+        calls = []
+        def executor(name, args):
+            calls.append(name)
+            if name == "read_draft":
+                started.set()
+            return {"ok": True}
+
+        with patch("src.llm_client.LLM_STREAM_TOOLS", True):
+            result = client.call_with_tools(
+                system_prompt="s", user_message="u", tools=[], tool_executor=executor,
+            )
+
+        self.assertEqual(result, "Готово")
+        self.assertEqual(seen_during_stream, [True])
+        self.assertEqual(calls, ["read_draft", "save_draft"])
+
+    def test_staged_tools_added_from_stage_after(self):
+        """Staged tools are offered only from turn `stage_after` on."""
+        client = self._make_client()
+
+        tc = FakeToolCall("tc_1", "read_draft", {"contract_id": "t"})
+        client.client.chat.completions.create = MagicMock(side_effect=[
+            FakeResponse(FakeMessage(content=None, tool_calls=[tc])),
+            FakeResponse(FakeMessage(content="Готово")),
+        ])
+
+        read = [{"function": {"name": "read_draft"}}]
+        write = [{"function": {"name": "save_contract"}}]
+        client.call_with_tools(
+            system_prompt="s", user_message="u", tools=read,
+            tool_executor=lambda n, a: {"ok": True},
+            staged_tools=write, stage_after=1,
+        )
+
+        calls = client.client.chat.completions.create.call_args_list
+        self.assertEqual(calls[0].kwargs["tools"], read)
+        self.assertEqual(calls[1].kwargs["tools"], read + write)
+
+    def test_warmup_swallows_errors(self):
+        client = self._make_client()
+        client.client.models.list = MagicMock(side_effect=Exception("offline"))
+        client.warmup()  # must not raise
+        client.client.models.list.assert_called_once()
+
+    def test_repeated_read_call_reused_until_write(self):
+        """Identical read calls reuse the first result; a write invalidates it."""
+        client = self._make_client()
+
+        read = lambda cid: FakeToolCall(f"r_{cid}", "read_draft", {"contract_id": "t"})
+        client.client.chat.completions.create = MagicMock(side_effect=[
+            FakeResponse(FakeMessage(content=None, tool_calls=[read(1)])),
+            FakeResponse(FakeMessage(content=None, tool_calls=[read(2)])),
+            FakeResponse(FakeMessage(content=None, tool_calls=[
+                FakeToolCall("w", "save_draft", {"contract_id": "t", "content": "x"}),
+            ])),
+            FakeResponse(FakeMessage(content=None, tool_calls=[read(3)])),
+            FakeResponse(FakeMessage(content="Готово")),
+        ])
+
+        calls = []
+        def executor(name, args):
+            calls.append(name)
+            return {"n": len(calls)}
+
+        client.call_with_tools(
+            system_prompt="s", user_message="u", tools=[], tool_executor=executor,
+        )
+        self.assertEqual(calls, ["read_draft", "save_draft", "read_draft"])
+
+        messages = client.client.chat.completions.create.call_args.kwargs["messages"]
+        tool_msgs = {m["tool_call_id"]: json.loads(m["content"]) for m in messages
+                     if isinstance(m, dict) and m.get("role") == "tool"}
+        self.assertEqual(tool_msgs["r_1"], tool_msgs["r_2"])
+        self.assertNotEqual(tool_msgs["r_1"], tool_msgs["r_3"])
+
+
+class SplitXmlToolCallsTest(unittest.TestCase):
+    def test_parses_and_strips_in_one_pass(self):
+        from src.llm_client import _split_xml_tool_calls
+
+        text = (
+            'Начало <invoke name="read_contract"><parameter name="contract_id"> a </parameter></invoke>'
+            ' середина <invoke name="list_contracts"></invoke> конец'
+        )
+        calls, clean = _split_xml_tool_calls(text)
+        self.assertEqual(calls, [("read_contract", {"contract_id": "a"}), ("list_contracts", {})])
+        self.assertEqual(clean, "Начало  середина  конец")
+        self.assertEqual(_split_xml_tool_calls("plain"), ([], "plain"))
+
+    def test_plain_text_skips_regex(self):
+        from src import llm_client
+
+        with patch.object(llm_client, "_INVOKE_OPEN_RE") as rx:
+            self.assertEqual(llm_client._split_xml_tool_calls("just <b>text</b>"), ([], "just <b>text</b>"))
+        rx.search.assert_not_called()
+
+    def test_unclosed_tags_are_left_as_text(self):
+        from src.llm_client import _split_xml_tool_calls
+
+        text = '<invoke name="a"><parameter name="x">1</invoke> и <invoke name="b">' * 3 + "</invoke>"
+        calls, _ = _split_xml_tool_calls(text)
+        self.assertEqual(calls[0], ("a", {}))
+        junk = "ok </invoke> " + '<invoke name="x">' * 20000
+        self.assertEqual(_split_xml_tool_calls(junk), ([], junk))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,269 @@
+"""Tests for Memory — generic file helpers."""
+
+import json
+import threading
+
+import pytest
+
+from src.memory import Memory
+
+
+@pytest.fixture
+def mem(tmp_path):
+    m = Memory()
+    m.base_dir = str(tmp_path)
+    return m
+
+
+class TestSeedMany:
+    def test_writes_text_bytes_and_json(self, mem, tmp_path):
+        mem.seed_many({
+            "prompts/a.md": "текст",
+            "prompts/b.bin": b"\x00\x01",
+            "contracts/index.json": {"contracts": [{"id": "x"}]},
+        })
+        assert (tmp_path / "prompts" / "a.md").read_text(encoding="utf-8") == "текст"
+        assert (tmp_path / "prompts" / "b.bin").read_bytes() == b"\x00\x01"
+        assert mem.read_json("contracts/index.json") == {"contracts": [{"id": "x"}]}
+
+    def test_json_format_matches_write_json(self, mem, tmp_path):
+        data = {"имя": [1, 2]}
+        mem.seed_many({"a/seeded.json": data})
+        mem.write_json("a/written.json", data)
+        assert (tmp_path / "a" / "seeded.json").read_bytes() == (tmp_path / "a" / "written.json").read_bytes()
+        assert json.loads((tmp_path / "a" / "seeded.json").read_text(encoding="utf-8")) == data
+
+
+class TestContractsByIds:
+    def test_returns_only_requested_ids(self, mem):
+        mem.write_json("contracts/index.json", {"contracts": [
+            {"id": "Win_NI", "name": "Win NI"},
+            {"id": "churn"},
+            "junk",
+        ]})
+        got = mem.get_contracts_by_ids(["win_ni", "missing"])
+        assert list(got) == ["win_ni"]
+        assert got["win_ni"]["name"] == "Win NI"
+
+
+    def test_get_contract_by_id_tracks_index_changes(self, mem):
+        mem.write_json("contracts/index.json", {"contracts": [{"id": "A", "status": "draft"}]})
+        assert mem.get_contract_by_id("a")["status"] == "draft"
+        assert mem.get_contract_by_id("b") is None
+        mem.write_json("contracts/index.json", {"contracts": [{"id": "a", "status": "in_review"}]})
+        assert mem.get_contract_by_id("A")["status"] == "in_review"
+
+
+class TestReadRoles:
+    def test_normalizes_once_per_file_version(self, mem):
+        mem.write_json("tasks/roles.json", {"roles": {"data_lead": ["Bob", "bob", 1], "bad": "x"}})
+        first = mem.read_roles("tasks/roles.json")
+        assert first == {"data_lead": ["bob"]}
+        assert mem.read_roles("tasks/roles.json") is first
+
+        mem.write_json("tasks/roles.json", {"roles": {"circle_lead": ["Carol"]}})
+        assert mem.read_roles("tasks/roles.json") == {"circle_lead": ["carol"]}
+        assert mem.read_roles("missing.json") == {}
+
+
+class TestReadJsonlLimit:
+    def test_parses_only_tail(self, mem):
+        for i in range(25):
+            mem.append_jsonl("contracts/versions/x/history.jsonl", {"i": i})
+        tail = mem.get_contract_history("x", limit=10)
+        assert [h["i"] for h in tail] == list(range(15, 25))
+        assert len(mem.get_contract_history("x")) == 25
+        assert mem.get_contract_history("missing", limit=10) == []
+
+    def test_history_cached_until_appended(self, mem):
+        mem.append_jsonl("contracts/versions/x/history.jsonl", {"i": 0})
+        first = mem.get_contract_history("x", limit=10)
+        assert mem.get_contract_history("x", limit=10) is first
+        mem.append_jsonl("contracts/versions/x/history.jsonl", {"i": 1})
+        assert [h["i"] for h in mem.get_contract_history("x", limit=10)] == [0, 1]
+
+
+class TestReadFileCached:
+    def test_serves_cached_text_until_file_changes(self, mem, tmp_path):
+        mem.write_file("prompts/p.md", "v1")
+        assert mem.read_file_cached("prompts/p.md") == "v1"
+        full = str(tmp_path / "prompts" / "p.md")
+        st = (tmp_path / "prompts" / "p.md").stat()
+        mem._file_cache[full] = (st.st_mtime_ns, st.st_size, "cached")
+        assert mem.read_file_cached("prompts/p.md") == "cached"
+
+        mem.write_file("prompts/p.md", "version 2")
+        assert mem.read_file_cached("prompts/p.md") == "version 2"
+        (tmp_path / "prompts" / "p.md").unlink()
+        assert mem.read_file_cached("prompts/p.md") is None
+
+    def test_participant_profile_cached_and_refreshed_on_update(self, mem, monkeypatch):
+        mem.update_participant("alice", "# v1")
+        assert mem.get_participant("alice") == "# v1"
+        monkeypatch.setattr(mem, "read_file", lambda path: pytest.fail("re-read from disk"))
+        assert mem.get_participant("alice") == "# v1"
+        monkeypatch.undo()
+
+        mem.update_participant("alice", "# v2")
+        assert mem.get_participant("alice") == "# v2"
+
+    def test_json_parsed_once_per_file_version(self, mem, tmp_path):
+        mem.write_json("context/governance.json", {"tiers": {"tier_1": {}}})
+        first = mem.read_json_cached("context/governance.json")
+        assert first == {"tiers": {"tier_1": {}}}
+        assert mem.read_json_cached("context/governance.json") is first
+
+        mem.write_json("context/governance.json", {"tiers": {}})
+        assert mem.read_json_cached("context/governance.json") == {"tiers": {}}
+        (tmp_path / "context" / "governance.json").unlink()
+        assert mem.read_json_cached("context/governance.json") is None
+
+
+class TestReminders:
+    def test_append_then_save_folds_log(self, mem, tmp_path):
+        mem.save_reminders([{"id": "r1"}])
+        mem.append_reminder({"id": "r2"})
+        mem.append_reminder({"id": "r3"})
+        assert json.loads((tmp_path / "tasks" / "reminders.json").read_text(encoding="utf-8")) == {"reminders": [{"id": "r1"}]}
+        reminders = mem.get_reminders()
+        assert [r["id"] for r in reminders] == ["r1", "r2", "r3"]
+
+        reminders[1]["escalation_step"] = 2
+        mem.save_reminders(reminders)
+        assert (tmp_path / "tasks" / "reminders_added.jsonl").read_text(encoding="utf-8") == ""
+        assert mem.get_reminders() == reminders
+
+
+    def test_update_reminders_folds_log(self, mem, tmp_path):
+        mem.save_reminders([{"id": "r1"}])
+        mem.append_reminder({"id": "r2"})
+        mem.update_reminders(lambda reminders: reminders + [{"id": "r3"}])
+        assert [r["id"] for r in mem.get_reminders()] == ["r1", "r2", "r3"]
+        assert (tmp_path / "tasks" / "reminders_added.jsonl").read_text(encoding="utf-8") == ""
+        mem.append_reminder({"id": "r4"})
+        mem.update_reminders(lambda reminders: None)
+        assert mem.read_jsonl("tasks/reminders_added.jsonl") == [{"id": "r4"}]
+
+
+class TestTransaction:
+    def test_defers_and_collapses_writes(self, mem, tmp_path, monkeypatch):
+        batches = []
+        real = mem.write_batch
+        monkeypatch.setattr(mem, "write_batch", lambda w: (batches.append(list(w)), real(w)))
+        with mem.transaction():
+            mem.write_json("tasks/reminders.json", {"reminders": [1]})
+            mem.write_json("tasks/reminders.json", {"reminders": [1, 2]})
+            mem.write_file("drafts/a.md", "draft")
+            assert not (tmp_path / "drafts" / "a.md").exists()
+            assert mem.read_json("tasks/reminders.json") == {"reminders": [1, 2]}
+        assert len(batches[-1]) == 2
+        assert (tmp_path / "drafts" / "a.md").read_text(encoding="utf-8") == "draft"
+        assert mem.read_json("tasks/reminders.json") == {"reminders": [1, 2]}
+
+    def test_appends_visible_inside_and_flushed_after_files(self, mem, tmp_path):
+        mem.append_jsonl("memory/log.jsonl", {"n": 0})
+        with mem.transaction():
+            mem.append_jsonl("memory/log.jsonl", {"n": 1})
+            assert mem.read_jsonl("memory/log.jsonl") == [{"n": 0}, {"n": 1}]
+            assert mem.read_file("memory/new.jsonl") is None
+        assert mem.read_jsonl("memory/log.jsonl") == [{"n": 0}, {"n": 1}]
+
+    def test_flushes_on_error_and_nests(self, mem, tmp_path):
+        with pytest.raises(RuntimeError):
+            with mem.transaction():
+                with mem.transaction():
+                    mem.write_file("a.md", "x")
+                assert not (tmp_path / "a.md").exists()
+                raise RuntimeError
+        assert (tmp_path / "a.md").read_text(encoding="utf-8") == "x"
+
+    def test_concurrent_updates_are_not_lost(self, mem):
+        def work(n):
+            for i in range(10):
+                mem.update_contract_index(f"c{n}_{i}", {"status": "draft"})
+                with mem.transaction(lock=True):
+                    summaries = mem.get_summaries()
+                    summaries[f"c{n}_{i}"] = {}
+                    mem.save_summaries(summaries)
+
+        threads = [threading.Thread(target=work, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(mem.list_contracts()) == 40
+        assert len(mem.get_summaries()) == 40
+
+
+class TestLoadFiles:
+    def test_dedupes_paths(self, mem):
+        mem.write_file("a.md", "A")
+        assert mem.load_files(["a.md", "missing.md", "a.md"]) == "--- a.md ---\nA"
+
+    def test_budget_truncates_and_marks(self, mem):
+        mem.write_file("a.md", "A" * 10)
+        mem.write_file("b.md", "B" * 100)
+        mem.write_file("c.md", "C")
+        out = mem.load_files(["a.md", "b.md", "c.md"], budget_chars=40)
+        assert out == "--- a.md ---\n" + "A" * 10 + "\n\n--- b.md ---\nBB\n…(усечено)"
+
+
+class TestStateHash:
+    def test_changes_with_content(self, mem):
+        mem.write_file("a.txt", "1")
+        h1 = mem.state_hash(["a.txt", "b.txt"])
+        assert h1 == mem.state_hash(["b.txt", "a.txt"])
+        mem.write_file("a.txt", "2")
+        assert mem.state_hash(["a.txt", "b.txt"]) != h1
+
+    def test_missing_differs_from_empty(self, mem):
+        h_missing = mem.state_hash(["x.txt"])
+        mem.write_file("x.txt", "")
+        assert mem.state_hash(["x.txt"]) != h_missing
+
+
+class TestJsonUtil:
+    def test_pretty_matches_stdlib(self):
+        from src import jsonutil
+        data = {"a": [1, {"б": None}], "e": {}, "f": [], 1: "int key"}
+        assert jsonutil.dumps_pretty(data) == json.dumps(data, ensure_ascii=False, indent=2)
+
+    def test_compact_roundtrip_and_fallback(self):
+        from src import jsonutil
+        assert json.loads(jsonutil.dumps({"big": 2 ** 70})) == {"big": 2 ** 70}
+        data = {"x": "кириллица", "n": [1, 2.5, None]}
+        assert jsonutil.loads(jsonutil.dumps(data)) == data
+
+    def test_loads_error_is_json_decode_error(self):
+        from src import jsonutil
+        with pytest.raises(json.JSONDecodeError):
+            jsonutil.loads("{bad")
+
+
+class TestOverlay:
+    def test_write_through_and_read_from_overlay(self, mem, tmp_path):
+        mem.enable_overlay()
+        mem.write_file("drafts/x.md", "v1")
+        assert (tmp_path / "drafts" / "x.md").read_text(encoding="utf-8") == "v1"
+        # Overlay wins over out-of-band disk edits
+        (tmp_path / "drafts" / "x.md").write_text("edited", encoding="utf-8")
+        assert mem.read_file("drafts/x.md") == "v1"
+
+    def test_memory_only_skips_disk(self, mem, tmp_path):
+        mem.enable_overlay(memory_only=True)
+        mem.seed_many({"a/b.json": {"k": 1}})
+        mem.write_json("c/d.json", [1])
+        mem.write_batch([("e/f.md", "x")])
+        mem.append_jsonl("log.jsonl", {"n": 1})
+        mem.append_jsonl("log.jsonl", {"n": 2})
+        assert mem.read_json("a/b.json") == {"k": 1}
+        assert mem.read_json("c/d.json") == [1]
+        assert mem.read_file("e/f.md") == "x"
+        assert mem.read_jsonl("log.jsonl") == [{"n": 1}, {"n": 2}]
+        assert list(tmp_path.iterdir()) == []
+
+    def test_append_extends_existing_disk_file(self, mem):
+        mem.append_jsonl("log.jsonl", {"n": 1})
+        mem.enable_overlay(memory_only=True)
+        mem.append_jsonl("log.jsonl", {"n": 2})
+        assert mem.read_jsonl("log.jsonl") == [{"n": 1}, {"n": 2}]
@@ -8,6 +8,7 @@ import pytest
 
 from src.memory import Memory
 from src.planner import ContinuousPlanner
+from src.jsonutil import object_text
 from src.planner_scoring import ScoredCandidate
 
 
@@ -418,3 +419,13 @@ class TestRunCycle:
         log = memory.read_jsonl("tasks/planner_log.jsonl")
         assert len(log) >= 1
         assert any(entry.get("event") == "cycle_complete" for entry in log)
+
+
+class TestObjectText:
+    def test_slices_outermost_braces(self):
+        assert object_text('Вот план: {"a": {"b": 1}} — готово') == '{"a": {"b": 1}}'
+
+    def test_no_object(self):
+        assert object_text("not json") is None
+        assert object_text("} before {") is None
+        assert object_text("{" * 50000) is None
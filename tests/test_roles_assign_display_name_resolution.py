@@ -47,6 +47,24 @@ class DisplayNameResolutionTest(unittest.TestCase):
             self.assertEqual(roles["roles"]["circle_lead"], ["korabovtsev"])
             self.assertEqual(roles["roles"]["data_lead"], ["pavelpetrin"])
 
+    def test_single_resolver_call_per_line_when_variants_available(self):
+        calls = []
+
+        class VariantsMM(FakeMM):
+            def resolve_username_variants(self, text):
+                calls.append(text)
+                return None if "неизвестный" in text.lower() else "korabovtsev"
+
+        with tempfile.TemporaryDirectory() as td:
+            os.environ["DATA_DIR"] = td
+            agent = Agent(FakeLLM(), Memory(), VariantsMM())
+            result = agent.process_message("pelevin", "Circle Lead — @Никита Корабовцев", "channel", None, None)
+            self.assertIn("✅ Роли обновлены", result.reply)
+
+            result = agent.process_message("pelevin", "Data Lead — @Неизвестный Человек", "channel", None, None)
+            self.assertIn("Не смог распознать", result.reply)
+            self.assertEqual(calls, ["Никита Корабовцев", "Неизвестный Человек"])
+
 
 if __name__ == "__main__":
     unittest.main()
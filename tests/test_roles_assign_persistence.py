@@ -3,7 +3,7 @@ import json
 import tempfile
 import unittest
 
-from src.agent import Agent
+from src.agent import Agent, _merge_roles
 from src.memory import Memory
 from src.router import route
 
@@ -40,6 +40,13 @@ class FakeMemoryForRouter:
 
 
 class RolesAssignPersistenceTest(unittest.TestCase):
+    def test_merge_roles_dedups_in_first_seen_order(self):
+        merged = _merge_roles(
+            [{"data_lead": ["bob", "alice"]}, {"data_lead": ["alice", "carol"]}],
+            [("data_lead", "bob"), ("circle_lead", "Dave")],
+        )
+        self.assertEqual(merged, {"data_lead": ["bob", "alice", "carol"], "circle_lead": ["dave"]})
+
     def test_router_detects_assignments(self):
         llm = FakeLLM()
         mem = FakeMemoryForRouter()
@@ -63,6 +70,50 @@ class RolesAssignPersistenceTest(unittest.TestCase):
             self.assertEqual(roles["roles"]["data_lead"], ["pavelpetrin"])
             self.assertEqual(roles["roles"]["circle_lead"], ["korabovtsev"])
 
+    def test_assign_keeps_other_roles_untouched(self):
+        with tempfile.TemporaryDirectory() as td:
+            os.environ["DATA_DIR"] = td
+            mem = Memory()
+            mem.write_json("tasks/roles.json", {"roles": {"data_lead": ["Bob"], "circle_lead": ["Alice", "alice"]}})
+            agent = Agent(FakeLLM(), mem, FakeMM())
+
+            agent._handle_roles_assign({"entity": "data_lead:carol"}, "")
+            roles = mem.read_json("tasks/roles.json")["roles"]
+            self.assertEqual(roles["data_lead"], ["bob", "carol"])
+            self.assertEqual(roles["circle_lead"], ["Alice", "alice"])
+
+    def test_json_cache_is_per_request(self):
+        with tempfile.TemporaryDirectory() as td:
+            os.environ["DATA_DIR"] = td
+            mem = Memory()
+            agent = Agent(FakeLLM(), mem, FakeMM())
+
+            agent.process_message("pelevin", "Data Lead — @pavelpetrin", "channel", None, None)
+            # Changed on disk between requests: the next request must see it
+            mem.write_json("tasks/roles.json", {"roles": {"circle_lead": ["korabovtsev"]}})
+            agent.process_message("pelevin", "Data Lead — @alice_b", "channel", None, None)
+
+            roles = mem.read_json("tasks/roles.json")["roles"]
+            self.assertEqual(roles["circle_lead"], ["korabovtsev"])
+            self.assertEqual(roles["data_lead"], ["alice_b"])
+            self.assertEqual(agent._read_json("tasks/roles.json")["roles"], roles)
+
+    def test_policy_show_reuses_unchanged_policy_and_roles(self):
+        from unittest.mock import patch
+        with tempfile.TemporaryDirectory() as td:
+            os.environ["DATA_DIR"] = td
+            mem = Memory()
+            mem.write_json("context/governance.json", {"tiers": {"tier_1": {"approval_required": ["data_lead"]}}})
+            mem.write_json("context/roles.json", {"roles": {"data_lead": ["alice"]}})
+            agent = Agent(FakeLLM(), mem, FakeMM())
+
+            first = agent._handle_governance_policy_show({"entity": "tier_1"}, "tier_1")
+            with patch.object(mem, "read_json", wraps=mem.read_json) as rj:
+                again = agent._handle_governance_policy_show({"entity": "tier_1"}, "tier_1")
+            rj.assert_not_called()
+            self.assertEqual(again, first)
+            self.assertIn("- data_lead: @alice", first)
+
 
 if __name__ == "__main__":
     unittest.main()
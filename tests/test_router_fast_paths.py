@@ -0,0 +1,54 @@
+"""Tests for router local fast-path commands (no LLM call)."""
+
+from __future__ import annotations
+
+import unittest
+
+from src.router import route
+
+
+class FailingLLM:
+    expert_model = "fake/expert"
+
+    def call_cheap(self, system, user, **kw):
+        raise AssertionError("fast path must not call the LLM")
+
+
+class FakeMemory:
+    def read_file(self, path: str):
+        return "{}"
+
+
+def _route(message: str) -> dict:
+    return route(FailingLLM(), FakeMemory(), "u", message, "channel", None)
+
+
+class FastPathTest(unittest.TestCase):
+    def test_show_draft(self):
+        r = _route("покажи черновик lead_conversion")
+        self.assertEqual((r["type"], r["entity"]), ("show_draft", "lead_conversion"))
+
+    def test_draft_questions_go_to_llm(self):
+        llm = FailingLLM()
+        llm.call_cheap = lambda system, user, **kw: '{"type": "contract_discussion", "entity": null, "load_files": []}'
+        for msg in ("@pelevin: что сейчас в черновике lead_conversion?", "покажи что в черновике lead_conversion"):
+            r = route(llm, FakeMemory(), "u", msg, "channel", None)
+            self.assertNotEqual(r["type"], "show_draft")
+
+    def test_show_contract(self):
+        r = _route("покажи контракт revenue")
+        self.assertEqual((r["type"], r["entity"]), ("show_contract", "revenue"))
+
+    def test_contract_history(self):
+        r = _route("история контракта revenue")
+        self.assertEqual((r["type"], r["entity"]), ("contract_history", "revenue"))
+
+    def test_finalize_keywords_case_insensitive(self):
+        r = _route("Сохранить финальную версию revenue")
+        self.assertEqual((r["type"], r["entity"]), ("contract_discussion", "revenue"))
+        r = _route("ЗАФИКСИРУЙ revenue")
+        self.assertEqual((r["type"], r["model"]), ("contract_discussion", "heavy"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -7,7 +7,7 @@ from unittest.mock import MagicMock, patch
 import pytest
 
 from src.memory import Memory
-from src.scheduler import Scheduler, _extract_mentions, _format_open_questions_digest
+from src.scheduler import Scheduler, _extract_mentions, _format_open_questions_digest, _render_placeholders
 
 
 @pytest.fixture
@@ -97,6 +97,23 @@ class TestReminderEscalation:
         updated = memory.get_reminders()
         assert updated[0]["escalation_step"] == 2
 
+    def test_reminders_changed_while_sending_are_kept(self, scheduler, memory, mm):
+        """A fold and a new reminder landing mid-send survive the scheduler's save."""
+        memory.save_reminders([])
+        memory.append_reminder(_make_reminder(step=1))
+
+        def send(*args, **kwargs):
+            memory.update_reminders(lambda reminders: reminders)  # e.g. delete_contract elsewhere
+            later = (datetime.now(timezone.utc) + timedelta(days=1)).isoformat()
+            memory.append_reminder(_make_reminder(contract_id="other_" + "y" * 200, next_reminder=later))
+            return {"id": "post_id"}
+
+        mm.send_to_channel.side_effect = send
+        scheduler._check_reminders()
+
+        updated = memory.get_reminders()
+        assert [(r["contract_id"][:6], r["escalation_step"]) for r in updated] == [("test_c", 2), ("other_", 1)]
+
     def test_step2_ab_options(self, scheduler, memory, mm, llm):
         """Step 2: A/B simplification, uses LLM if no discussion."""
         rem = _make_reminder(step=2)
@@ -260,6 +277,16 @@ class TestExtractMentions:
         assert _extract_mentions("@alice @bob @alice") == {"alice", "bob"}
 
 
+class TestRenderPlaceholders:
+    def test_substitutes_known_keys_once(self):
+        ctx = {"TARGET_USER": "@bob", "QUESTION": "{CONTRACT_ID}?", "CONTRACT_ID": "win_ni"}
+        out = _render_placeholders("{TARGET_USER}: {QUESTION} ({CONTRACT_ID}) {SOFT_REMINDER}", ctx)
+        assert out == "@bob: {CONTRACT_ID}? (win_ni) {SOFT_REMINDER}"
+
+    def test_no_placeholders(self):
+        assert _render_placeholders("plain text", {"A": "x"}) == "plain text"
+
+
 class TestFormatOpenQuestionsDigest:
     def test_basic_format(self):
         items = [{
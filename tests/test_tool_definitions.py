@@ -2,7 +2,7 @@
 
 import unittest
 
-from src.tool_definitions import get_read_tools, get_write_tools, get_all_tools
+from src.tool_definitions import get_read_tools, get_write_tools, get_all_tools, get_tools_for_route
 
 
 class ToolDefinitionsTest(unittest.TestCase):
@@ -60,5 +60,26 @@ class ToolDefinitionsTest(unittest.TestCase):
         self.assertEqual(write_names, expected_write)
 
 
+class ToolsForRouteTest(unittest.TestCase):
+    def _names(self, route_type, is_channel=True):
+        return [t["function"]["name"] for t in get_tools_for_route(route_type, is_channel)]
+
+    def test_route_specific_sets(self):
+        self.assertEqual(self._names("profile_intro"), ["update_participant"])
+        self.assertEqual(set(self._names("general_question")), {"read_contract", "read_draft", "list_contracts"})
+        self.assertEqual(self._names("data_query"), ["explore_schema", "query_data"])
+        self.assertNotIn("save_contract", self._names("expert_opinion"))
+        self.assertIn("query_data", self._names("expert_opinion"))
+
+    def test_default_depends_on_channel(self):
+        self.assertIn("save_contract", self._names("contract_discussion", True))
+        self.assertNotIn("save_contract", self._names("contract_discussion", False))
+
+    def test_returns_fresh_list(self):
+        tools = get_tools_for_route("contract_discussion", True)
+        tools.clear()
+        self.assertTrue(get_tools_for_route("contract_discussion", True))
+
+
 if __name__ == "__main__":
     unittest.main()
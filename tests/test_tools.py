@@ -3,10 +3,11 @@
 import json
 import os
 import tempfile
+import threading
 import unittest
 
 from src.memory import Memory
-from src.tools import ToolExecutor
+from src.tools import ToolExecutor, _extract_contract_name, _extract_section
 
 
 VALID_CONTRACT_MD = """# Data Contract: Test Metric
@@ -80,6 +81,25 @@ class FakeMM:
         return None
 
 
+class ExtractContractNameTest(unittest.TestCase):
+    def test_title_heading(self):
+        self.assertEqual(_extract_contract_name(VALID_CONTRACT_MD), "Test Metric")
+        self.assertEqual(_extract_contract_name("\n  # data contract:  a b \n"), "a b")
+        self.assertEqual(_extract_contract_name("## Черновик Data Contract: Foo"), "Foo")
+
+    def test_missing_or_empty(self):
+        self.assertIsNone(_extract_contract_name("# Data Contract:\nx"))
+        self.assertIsNone(_extract_contract_name("# Title\n# Data Contract X"))
+        self.assertIsNone(_extract_contract_name("x" * 4096 + "\n# Data Contract: Late"))
+
+
+class ExtractSectionTest(unittest.TestCase):
+    def test_case_insensitive_until_next_heading(self):
+        self.assertEqual(_extract_section(VALID_CONTRACT_MD, "определение"), "Тестовая метрика для юнит-тестов.")
+        self.assertEqual(_extract_section("## A\n1\n## A (ещё)\n2\n## B\n3", "a"), "1\n2")
+        self.assertEqual(_extract_section(VALID_CONTRACT_MD, "Нет такой"), "")
+
+
 class ToolExecutorReadTest(unittest.TestCase):
     def setUp(self):
         self.tmpdir = tempfile.mkdtemp()
@@ -138,6 +158,17 @@ class ToolExecutorReadTest(unittest.TestCase):
         result = self.executor.execute("list_contracts", {})
         self.assertEqual(len(result["contracts"]), 2)
 
+    def test_read_tool_does_not_wait_for_write_lock(self):
+        self.mem.write_file("contracts/test.md", "# Test")
+        results = []
+        with self.mem._write_lock:  # e.g. another worker flushing a save
+            t = threading.Thread(
+                target=lambda: results.append(self.executor.execute("read_contract", {"contract_id": "test"})),
+            )
+            t.start()
+            t.join(timeout=5)
+        self.assertEqual(results[0]["content"], "# Test")
+
     def test_unknown_tool(self):
         result = self.executor.execute("nonexistent_tool", {})
         self.assertIn("error", result)
@@ -166,6 +197,58 @@ class ToolExecutorWriteTest(unittest.TestCase):
         rec = [c for c in idx["contracts"] if c["id"] == "test_metric"][0]
         self.assertEqual(rec["status"], "agreed")
 
+    def test_save_contract_with_inline_relationships_skips_llm(self):
+        from unittest.mock import MagicMock
+        self.mem.write_json("contracts/index.json", {"contracts": [{"id": "code_quality", "name": "CQ"}]})
+        llm = MagicMock()
+        executor = ToolExecutor(self.mem, FakeMM(), llm)
+        result = executor.execute("save_contract", {
+            "contract_id": "test_metric",
+            "content": VALID_CONTRACT_MD,
+            "relationships": [
+                {"to": "Code_Quality", "type": "depends_on", "description": "Качество кода"},
+                {"to": "unknown", "type": "depends_on"},
+            ],
+        })
+        self.assertTrue(result["success"], result)
+        llm.call_heavy.assert_not_called()
+        rels = self.mem.read_json("contracts/relationships.json")["relationships"]
+        self.assertIn(("test_metric", "code_quality", "depends_on"), {(r["from"], r["to"], r["type"]) for r in rels})
+        self.assertNotIn("unknown", {r["to"] for r in rels})
+
+    def test_save_contract_llm_call_runs_outside_write_lock(self):
+        from unittest.mock import MagicMock
+        self.mem.write_json("contracts/index.json", {"contracts": [{"id": "code_quality", "name": "CQ"}]})
+        free = []
+
+        def probe():
+            if self.mem._write_lock.acquire(timeout=1):
+                free.append(True)
+                self.mem._write_lock.release()
+
+        def call_heavy(system, user):
+            t = threading.Thread(target=probe)
+            t.start()
+            t.join()
+            return json.dumps({"relationships": []})
+
+        llm = MagicMock()
+        llm.call_heavy.side_effect = call_heavy
+        result = ToolExecutor(self.mem, FakeMM(), llm).execute(
+            "save_contract", {"contract_id": "test_metric", "content": VALID_CONTRACT_MD},
+        )
+        self.assertTrue(result["success"], result)
+        self.assertEqual(free, [True])
+
+    def test_llm_relationships_without_from_rejected(self):
+        from src.relationships_llm import parse_and_validate
+        raw = json.dumps({"relationships": [
+            {"to": "code_quality", "type": "depends_on"},
+            {"from": "test_metric", "to": "code_quality", "type": "aggregates"},
+        ]})
+        rels = parse_and_validate(raw, contract_id="test_metric", known_ids={"code_quality"})
+        self.assertEqual([(r.from_id, r.type) for r in rels], [("test_metric", "aggregates")])
+
     def test_save_contract_invalid(self):
         self.mem.write_json("contracts/index.json", {"contracts": []})
         result = self.executor.execute("save_contract", {
@@ -199,6 +282,30 @@ class ToolExecutorWriteTest(unittest.TestCase):
         has_governance_error = any("Governance" in e or "роле" in e for e in result["errors"])
         self.assertTrue(has_governance_error, f"Expected governance error in: {result['errors']}")
 
+    def test_preflight_save_contract(self):
+        self.mem.write_json("contracts/index.json", {
+            "contracts": [{"id": "test_metric", "tier": "tier_2"}]
+        })
+        self.mem.write_json("context/governance.json", {
+            "tiers": {
+                "tier_2": {
+                    "approval_required": ["data_lead", "circle_lead"],
+                    "consensus_threshold": 1.0,
+                }
+            }
+        })
+        self.mem.save_draft("test_metric", VALID_CONTRACT_MD)
+
+        reason = self.executor.preflight_save_contract("test_metric")
+        self.assertIn("Governance (tier_2)", reason)
+        self.assertIsNone(self.mem.get_contract("test_metric"))
+
+        self.mem.write_json("tasks/roles.json", {
+            "roles": {"data_lead": ["a"], "circle_lead": ["b"]}
+        })
+        self.assertIsNone(self.executor.preflight_save_contract("test_metric"))
+        self.assertIn("не найден", self.executor.preflight_save_contract("missing_draft"))
+
     def test_save_draft(self):
         self.mem.write_json("contracts/index.json", {"contracts": []})
         result = self.executor.execute("save_draft", {
@@ -283,6 +390,13 @@ class ToolExecutorWriteTest(unittest.TestCase):
         })
         self.assertFalse(result["success"])
 
+    def test_query_data_rejects_writes_before_mcp(self):
+        result = self.executor.execute("query_data", {"sql": "select 1; drop table x limit 1"})
+        self.assertEqual(result["error"], "Запрещённая операция: DROP. Только SELECT.")
+        # Identifiers merely containing a keyword are fine
+        result = self.executor.execute("query_data", {"sql": "SELECT updated_at FROM t"})
+        self.assertIn("LIMIT", result["error"])
+
 
 if __name__ == "__main__":
     unittest.main()